@@ -0,0 +1,98 @@
+"""Сравнение доступа к Supabase: asyncio.to_thread + синхронный клиент
+против асинхронного клиента с общим пулом соединений.
+
+    python -m benchmarks.bench_db_access --concurrency 100 --requests 2000 --latency 0.05
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from postgrest import SyncPostgrestClient
+
+from database.client import create_postgrest
+
+KEY = "bench"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run_load(call, concurrency: int, requests: int):
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return latencies, elapsed
+
+
+def report(name, latencies, elapsed):
+    print(f"{name:<12} rps={len(latencies) / elapsed:8.1f}  "
+          f"p50={statistics.median(latencies) * 1000:7.2f}ms  "
+          f"p95={percentile(latencies, 0.95) * 1000:7.2f}ms  "
+          f"p99={percentile(latencies, 0.99) * 1000:7.2f}ms")
+
+
+def start_server(latency: float):
+    """Сервер в отдельном процессе, чтобы не делить с клиентом event loop"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    proc = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_postgrest",
+                             "--port", str(port), "--latency", str(latency)])
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return proc, f"http://127.0.0.1:{port}"
+
+
+async def main(args):
+    server, url = start_server(args.latency)
+    headers = {"apikey": KEY, "Authorization": f"Bearer {KEY}"}
+
+    sync_client = SyncPostgrestClient(f"{url}/rest/v1", headers=headers)
+
+    def _sync_call():
+        return sync_client.rpc("get_user_subscriptions", {"p_user_id": 1}).execute()
+
+    async def to_thread_call():
+        return await asyncio.to_thread(_sync_call)
+
+    async_client = create_postgrest(url, KEY, pool_size=args.pool_size, http2=False)
+
+    async def async_call():
+        return await async_client.rpc("get_user_subscriptions", {"p_user_id": 1}).execute()
+
+    for name, call in (("to_thread", to_thread_call), ("async_pool", async_call)):
+        await call()
+        latencies, elapsed = await run_load(call, args.concurrency, args.requests)
+        report(name, latencies, elapsed)
+
+    sync_client.session.close()
+    await async_client.aclose()
+    server.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа сервера (сеть + БД), сек")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,268 @@
+"""Офлайн-бенчмарк рассылок: check_and_send_news и process_broadcast против
+локальных замен Telegram Bot API и PostgREST.
+
+    python -m benchmarks.bench_mailing --scenario news broadcast --users 1000 10000 100000
+
+Лимиты Telegram (30 сообщ./сек, 1 сообщ./сек в чат), TELEGRAM_RATE, DELIVERY_RATE и
+DELIVERY_CHAT_INTERVAL бота ускоряются в --speedup раз, иначе 100k получателей
+шли бы час. Каждый прогон выполняется в отдельном процессе (чистые синглтоны
+и честный пиковый RSS), замены серверов — в еще одном. Результаты дописываются
+в --output (JSON Lines) и сравниваются с прошлым прогоном тех же параметров.
+С --workers N новости доставляют N процессов worker.py (MAILING_WORKERS=1).
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import resource
+import platform
+import subprocess
+import tempfile
+
+import aiohttp
+
+from benchmarks.fake_postgrest import FakePostgrest
+from benchmarks.fake_telegram import SEND_METHODS, FakeTelegram
+
+TOKEN = "123456:bench"
+ADMIN_ID = 1_000_000_007
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT = os.path.join(ROOT, "benchmarks", "results", "mailing.jsonl")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_port(port: int, server: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"сервер на порту {port} не запустился")
+
+
+def news_items(count: int) -> list:
+    """Новости с разными текстами, иначе их отбросит дедупликация"""
+    words = ("сервер", "обновление", "приложение", "платеж", "карта", "перевод", "уведомление", "вход",
+             "профиль", "задержка", "работы", "банк", "клиент", "сервис", "версия", "доступ")
+    rng = random.Random(0)
+    return [{"title": f"Новость {i}", "summary": " ".join(rng.choice(words) for _ in range(80)).capitalize(),
+             "url": f"https://example.com/news/{i}"} for i in range(count)]
+
+
+async def serve(args):
+    """Замены Telegram и PostgREST в одном процессе; все пользователи подписаны на tech_news"""
+    postgrest = FakePostgrest(users=args.users, latency=args.db_latency)
+    postgrest.subscriptions = {user_id: {1, 1 + user_id % 5} for user_id in postgrest.users}
+    postgrest.news = news_items(args.news)
+    telegram = FakeTelegram(rate=30 * args.speedup, chat_interval=1 / args.speedup,
+                            blocked_every=args.blocked_every, latency=args.tg_latency)
+    await postgrest.start(port=args.pg_port)
+    await telegram.start(port=args.tg_port)
+    await asyncio.Event().wait()
+
+
+async def start_workers(args):
+    """Поднять процессы worker.py до замера: их запуск (импорт aiogram) не входит во время доставки"""
+    workers = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(ROOT, "worker.py"), "--processes", str(args.workers), cwd=ROOT
+    )
+    async with aiohttp.ClientSession() as http:
+        while True:
+            async with http.get(f"http://127.0.0.1:{args.pg_port}/_stats") as response:
+                if (await response.json()).get("rpc/heartbeat_mailing_worker", 0) >= args.workers:
+                    return workers
+            await asyncio.sleep(0.1)
+
+
+async def run_news(bot, args):
+    """С --workers бот только ставит дайджест в очередь, доставляют процессы worker.py"""
+    import database.supabase as db
+    from mailing.tech_news.tech_news import check_and_send_news
+
+    await db.load_subscription_index()
+    workers = await start_workers(args) if args.workers else None
+    started = time.perf_counter()
+    await check_and_send_news(bot)
+    if workers:
+        while (await db.get_outbox_stats())["pending"]:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        workers.terminate()
+        await workers.wait()
+        return elapsed
+    return time.perf_counter() - started
+
+
+async def run_broadcast(bot, args):
+    from aiogram.fsm.context import FSMContext
+    from aiogram.fsm.storage.base import StorageKey
+    from aiogram.fsm.storage.memory import MemoryStorage
+    from aiogram.types import Message
+    from handlers.admin import process_broadcast
+    from mailing.broadcast import broadcasts
+
+    chat = {"id": ADMIN_ID, "type": "private"}
+    message = Message.model_validate({
+        "message_id": 1, "date": int(time.time()), "chat": chat, "text": "Бенчмарк рассылки",
+        "from": {"id": ADMIN_ID, "is_bot": False, "first_name": "Admin", "username": "admin"},
+    }).as_(bot)
+    state = FSMContext(storage=MemoryStorage(), key=StorageKey(bot_id=bot.id, chat_id=ADMIN_ID, user_id=ADMIN_ID))
+    started = time.perf_counter()
+    await process_broadcast(message, state, bot)
+    while broadcasts.active():
+        await asyncio.sleep(0.01)
+    return time.perf_counter() - started
+
+
+async def child(args):
+    """Один прогон сценария; окружение (адреса замен, лимиты) выставлено родителем"""
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from database.client import close as close_db
+    from utils import metrics
+    from utils.lanes import scheduler
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{args.tg_port}"))
+    bot = Bot(token=TOKEN, session=session)
+    bot.session.middleware(metrics.TelegramMetricsMiddleware())
+    bot.session.middleware(scheduler)
+    scenario = run_news if args.scenario == "news" else run_broadcast
+    try:
+        elapsed = await scenario(bot, args)
+    finally:
+        await bot.session.close()
+        await close_db()
+    # счетчики берутся у замен серверов: с --workers часть вызовов делают другие процессы
+    async with aiohttp.ClientSession() as http:
+        async with http.get(f"http://127.0.0.1:{args.tg_port}/_stats") as response:
+            telegram = await response.json()
+        async with http.get(f"http://127.0.0.1:{args.pg_port}/_stats") as response:
+            postgrest = await response.json()
+    messages = sum(telegram.get(method, 0) for method in SEND_METHODS)
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return {
+        "wall_seconds": round(elapsed, 3),
+        "messages": messages,
+        "messages_per_second": round(messages / elapsed, 1) if elapsed else 0.0,
+        "peak_rss_mib": round(peak_rss / 1024, 1),
+        "telegram_calls": telegram,
+        "postgrest_calls": postgrest,
+    }
+
+
+def run_one(args, scenario: str, users: int) -> dict:
+    pg_port, tg_port = free_port(), free_port()
+    workers = args.workers if scenario == "news" else 0
+    common = ["--users", str(users), "--speedup", str(args.speedup), "--pg-port", str(pg_port),
+              "--tg-port", str(tg_port), "--workers", str(workers)]
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_mailing", "--serve", *common,
+                               "--news", str(args.news), "--blocked-every", str(args.blocked_every),
+                               "--db-latency", str(args.db_latency), "--tg-latency", str(args.tg_latency)])
+    try:
+        wait_port(pg_port, server)
+        wait_port(tg_port, server)
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(
+                os.environ,
+                SUPABASE_URL=f"http://127.0.0.1:{pg_port}", SUPABASE_KEY="bench", BOT_TOKEN=TOKEN,
+                ADMIN_IDS=str(ADMIN_ID), METRICS_PORT="0", SUPABASE_HTTP2="0",
+                DEDUP_PATH=os.path.join(workdir, "dedup.sqlite3"),
+                TELEGRAM_RATE=str(float(os.getenv("TELEGRAM_RATE", "30")) * args.speedup),
+                DELIVERY_RATE=str(float(os.getenv("DELIVERY_RATE", "25")) * args.speedup),
+                DELIVERY_CHAT_INTERVAL=str(float(os.getenv("DELIVERY_CHAT_INTERVAL", "1.0")) / args.speedup),
+                BROADCAST_PROGRESS_INTERVAL=str(float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "3")) / args.speedup),
+                MAILING_WORKERS="1" if workers else "0", MAILING_WORKER_POLL="0.1", TELEGRAM_API_URL=f"http://127.0.0.1:{tg_port}",
+            )
+            result = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_mailing", "--child", "--scenario", scenario, *common],
+                env=env, capture_output=True, text=True, check=True
+            )
+    finally:
+        server.terminate()
+        server.wait()
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_previous(path: str) -> dict:
+    previous = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                record = json.loads(line)
+                previous[(record["scenario"], record["users"], record["speedup"], record.get("workers", 0))] = record
+    return previous
+
+
+def report(record: dict, previous: dict):
+    line = (f"{record['scenario']:<10} users={record['users']:>7,}  wall={record['wall_seconds']:8.2f}s  "
+            f"msg/s={record['messages_per_second']:8.1f}  rss={record['peak_rss_mib']:7.1f}MiB  "
+            f"tg={sum(record['telegram_calls'].values()):>7}  db={sum(record['postgrest_calls'].values()):>5}")
+    if previous:
+        change = record["wall_seconds"] / previous["wall_seconds"] - 1 if previous["wall_seconds"] else 0.0
+        line += f"  ({change:+.0%} к {previous['revision']})"
+    print(line)
+    throttled = {name: count for name, count in record["telegram_calls"].items() if ":" in name}
+    if throttled:
+        print(f"{'':<10} ошибки Bot API: {throttled}")
+
+
+def main(args):
+    previous = load_previous(args.output)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    for scenario in args.scenario:
+        for users in args.users:
+            workers = args.workers if scenario == "news" else 0
+            record = {"scenario": scenario, "users": users, "speedup": args.speedup, "workers": workers,
+                      "revision": git_revision(), "python": platform.python_version(),
+                      "timestamp": int(time.time()), **run_one(args, scenario, users)}
+            report(record, previous.get((scenario, users, args.speedup, workers)))
+            with open(args.output, "a", encoding="utf-8") as file:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк рассылок")
+    parser.add_argument("--scenario", nargs="+", choices=("news", "broadcast"), default=["news", "broadcast"])
+    parser.add_argument("--users", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--speedup", type=float, default=40)
+    parser.add_argument("--news", type=int, default=8, help="новостей в дайджесте")
+    parser.add_argument("--blocked-every", type=int, default=50, help="каждый N-й пользователь заблокировал бота")
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    parser.add_argument("--tg-latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="доставлять новости столькими процессами worker.py (только сценарий news)")
+    parser.add_argument("--output", default=OUTPUT)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--pg-port", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--tg-port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        args.users = args.users[0]
+        asyncio.run(serve(args))
+    elif args.child:
+        args.scenario, args.users = args.scenario[0], args.users[0]
+        print(json.dumps(asyncio.run(child(args))))
+    else:
+        main(args)
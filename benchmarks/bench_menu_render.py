@@ -0,0 +1,82 @@
+"""Стоимость отрисовки меню: сборка InlineKeyboardBuilder на каждый callback
+против закэшированной по версии каталога заготовки.
+
+    python -m benchmarks.bench_menu_render --categories 20 --iterations 5000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from aiogram.types import InlineKeyboardButton
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+import database.supabase as db
+from utils.user_utils import get_catalog_keyboard, get_subs_keyboard
+
+
+def legacy_subs_keyboard(all_categories, current_selection):
+    """Прежняя сборка клавиатуры подписок"""
+    builder = InlineKeyboardBuilder()
+    for cat in all_categories:
+        icon = "✅" if cat['id'] in current_selection else "⬜"
+        builder.button(text=f"{icon} {cat['category_name']}", callback_data=f"sub_toggle_{cat['id']}")
+    builder.adjust(1)
+    builder.row(
+        InlineKeyboardButton(text="🆗 Сохранить", callback_data="subs_save"),
+        InlineKeyboardButton(text="📋 Меню", callback_data="back_to_main")
+    )
+    return builder.as_markup()
+
+
+def legacy_catalog_keyboard(categories):
+    """Прежняя сборка каталога"""
+    builder = InlineKeyboardBuilder()
+    for item in categories:
+        builder.button(text=f"{item['category_name']}", callback_data=f"view_category_{item['id']}")
+    builder.adjust(1)
+    builder.row(InlineKeyboardButton(text="📋 Меню", callback_data="back_to_main"))
+    return builder.as_markup()
+
+
+async def measure(name, render, iterations):
+    await render()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await render()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    await render()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<16} {elapsed / iterations * 1e6:8.1f} мкс/отрисовку  пик памяти {peak / 1024:7.1f} КиБ")
+
+
+async def main(args):
+    categories = [{"id": i, "category_name": f"Категория {i}"} for i in range(1, args.categories + 1)]
+    db.categories_cache.set("all", categories)
+    selection = list(range(1, args.categories + 1, 2))
+
+    async def legacy_subs():
+        return legacy_subs_keyboard(await db.get_all_categories(), selection)
+
+    async def cached_subs():
+        return await get_subs_keyboard(selection)
+
+    async def legacy_catalog():
+        return legacy_catalog_keyboard(await db.get_all_categories())
+
+    assert (await legacy_subs()) == (await cached_subs())
+    assert (await legacy_catalog()) == (await get_catalog_keyboard())
+
+    await measure("subs/legacy", legacy_subs, args.iterations)
+    await measure("subs/cached", cached_subs, args.iterations)
+    await measure("catalog/legacy", legacy_catalog, args.iterations)
+    await measure("catalog/cached", get_catalog_keyboard, args.iterations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,75 @@
+"""Память и скорость индекса подписчиков: строки PostgREST (списки словарей)
+против отсортированных array('q') в SubscriptionIndex.
+
+    python -m benchmarks.bench_subscription_index --users 1000000 --categories 50 --per-user 5
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from database.subscription_index import SubscriptionIndex
+
+
+def user_categories(user_id: int, categories: int, per_user: int):
+    return sorted({1 + (user_id * 7 + j * 11) % categories for j in range(per_user)})
+
+
+async def snapshot_pages(users: int, categories: int, per_user: int, page_size: int = 10000):
+    for start in range(1, users + 1, page_size):
+        yield [(user_id, user_categories(user_id, categories, per_user), True)
+               for user_id in range(start, min(start + page_size, users + 1))]
+
+
+def measure_rows(users: int, categories: int, per_user: int) -> int:
+    """Пиковая память строк user_subscriptions в виде, в котором их отдает PostgREST"""
+    tracemalloc.start()
+    rows = [{"user_id": user_id, "category_id": category_id}
+            for user_id in range(1, users + 1)
+            for category_id in user_categories(user_id, categories, per_user)]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return peak
+
+
+async def main(args):
+    subscriptions = args.users * args.per_user
+    sample = min(args.users, args.rows_sample)
+    rows_peak = measure_rows(sample, args.categories, args.per_user) * args.users / sample
+    print(f"подписок: {subscriptions:,}  (пользователей {args.users:,} × {args.per_user} из {args.categories} категорий)")
+    print(f"строки PostgREST   ~{rows_peak / 2 ** 20:8.1f} МиБ  (экстраполяция с {sample:,} пользователей)")
+
+    index = SubscriptionIndex()
+    tracemalloc.start()
+    await index.load(snapshot_pages(args.users, args.categories, args.per_user), cursor=0)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"SubscriptionIndex   {current / 2 ** 20:8.1f} МиБ  (массивы {index.memory_usage() / 2 ** 20:.1f} МиБ)")
+
+    started = time.perf_counter()
+    for user_id in range(1, args.updates + 1):
+        index.set_user(user_id, user_categories(user_id + 1, args.categories, args.per_user))
+    print(f"set_user            {(time.perf_counter() - started) / args.updates * 1e6:8.1f} мкс/изменение")
+
+    wanted = list(range(1, args.fanout_categories + 1))
+    started = time.perf_counter()
+    recipients = sum(len(batch) for batch in index.iter_subscribers(wanted, 1000))
+    print(f"fan-out {len(wanted)} категорий  {recipients:,} получателей за {time.perf_counter() - started:.2f} сек")
+
+    started = time.perf_counter()
+    counts = [index.count(category_id) for category_id in range(1, args.categories + 1)]
+    users = index.count_users()
+    print(f"статистика: {sum(counts):,} подписок, {users:,} пользователей за "
+          f"{(time.perf_counter() - started) * 1e3:.3f} мс")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--per-user", type=int, default=5)
+    parser.add_argument("--rows-sample", type=int, default=100_000)
+    parser.add_argument("--updates", type=int, default=10_000)
+    parser.add_argument("--fanout-categories", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,371 @@
+"""Нагрузочный тест диспетчера: поток апдейтов через dp.feed_update с подменной
+сессией бота и замененным PostgREST с заданным профилем задержек.
+
+    python -m benchmarks.bench_updates --users 500 --toggles 20 --concurrency 50
+    python -m benchmarks.bench_updates --replay updates.jsonl --db-latency 0.01 --db-latency-p99 0.08
+    python -m benchmarks.bench_updates --mode webhook --max-pending 200 --rate 500
+    python -m benchmarks.bench_updates --mode polling --rate 500
+
+Без --replay генерируется сценарий на каждого пользователя: /start, show_info,
+view_category_, back_to_main, show_subs, серия sub_toggle_ и subs_save.
+--replay принимает JSON Lines с апдейтами в том виде, в каком их присылает Telegram
+(тело вебхука или элемент getUpdates); --dump сохраняет сгенерированный поток
+в том же формате. Апдейты одного пользователя идут по порядку, пользователи —
+параллельно, не больше --concurrency обработчиков одновременно (как WEBHOOK_MAX_CONCURRENCY).
+
+--mode webhook и --mode polling пропускают тот же поток через путь продакшена:
+BoundedUpdateHandler.feed (ответ 503 — повтор через --retry-after, как у Telegram)
+или dp.start_polling с getUpdates из подменной сессии. Апдейты приходят с частотой
+--rate (0 — все сразу), задержка считается от прихода апдейта до конца обработки.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import asyncio
+import argparse
+import statistics
+import subprocess
+import tempfile
+from collections import defaultdict
+from typing import get_args
+
+from benchmarks.bench_mailing import free_port, wait_port
+
+TOKEN = "123456:bench"
+FIRST_USER_ID = 1000
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+
+
+def _message(user_id: int, message_id: int, text: str) -> dict:
+    return {"message_id": message_id, "date": int(time.time()), "text": text,
+            "chat": {"id": user_id, "type": "private"}, "from": _user(user_id)}
+
+
+def user_session(user_id: int, categories: int, toggles: int, rng: random.Random) -> list:
+    """Апдейты одного пользователя: команда /start и нажатия кнопок под меню бота"""
+    menu = {**_message(user_id, 2, "Главное меню"), "from": {"id": 1, "is_bot": True, "first_name": "Bot"}}
+    clicks = ["show_info", f"view_category_{rng.randint(1, categories)}", "back_to_main", "show_subs"]
+    clicks += [f"sub_toggle_{rng.randint(1, categories)}" for _ in range(toggles)]
+    clicks.append("subs_save")
+    updates = [{"message": {**_message(user_id, 1, "/start"),
+                            "entities": [{"type": "bot_command", "offset": 0, "length": 6}]}}]
+    updates += [{"callback_query": {"id": f"{user_id}-{i}", "from": _user(user_id), "chat_instance": str(user_id),
+                                    "message": menu, "data": data}}
+                for i, data in enumerate(clicks)]
+    return updates
+
+
+def generate(users: int, categories: int, toggles: int, seed: int = 0, interleave: bool = False) -> list:
+    """interleave — апдейты пользователей вперемешку, по одному шагу каждого по кругу,
+    как они приходят боту: у одного пользователя нажатия идут не подряд"""
+    rng = random.Random(seed)
+    sessions = [user_session(user_id, categories, toggles, rng)
+                for user_id in range(FIRST_USER_ID, FIRST_USER_ID + users)]
+    if interleave:
+        stream = [session[step] for step in range(max(map(len, sessions), default=0))
+                  for session in sessions if step < len(session)]
+    else:
+        stream = [update for session in sessions for update in session]
+    for update_id, update in enumerate(stream, start=1):
+        update["update_id"] = update_id
+    return stream
+
+
+def label(update: dict) -> str:
+    """Имя шага: команда или префикс callback_data, как в метриках обработчиков"""
+    from utils.metrics import CALLBACK_PREFIX
+
+    if "callback_query" in update:
+        return CALLBACK_PREFIX.match(update["callback_query"].get("data") or "").group(1)
+    text = update.get("message", {}).get("text") or ""
+    return text.split()[0].split("@")[0] if text.startswith("/") else "text"
+
+
+def sender(update: dict) -> int:
+    for key in ("message", "callback_query", "edited_message", "my_chat_member"):
+        if key in update:
+            return update[key]["from"]["id"]
+    return 0
+
+
+def create_session(latency: float):
+    """Сессия бота без сети: каждый метод Bot API отвечает через latency секунд.
+    getUpdates отвечает корутина inbox(offset, limit), если она задана"""
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import GetMe, GetUpdates
+    from aiogram.types import Message, User
+
+    class FakeSession(BaseSession):
+        def __init__(self):
+            super().__init__()
+            self.calls: dict = defaultdict(int)
+            self._message_id = 0
+            self.inbox = None
+
+        async def make_request(self, bot, method, timeout=None):
+            self.calls[type(method).__name__] += 1
+            if isinstance(method, GetUpdates):
+                return await self.inbox(method.offset or 0, method.limit or 100)
+            await asyncio.sleep(latency)
+            if isinstance(method, GetMe):
+                return User(id=int(TOKEN.split(":")[0]), is_bot=True, first_name="Bench", username="bench_bot")
+            returning = method.__returning__
+            if returning is Message or Message in get_args(returning):
+                self._message_id += 1
+                chat_id = getattr(method, "chat_id", None) or 0
+                return Message.model_validate({
+                    "message_id": getattr(method, "message_id", None) or self._message_id,
+                    "date": int(time.time()), "chat": {"id": chat_id, "type": "private"},
+                    "text": getattr(method, "text", None) or "",
+                })
+            return True
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            yield b""
+
+        async def close(self):
+            pass
+
+    return FakeSession()
+
+
+class Arrivals:
+    """Апдейты потока с моментами прихода (--rate) и учетом завершенных обработчиков"""
+
+    def __init__(self, stream: list, rate: float):
+        # апдейты приходят по порядку потока, update_id по порядку нужны getUpdates
+        self.stream = [{**raw, "update_id": update_id} for update_id, raw in enumerate(stream, start=1)]
+        self.rate = rate
+        self.started = time.perf_counter()
+        self.finished = None
+        self.arrived: dict = {}
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.in_flight = 0
+        self.peak = 0
+        self.done = asyncio.Event()
+        self._finished = 0
+
+    def due(self, index: int) -> float:
+        return self.started + (index / self.rate if self.rate else 0.0)
+
+    def wrap(self, dp):
+        """Счетчики на входе в диспатчер: его вызывают и BoundedUpdateHandler, и polling"""
+        feed_update = dp.feed_update
+
+        async def timed(bot, update, **kwargs):
+            raw = self.stream[update.update_id - 1]
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            try:
+                return await feed_update(bot, update, **kwargs)
+            except Exception:
+                self.errors[label(raw)] += 1
+                raise
+            finally:
+                self.in_flight -= 1
+                self.latencies[label(raw)].append(time.perf_counter() - self.arrived[update.update_id])
+                self._finished += 1
+                if self._finished == len(self.stream):
+                    self.finished = time.perf_counter()
+                    self.done.set()
+
+        dp.feed_update = timed
+
+
+async def replay_webhook(args, bot, dp, arrivals: Arrivals) -> dict:
+    from aiogram.types import Update
+    from utils.webhook import BoundedUpdateHandler
+
+    handler = BoundedUpdateHandler(dp, bot, max_concurrency=args.concurrency, max_pending=args.max_pending)
+    retries = []
+    await dp.emit_startup(bot=bot)
+
+    async def redeliver(update):
+        # Telegram повторяет доставку после 503, не раньше Retry-After
+        while True:
+            await asyncio.sleep(args.retry_after)
+            if handler.feed(update):
+                return
+
+    for index, raw in enumerate(arrivals.stream):
+        wait = arrivals.due(index) - time.perf_counter()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        update = Update.model_validate(raw, context={"bot": bot})
+        arrivals.arrived[update.update_id] = time.perf_counter()
+        if not handler.feed(update):
+            retries.append(asyncio.create_task(redeliver(update)))
+    await asyncio.gather(*retries)
+    delivered = time.perf_counter()
+    await handler.drain(timeout=3600)
+    drain = time.perf_counter() - delivered
+    # отложенные правки клавиатуры подписок; shutdown закрывает FSM-хранилище, как в run_webhook
+    await asyncio.sleep(1)
+    await dp.emit_shutdown(bot=bot)
+    return {"rejected": handler.rejected, "drain": drain}
+
+
+async def replay_polling(args, bot, dp, arrivals: Arrivals, session) -> dict:
+    from aiogram.types import Update
+    from bot import run_polling
+
+    updates = [Update.model_validate(raw, context={"bot": bot}) for raw in arrivals.stream]
+    delivered = []
+
+    async def inbox(offset: int, limit: int) -> list:
+        start = max(offset - 1, 0)
+        end = start
+        while end < len(updates) and end - start < limit and arrivals.due(end) <= time.perf_counter():
+            end += 1
+        if start == end:
+            # long polling: ждем следующий апдейт, а после конца потока — остановки
+            await asyncio.sleep(max(arrivals.due(start) - time.perf_counter(), 0.0) if start < len(updates) else 0.05)
+            return []
+        await asyncio.sleep(args.tg_latency)
+        now = time.perf_counter()
+        for update in updates[start:end]:
+            arrivals.arrived.setdefault(update.update_id, now)
+        if end == len(updates) and not delivered:
+            delivered.append(now)
+        return updates[start:end]
+
+    session.inbox = inbox
+    polling = asyncio.create_task(run_polling(bot, dp))
+    await arrivals.done.wait()
+    drain = time.perf_counter() - delivered[0]
+    await asyncio.sleep(1)
+    await dp.stop_polling()
+    await polling
+    return {"rejected": 0, "drain": drain}
+
+
+async def replay(args, stream: list) -> dict:
+    from aiogram import Bot
+    from aiogram.types import Update
+    import database.supabase as db
+    from bot import create_dispatcher
+    from database.client import close as close_db
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    session = create_session(args.tg_latency)
+    bot = Bot(token=TOKEN, session=session)
+    dp = create_dispatcher()
+    await db.load_subscription_index()
+
+    if args.mode != "direct":
+        arrivals = Arrivals(stream, args.rate)
+        arrivals.wrap(dp)
+        if args.mode == "webhook":
+            extra = await replay_webhook(args, bot, dp, arrivals)
+        else:
+            extra = await replay_polling(args, bot, dp, arrivals, session)
+        await close_db()
+        return {"elapsed": arrivals.finished - arrivals.started, "latencies": arrivals.latencies, "errors": arrivals.errors,
+                "calls": dict(session.calls), "peak": arrivals.peak, **extra}
+
+    by_user = defaultdict(list)
+    for update in stream:
+        by_user[sender(update)].append(update)
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_user(updates):
+        for raw in updates:
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    await dp.feed_update(bot, Update.model_validate(raw, context={"bot": bot}))
+                except Exception:
+                    errors[label(raw)] += 1
+                latencies[label(raw)].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_user(updates) for updates in by_user.values()))
+    elapsed = time.perf_counter() - started
+    # отложенные правки клавиатуры подписок
+    await asyncio.sleep(1)
+    await dp.storage.close()
+    await close_db()
+    return {"elapsed": elapsed, "latencies": latencies, "errors": errors, "calls": dict(session.calls)}
+
+
+def report(result: dict, db_calls: dict):
+    total = sum(len(values) for values in result["latencies"].values())
+    print(f"{'шаг':<16}{'апдейтов':>9}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'ошибок':>8}")
+    for name, values in sorted(result["latencies"].items(), key=lambda item: -percentile(item[1], 0.99)):
+        print(f"{name:<16}{len(values):>9}{statistics.median(values) * 1000:>10.1f}"
+              f"{percentile(values, 0.95) * 1000:>10.1f}{percentile(values, 0.99) * 1000:>10.1f}"
+              f"{result['errors'].get(name, 0):>8}")
+    print(f"\nапдейтов: {total}  за {result['elapsed']:.2f} сек.  →  {total / result['elapsed']:.0f} апдейтов/сек "
+          f"на один процесс")
+    if "drain" in result:
+        print(f"отклонено 503: {result['rejected']}  дообработка после прихода последнего: {result['drain']:.2f} сек.  "
+              f"обработчиков одновременно (пик): {result['peak']}")
+    print(f"Bot API: {result['calls']}")
+    print(f"PostgREST: {db_calls}")
+
+
+async def main(args):
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as file:
+            stream = [json.loads(line) for line in file if line.strip()]
+    else:
+        stream = generate(args.users, args.categories, args.toggles, interleave=args.mode != "direct")
+    if args.dump:
+        with open(args.dump, "w", encoding="utf-8") as file:
+            file.writelines(json.dumps(update, ensure_ascii=False) + "\n" for update in stream)
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_postgrest", "--port", str(port),
+                               "--latency", str(args.db_latency), "--latency-p99", str(args.db_latency_p99),
+                               "--users", str(args.users), "--categories", str(args.categories)])
+    wait_port(port, server)
+    url = f"http://127.0.0.1:{port}"
+    workdir = tempfile.TemporaryDirectory()
+    os.environ.update(SUPABASE_URL=url, SUPABASE_KEY="bench", BOT_TOKEN=TOKEN, METRICS_PORT="0",
+                      SUPABASE_HTTP2="0", ADMIN_IDS=os.getenv("ADMIN_IDS", "1"), FSM_STORAGE=args.fsm_storage,
+                      FSM_SQLITE_PATH=os.path.join(workdir.name, "fsm.sqlite3"))
+    try:
+        result = await replay(args, stream)
+        from utils.metrics import postgrest_latency
+        db_calls = {endpoint: series[-1] for (endpoint, _), series in postgrest_latency.series().items()}
+        report(result, db_calls)
+    finally:
+        server.terminate()
+        server.wait()
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков апдейтов")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--toggles", type=int, default=20, help="нажатий sub_toggle_ подряд у каждого пользователя")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--replay", help="JSON Lines с записанными апдейтами")
+    parser.add_argument("--dump", help="сохранить сгенерированный поток апдейтов")
+    parser.add_argument("--db-latency", type=float, default=0.01, help="медиана задержки PostgREST, сек")
+    parser.add_argument("--db-latency-p99", type=float, default=0.05, help="p99 задержки PostgREST, сек")
+    parser.add_argument("--tg-latency", type=float, default=0.03, help="задержка ответа Bot API, сек")
+    parser.add_argument("--fsm-storage", default="sqlite", choices=("sqlite", "memory", "redis"))
+    parser.add_argument("--mode", default="direct", choices=("direct", "webhook", "polling"),
+                        help="direct — dp.feed_update по порядку на пользователя, "
+                             "webhook — через BoundedUpdateHandler, polling — через dp.start_polling")
+    parser.add_argument("--rate", type=float, default=0, help="апдейтов в секунду на входе, 0 — все сразу")
+    parser.add_argument("--max-pending", type=int, default=500, help="WEBHOOK_MAX_PENDING для --mode webhook")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="пауза Telegram перед повтором после 503")
+    asyncio.run(main(parser.parse_args()))
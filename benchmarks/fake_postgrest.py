@@ -0,0 +1,322 @@
+"""Локальная замена PostgREST/Supabase для бенчмарков.
+
+Отвечает на /rest/v1/rpc/<fn> и /rest/v1/<table> по данным в памяти
+с настраиваемой задержкой, имитирующей сеть и работу БД. Как и Supabase,
+отдает не больше max_rows строк (db-max-rows) на любой запрос.
+"""
+import time
+import asyncio
+import json
+import math
+import random
+
+from aiohttp import web
+
+
+class FakePostgrest:
+    def __init__(self, users: int = 1000, categories: int = 5, latency: float = 0.005,
+                 latency_p99: float = 0.0, max_rows: int = 1000):
+        self.latency = latency
+        self.max_rows = max_rows
+        self.latency_p99 = latency_p99
+        self.calls: dict[str, int] = {}
+        self.categories = [
+            {"id": i, "category_name": f"Категория {i}", "description": f"Описание категории {i}"}
+            for i in range(1, categories + 1)
+        ]
+        self.users = list(range(1, users + 1))
+        self.inactive: set[int] = set()
+        self.changes: list[int] = []
+        self.subscriptions = {user_id: {1 + user_id % categories} for user_id in self.users}
+        self.news: list[dict] = []
+        self.delivery_jobs: dict[str, list] = {}
+        self.outbox: dict[tuple, dict] = {}
+        # очередь (user_id, part) по (задача, шард, число шардов) в порядке выдачи claim_outbox
+        self._queues: dict[tuple, list] = {}
+        self._queue_sorted: dict[tuple, bool] = {}
+        self.workers: set[str] = set()
+        self.broadcast_jobs: dict[int, dict] = {}
+
+    def _count(self, name: str):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def delay(self) -> float:
+        """Задержка ответа: постоянная latency или логнормальная с медианой latency и заданным p99"""
+        if self.latency_p99 <= self.latency:
+            return self.latency
+        sigma = math.log(self.latency_p99 / self.latency) / 2.326
+        return random.lognormvariate(math.log(self.latency), sigma)
+
+    def rpc_get_all_categories(self, params):
+        return self.categories
+
+    def rpc_get_category_description(self, params):
+        cat_id = int(params["p_cat_id"])
+        return next((c["description"] for c in self.categories if c["id"] == cat_id), None)
+
+    def rpc_get_user_subscriptions(self, params):
+        return [{"category_id": c} for c in sorted(self.subscriptions.get(params["p_user_id"], ()))]
+
+    def rpc_update_user_subscriptions(self, params):
+        self.subscriptions[params["p_user_id"]] = set(params["p_category_ids"])
+        self.changes.append(params["p_user_id"])
+
+    def rpc_deactivate_users(self, params):
+        fresh = set(params["p_user_ids"]) - self.inactive
+        self.inactive |= fresh
+        self.changes.extend(fresh)
+        return len(fresh)
+
+    def rpc_reactivate_user(self, params):
+        if params["p_user_id"] not in self.inactive:
+            return False
+        self.inactive.discard(params["p_user_id"])
+        self.changes.append(params["p_user_id"])
+        return True
+
+    def _user_state(self, user_id):
+        return sorted(self.subscriptions.get(user_id, ())), user_id not in self.inactive
+
+    def rpc_get_subscription_snapshot_page(self, params):
+        user_ids = sorted(u for u in set(self.subscriptions) | self.inactive if u > params["p_after"])
+        rows = []
+        for user_id in user_ids[:params["p_limit"]]:
+            category_ids, is_active = self._user_state(user_id)
+            rows.append({"user_id": user_id, "category_ids": category_ids, "is_active": is_active})
+        return rows
+
+    def rpc_get_subscription_changes_cursor(self, params):
+        return len(self.changes)
+
+    def rpc_get_subscription_changes(self, params):
+        after = params["p_after"]
+        latest = {}
+        for change_id, user_id in enumerate(self.changes[after:after + params["p_limit"]], start=after + 1):
+            latest[user_id] = change_id
+        rows = []
+        for user_id, change_id in sorted(latest.items(), key=lambda item: item[1]):
+            category_ids, is_active = self._user_state(user_id)
+            rows.append({"id": change_id, "user_id": user_id, "category_ids": category_ids, "is_active": is_active})
+        return rows
+
+    def rpc_fetch_and_update_tech_news(self, params):
+        news, self.news = self.news, []
+        return news
+
+    @staticmethod
+    def shard_of(user_id: int, shards: int) -> int:
+        """Своя хэш-функция вместо hashint8: важно только, чтобы шарды не пересекались"""
+        return (user_id * 2654435761 & 0x7fffffff) % shards
+
+    def _queue(self, job_id, user_id, part) -> int:
+        if (job_id, user_id, part) in self.outbox:
+            return 0
+        self.outbox[(job_id, user_id, part)] = {"status": "pending", "owner": None}
+        for key, queue in self._queues.items():
+            if key[0] == job_id and self.shard_of(user_id, key[2]) == key[1]:
+                queue.append((user_id, part))
+                self._queue_sorted[key] = False
+        return 1
+
+    def rpc_get_digest_recipients_page(self, params):
+        wanted, after = set(params["p_category_ids"]), params["p_after"]
+        rows = [{"user_id": u, "category_ids": sorted(cats)}
+                for u, cats in sorted(self.subscriptions.items())
+                if cats & wanted and u > after and u not in self.inactive]
+        return rows[:params["p_limit"]]
+
+    def rpc_enqueue_delivery(self, params):
+        job_id, parts = params["p_job_id"], params["p_parts"]
+        self.delivery_jobs.setdefault(job_id, parts)
+        queued = 0
+        for user_id in params["p_user_ids"]:
+            queued += sum(self._queue(job_id, user_id, part) for part in range(len(parts)))
+        return queued
+
+    def rpc_claim_outbox(self, params):
+        job_id, limit = params["p_job_id"], params["p_limit"]
+        key = (job_id, params.get("p_shard", 0), params.get("p_shards", 1))
+        if key not in self._queues:
+            # очередь шарда строится при первом обращении, дальше пополняется в _queue
+            self._queues[key] = [(k[1], k[2]) for k, row in self.outbox.items()
+                                 if k[0] == job_id and row["status"] == "pending" and row["owner"] is None
+                                 and self.shard_of(k[1], key[2]) == key[1]]
+            self._queue_sorted[key] = False
+        queue = self._queues[key]
+        if not self._queue_sorted[key]:
+            # очередь хранится в обратном порядке, чтобы забирать строки с конца
+            queue.sort(reverse=True)
+            self._queue_sorted[key] = True
+        rows = []
+        while queue and len(rows) < limit:
+            user_id, part = queue.pop()
+            row = self.outbox[(job_id, user_id, part)]
+            if row["status"] != "pending" or row["owner"] is not None:
+                continue
+            row["owner"] = params["p_owner"]
+            rows.append({"user_id": user_id, "part": part,
+                         "category_ids": sorted(self.subscriptions.get(user_id, ()))})
+        # UPDATE ... RETURNING в Postgres не обещает порядок строк
+        random.shuffle(rows)
+        return rows
+
+    def rpc_ack_outbox(self, params):
+        for ack in params["p_acks"]:
+            row = self.outbox[(params["p_job_id"], ack["user_id"], ack["part"])]
+            row["status"], row["acked_at"] = ack["status"], time.time()
+
+    def rpc_purge_delivery_outbox(self, params):
+        horizon = time.time() - params["p_days"] * 86400
+        purged = [key for key, row in self.outbox.items()
+                  if row["status"] != "pending" and row.get("acked_at", horizon) < horizon]
+        for key in purged:
+            del self.outbox[key]
+        alive = {key[0] for key in self.outbox}
+        for job_id in [job_id for job_id in self.delivery_jobs if job_id not in alive]:
+            del self.delivery_jobs[job_id]
+        return len(purged)
+
+    def rpc_get_pending_delivery_jobs(self, params):
+        pending = {key[0] for key, row in self.outbox.items() if row["status"] == "pending"}
+        return [{"id": job_id, "parts": parts} for job_id, parts in self.delivery_jobs.items() if job_id in pending]
+
+    def rpc_get_outbox_stats(self, params):
+        pending = sum(row["status"] == "pending" for row in self.outbox.values())
+        return [{"pending": pending, "oldest": None}]
+
+    def rpc_heartbeat_mailing_worker(self, params):
+        self.workers.add(params["p_owner"])
+        return len(self.workers)
+
+    def rpc_leave_mailing_workers(self, params):
+        self.workers.discard(params["p_owner"])
+
+    def rpc_create_broadcast_job(self, params):
+        job_id = len(self.broadcast_jobs) + 1
+        self.broadcast_jobs[job_id] = {
+            "id": job_id, "from_chat_id": params["p_from_chat_id"], "message_id": params["p_message_id"],
+            "status_chat_id": params["p_status_chat_id"], "status_message_id": params["p_status_message_id"],
+            "total": params["p_total"], "cursor": 0, "sent": 0, "blocked": 0, "failed": 0, "status": "running",
+            "owner": params["p_owner"], "lease_until": time.time() + params["p_lease"], "requested_status": None,
+        }
+        return job_id
+
+    def rpc_update_broadcast_job(self, params):
+        job = self.broadcast_jobs[params["p_id"]]
+        if job["owner"] != params["p_owner"]:
+            return None
+        for field in ("status", "cursor", "total", "sent", "blocked", "failed"):
+            job[field] = params[f"p_{field}"]
+        job["lease_until"] = time.time() + params["p_lease"]
+        return job["requested_status"] or ""
+
+    def rpc_get_unfinished_broadcast_jobs(self, params):
+        return [job for job in self.broadcast_jobs.values() if job["status"] in ("running", "paused")]
+
+    def rpc_claim_broadcast_jobs(self, params):
+        claimed = []
+        for job in self.rpc_get_unfinished_broadcast_jobs(params):
+            if job["lease_until"] < time.time():
+                job["owner"], job["lease_until"] = params["p_owner"], time.time() + params["p_lease"]
+                claimed.append(job)
+        return claimed
+
+    def rpc_control_broadcast_job(self, params):
+        job = self.broadcast_jobs.get(params["p_id"])
+        if job is None or job["status"] not in ("running", "paused"):
+            return False
+        job["requested_status"] = params["p_status"]
+        return True
+
+    def table_users(self):
+        return [{"user_id": user_id, "is_active": user_id not in self.inactive} for user_id in self.users]
+
+    def table_user_subscriptions(self):
+        return [{"user_id": u, "category_id": c}
+                for u, cats in self.subscriptions.items() for c in sorted(cats)]
+
+    def _apply_query(self, rows, query):
+        """Поддерживает eq./gt. фильтры, order и limit"""
+        ops = {"eq": lambda a, b: a == b, "gt": lambda a, b: a > b}
+        literals = {"true": True, "false": False}
+        for column, value in query.items():
+            if column in ("select", "order", "limit", "offset"):
+                continue
+            op, _, operand = value.partition(".")
+            operand = literals[operand.lower()] if operand.lower() in literals else int(operand)
+            rows = [row for row in rows if ops[op](row[column], operand)]
+        if "order" in query:
+            column, _, direction = query["order"].partition(".")
+            rows.sort(key=lambda row: row[column], reverse=direction == "desc")
+        total = len(rows)
+        if "limit" in query:
+            rows = rows[:int(query["limit"])]
+        rows = rows[:self.max_rows]
+        columns = query.get("select", "*")
+        if columns != "*":
+            names = columns.split(",")
+            rows = [{name: row[name] for name in names} for row in rows]
+        return rows, total
+
+    async def _rpc(self, request: web.Request):
+        name = request.match_info["fn"]
+        self._count(f"rpc/{name}")
+        handler = getattr(self, f"rpc_{name}", None)
+        if handler is None:
+            return web.json_response({"message": f"function {name} not found"}, status=404)
+        params = await request.json() if request.can_read_body else {}
+        await asyncio.sleep(self.delay())
+        result = handler(params)
+        if isinstance(result, list):
+            result = result[:self.max_rows]
+        return web.Response(text=json.dumps(result), content_type="application/json")
+
+    async def _table(self, request: web.Request):
+        name = request.match_info["table"]
+        self._count(name)
+        handler = getattr(self, f"table_{name}", None)
+        if handler is None:
+            return web.json_response({"message": f"table {name} not found"}, status=404)
+        await asyncio.sleep(self.delay())
+        rows, total = self._apply_query(handler(), request.query)
+        headers = {"Content-Range": f"0-{max(len(rows) - 1, 0)}/{total}"}
+        return web.Response(text=json.dumps(rows), content_type="application/json", headers=headers)
+
+    async def _stats(self, request: web.Request):
+        """Счетчики вызовов для бенчмарков, которые запускают клиентов в других процессах"""
+        return web.json_response(self.calls)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/rest/v1/rpc/{fn}", self._rpc)
+        app.router.add_get("/rest/v1/{table}", self._table)
+        app.router.add_get("/_stats", self._stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запустить сервер, вернуть базовый URL"""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Локальная замена PostgREST")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--latency-p99", type=float, default=0.0)
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--max-rows", type=int, default=1000)
+    args = parser.parse_args()
+    fake = FakePostgrest(users=args.users, categories=args.categories, latency=args.latency,
+                         latency_p99=args.latency_p99, max_rows=args.max_rows)
+    web.run_app(fake.app(), host="127.0.0.1", port=args.port, access_log=None, print=None)
@@ -0,0 +1,121 @@
+"""Локальная замена Telegram Bot API для бенчмарков.
+
+Отвечает на /bot<token>/<method> и ведет себя как Telegram под нагрузкой:
+общий лимит сообщений в секунду и пауза между сообщениями в один чат
+(превышение — 429 с retry_after), заблокировавшие бота пользователи — 403.
+"""
+import time
+import asyncio
+import json
+
+from aiohttp import web
+
+SEND_METHODS = {"sendmessage", "copymessage", "forwardmessage", "sendphoto", "senddocument"}
+
+
+class FakeTelegram:
+    def __init__(self, rate: float = 30, chat_interval: float = 1.0, blocked_every: int = 0,
+                 latency: float = 0.02, retry_after: int = 1):
+        self.rate = rate
+        self.chat_interval = chat_interval
+        # каждый blocked_every-й пользователь заблокировал бота (0 — никто)
+        self.blocked_every = blocked_every
+        self.latency = latency
+        self.retry_after = retry_after
+        self.calls: dict[str, int] = {}
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._chat_last: dict[int, float] = {}
+        self._message_id = 0
+
+    def _count(self, name: str):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def is_blocked(self, chat_id: int) -> bool:
+        return self.blocked_every > 0 and chat_id > 0 and chat_id % self.blocked_every == 0
+
+    def _throttled(self, chat_id: int) -> bool:
+        """Token bucket на весь бот плюс интервал на чат; допуск 10% на дрожание часов"""
+        now = time.monotonic()
+        self._tokens = min(float(self.rate), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        last = self._chat_last.get(chat_id)
+        if self._tokens < 1 or (last is not None and now - last < self.chat_interval * 0.9):
+            return True
+        self._tokens -= 1
+        self._chat_last[chat_id] = now
+        return False
+
+    def _message(self, chat_id: int, text: str = "") -> dict:
+        self._message_id += 1
+        return {"message_id": self._message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": text}
+
+    @staticmethod
+    def _error(code: int, description: str, **parameters) -> web.Response:
+        body = {"ok": False, "error_code": code, "description": description}
+        if parameters:
+            body["parameters"] = parameters
+        return web.Response(text=json.dumps(body), status=code, content_type="application/json")
+
+    async def _method(self, request: web.Request):
+        method = request.match_info["method"].lower()
+        params = dict(await request.post()) if request.can_read_body else {}
+        chat_id = int(params.get("chat_id", 0))
+        await asyncio.sleep(self.latency)
+        if method in SEND_METHODS:
+            if self.is_blocked(chat_id):
+                self._count(f"{method}:403")
+                return self._error(403, "Forbidden: bot was blocked by the user")
+            if self._throttled(chat_id):
+                self._count(f"{method}:429")
+                return self._error(429, f"Too Many Requests: retry after {self.retry_after}",
+                                   retry_after=self.retry_after)
+        self._count(method)
+        if method == "getme":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method == "copymessage":
+            self._message_id += 1
+            result = {"message_id": self._message_id}
+        elif method in ("sendmessage", "editmessagetext"):
+            result = self._message(chat_id, params.get("text", ""))
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _stats(self, request: web.Request):
+        """Счетчики вызовов для бенчмарков, которые запускают клиентов в других процессах"""
+        return web.json_response(self.calls)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._method)
+        app.router.add_get("/_stats", self._stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запустить сервер, вернуть базовый URL для TelegramAPIServer.from_base"""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Локальная замена Telegram Bot API")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--rate", type=float, default=30)
+    parser.add_argument("--chat-interval", type=float, default=1.0)
+    parser.add_argument("--blocked-every", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+    fake = FakeTelegram(rate=args.rate, chat_interval=args.chat_interval,
+                        blocked_every=args.blocked_every, latency=args.latency)
+    web.run_app(fake.app(), host="127.0.0.1", port=args.port, access_log=None, print=None)
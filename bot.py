@@ -1,9 +1,21 @@
 import asyncio
 import os
+import signal
 import logging
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from mailing.tech_news.tech_news import check_and_send_news
+from mailing.sources import discover as discover_sources
+from mailing.ingestion import start_ingestion
+from mailing.broadcast import broadcasts
+from mailing.outbox import MAILING_WORKERS, register_outbox_jobs, resume_pending
+from mailing.workers import share_delivery_rate
+from mailing.scheduling import SingleLeaderScheduler
+from database.client import close as close_db
+from database.supabase import keep_subscription_index_synced
+from database.fsm_storage import create_fsm_storage
+from utils import metrics
+from utils.lanes import scheduler as api_scheduler
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,28 +25,95 @@ logger = logging.getLogger(__name__)
 
 from handlers.user import router as user_router
 from handlers.admin import router as admin_router
+from utils.webhook import BoundedUpdateHandler
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+DROP_PENDING_UPDATES = os.getenv("DROP_PENDING_UPDATES", "0") == "1"
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
 
 scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
 
 
-async def main():
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher()
+def create_dispatcher():
+    dp = Dispatcher(storage=create_fsm_storage())
     dp.include_router(user_router)
     dp.include_router(admin_router)
-    scheduler.add_job(
-        check_and_send_news, 
-        "cron", 
-        hour='8-18', 
-        minute=15, 
-        args=[bot] 
+    return dp
+
+
+async def run_polling(bot: Bot, dp: Dispatcher):
+    await bot.delete_webhook(drop_pending_updates=DROP_PENDING_UPDATES)
+    await dp.start_polling(bot)
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    handler = BoundedUpdateHandler(dp, bot, secret_token=WEBHOOK_SECRET)
+    app = web.Application()
+    handler.register(app, WEBHOOK_PATH)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await dp.emit_startup(bot=bot)
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    await bot.set_webhook(
+        f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        drop_pending_updates=DROP_PENDING_UPDATES,
+        max_connections=WEBHOOK_MAX_CONNECTIONS
     )
+    logger.info(f"🌐 Webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+
+async def main():
+    bot = Bot(token=BOT_TOKEN)
+    dp = create_dispatcher()
+    metrics.install(dp, bot)
+    bot.session.middleware(api_scheduler)
+    metrics_runner = await metrics.start_server()
+    jobs = SingleLeaderScheduler(scheduler)
+    discover_sources()
+    ingestion = start_ingestion(bot, jobs)
+    register_outbox_jobs(jobs)
     scheduler.start()
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
-    logger.info("Start bot")
+    await jobs.catch_up()
+    broadcast_task = asyncio.create_task(broadcasts.keep_resuming(bot))
+    index_task = asyncio.create_task(keep_subscription_index_synced())
+    outbox_task = asyncio.create_task(resume_pending(bot))
+    rate_task = asyncio.create_task(share_delivery_rate()) if MAILING_WORKERS else None
+    logger.info(f"Start bot ({BOT_MODE})")
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            await run_polling(bot, dp)
+    finally:
+        outbox_task.cancel()
+        if rate_task is not None:
+            # дождаться выхода из mailing_workers до закрытия клиента БД
+            rate_task.cancel()
+            await asyncio.gather(rate_task, return_exceptions=True)
+        broadcast_task.cancel()
+        index_task.cancel()
+        if ingestion is not None:
+            ingestion.cancel()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await close_db()
    
 
 if __name__ == "__main__":
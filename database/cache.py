@@ -0,0 +1,161 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    stale: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class AsyncCache:
+    """Пространство имен кэша: TTL + LRU, нормализация ключей и single-flight.
+
+    Одновременные промахи по одному ключу ждут единственный запрос к БД. Запрос идет
+    в отдельной задаче: отмена вызова, который его начал, не прерывает загрузку для остальных.
+    С stale_ttl последнее загруженное значение хранится еще stale_ttl секунд:
+    после истечения ttl оно отдается сразу, а обновление идет в фоне
+    (stale-while-revalidate). Если загрузка не удалась, отдается оно же.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float,
+                 normalize: Callable[[Any], Hashable] = lambda key: key, stale_ttl: float = 0):
+        self.name = name
+        self.normalize = normalize
+        self.stats = CacheStats()
+        self._data = TTLCache(maxsize=maxsize, ttl=ttl)
+        # ключ -> (значение, можно ли отдавать без ошибки загрузки)
+        self._stale = TTLCache(maxsize=maxsize, ttl=stale_ttl) if stale_ttl else None
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+        self._loads: Set[asyncio.Task] = set()
+        caches[name] = self
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def peek(self, key, default=None):
+        """Значение без учета статистики и без загрузки"""
+        return self._data.get(self.normalize(key), default)
+
+    def _store(self, key, value):
+        self._data[key] = value
+        if self._stale is not None:
+            self._stale[key] = (value, True)
+
+    def set(self, key, value):
+        key = self.normalize(key)
+        self._store(key, value)
+        self._refreshing.pop(key, None)
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    def invalidate(self, key):
+        key = self.normalize(key)
+        self._data.pop(key, None)
+        self._inflight.pop(key, None)
+        self._refreshing.pop(key, None)
+        # устаревшее значение остается запасным на случай недоступности БД, но сразу его не отдаем
+        if self._stale is not None and key in self._stale:
+            self._stale[key] = (self._stale[key][0], False)
+
+    def clear(self):
+        self._data.clear()
+        self._inflight.clear()
+        self._refreshing.clear()
+        if self._stale is not None:
+            self._stale.clear()
+
+    def _revalidate(self, key, loader: Callable[[], Awaitable]):
+        async def refresh():
+            task = asyncio.current_task()
+            try:
+                value = await loader()
+            except Exception as e:
+                logger.warning(f"Кэш {self.name}: не удалось обновить {key!r}, отдается прежнее значение: {e}")
+            else:
+                # set/invalidate во время обновления отменяют его результат
+                if self._refreshing.get(key) is task:
+                    self._store(key, value)
+            finally:
+                if self._refreshing.get(key) is task:
+                    del self._refreshing[key]
+
+        if key not in self._refreshing:
+            self._refreshing[key] = asyncio.create_task(refresh())
+
+    async def get_or_load(self, key, loader: Callable[[], Awaitable]):
+        key = self.normalize(key)
+        value = self._data.get(key, _MISSING)
+        if value is not _MISSING:
+            self.stats.hits += 1
+            return value
+        self.stats.misses += 1
+        stale = self._stale.get(key) if self._stale is not None else None
+        if stale is not None and stale[1]:
+            self.stats.stale += 1
+            self._revalidate(key, loader)
+            return stale[0]
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats.coalesced += 1
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        task = asyncio.create_task(self._load(key, loader, future, stale))
+        self._loads.add(task)
+        task.add_done_callback(self._loads.discard)
+        return await asyncio.shield(future)
+
+    async def _load(self, key, loader: Callable[[], Awaitable], future: asyncio.Future, stale):
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            # загрузку отменяют только при остановке цикла; ожидающим — обычная ошибка, не отмена
+            self._fail(key, future, RuntimeError(f"Кэш {self.name}: загрузка {key!r} прервана"))
+            raise
+        except Exception as e:
+            if stale is None:
+                self._fail(key, future, e)
+                return
+            logger.warning(f"Кэш {self.name}: БД недоступна, отдается сохраненное значение {key!r}: {e}")
+            self.stats.stale += 1
+            value = stale[0]
+        else:
+            if self._inflight.get(key) is future:
+                self._store(key, value)
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.done():
+            future.set_result(value)
+
+    def _fail(self, key, future: asyncio.Future, error: Exception):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.done():
+            future.set_exception(error)
+            future.exception()
+
+
+caches: Dict[str, AsyncCache] = {}
+
+
+def cache_stats() -> Dict[str, CacheStats]:
+    """Статистика попаданий по всем пространствам имен"""
+    return {name: cache.stats for name, cache in caches.items()}
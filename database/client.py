@@ -0,0 +1,60 @@
+import os
+import logging
+
+import httpx
+from dotenv import load_dotenv
+from postgrest import AsyncPostgrestClient
+
+from database.resilience import ResilientTransport
+from utils.metrics import on_postgrest_request, on_postgrest_response
+
+load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "1") == "1"
+
+logger = logging.getLogger(__name__)
+
+if not SUPABASE_URL or not SUPABASE_KEY:
+    logger.critical("❌ Отсутствуют SUPABASE_URL или SUPABASE_KEY в .env!")
+else:
+    logger.info("✅ Переменные окружения для Supabase загружены.")
+
+
+def create_postgrest(url: str = SUPABASE_URL, key: str = SUPABASE_KEY,
+                     pool_size: int = SUPABASE_POOL_SIZE, timeout: float = SUPABASE_TIMEOUT,
+                     connect_timeout: float = SUPABASE_CONNECT_TIMEOUT,
+                     http2: bool = SUPABASE_HTTP2) -> AsyncPostgrestClient:
+    """Асинхронный PostgREST-клиент поверх общего пула HTTP/2 соединений.
+    Сроки запросов, повторы и предохранитель — в database/resilience.py"""
+    transport = httpx.AsyncHTTPTransport(
+        http2=http2,
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+    )
+    http_client = httpx.AsyncClient(
+        transport=ResilientTransport(transport),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        follow_redirects=True,
+        event_hooks={"request": [on_postgrest_request], "response": [on_postgrest_response]},
+    )
+    return AsyncPostgrestClient(
+        f"{url}/rest/v1",
+        headers={"apikey": key, "Authorization": f"Bearer {key}"},
+        http_client=http_client,
+    )
+
+
+try:
+    postgrest = create_postgrest()
+except Exception as e:
+    logger.critical(f"❌ Ошибка подключения к Supabase: {e}", exc_info=True)
+    raise e
+
+
+async def close():
+    """Закрыть пул соединений при остановке бота"""
+    await postgrest.aclose()
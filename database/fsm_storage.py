@@ -0,0 +1,161 @@
+import os
+import copy
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_SQLITE_PATH = os.getenv("FSM_SQLITE_PATH", "fsm.sqlite3")
+FSM_REDIS_URL = os.getenv("FSM_REDIS_URL", "redis://localhost:6379/0")
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", str(3600 * 24)))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.5"))
+
+_SCHEMA = """
+create table if not exists fsm (
+    key text primary key,
+    state text,
+    data text not null default '{}',
+    expires_at real not null
+)
+"""
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в SQLite (WAL) с TTL и пакетной записью.
+
+    Записи копятся в памяти и сбрасываются одной транзакцией раз в flush_interval,
+    чтения сначала смотрят в этот буфер. Брошенные состояния истекают через ttl.
+    """
+
+    def __init__(self, path: str = FSM_SQLITE_PATH, ttl: int = FSM_STATE_TTL,
+                 flush_interval: float = FSM_FLUSH_INTERVAL):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-sqlite")
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("pragma synchronous=normal")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+        self._buffer: Dict[str, list] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _select_sync(self, key: str):
+        return self._conn.execute(
+            "select state, data from fsm where key = ? and expires_at > ?", (key, time.time())
+        ).fetchone()
+
+    def _write_sync(self, rows):
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "insert into fsm (key, state, data, expires_at) values (?, ?, ?, ?) "
+                "on conflict(key) do update set state = excluded.state, data = excluded.data, "
+                "expires_at = excluded.expires_at",
+                [(key, state, json.dumps(data), expires_at)
+                 for key, (state, data, expires_at) in rows
+                 if state is not None or data]
+            )
+            self._conn.executemany(
+                "delete from fsm where key = ?",
+                [(key,) for key, (state, data, _) in rows if state is None and not data]
+            )
+            self._conn.execute("delete from fsm where expires_at <= ?", (now,))
+
+    async def _load(self, key: str) -> list:
+        record = self._buffer.get(key)
+        if record is not None and record[2] > time.time():
+            return record
+        row = await self._run(self._select_sync, key)
+        if row is None:
+            return [None, {}, 0.0]
+        return [row[0], json.loads(row[1]), 0.0]
+
+    def _schedule_flush(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        """Записать накопленные изменения одной транзакцией"""
+        if not self._buffer:
+            return
+        rows, self._buffer = list(self._buffer.items()), {}
+        try:
+            await self._run(self._write_sync, rows)
+        except Exception as e:
+            logger.error(f"Ошибка записи FSM в SQLite: {e}")
+            for key, record in rows:
+                self._buffer.setdefault(key, record)
+
+    async def _store(self, key: StorageKey, state=..., data=...):
+        skey = self.key_builder.build(key)
+        record = await self._load(skey)
+        if state is not ...:
+            record[0] = state
+        if data is not ...:
+            record[1] = data
+        record[2] = time.time() + self.ttl
+        self._buffer[skey] = record
+        self._schedule_flush()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._store(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(self.key_builder.build(key)))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._store(key, data=copy.deepcopy(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy.deepcopy((await self._load(self.key_builder.build(key)))[1])
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+        await self.flush()
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=True)
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Хранилище FSM по настройке FSM_STORAGE: sqlite (по умолчанию), redis или memory"""
+    if FSM_STORAGE == "redis":
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError:
+            logger.critical("❌ Для FSM_STORAGE=redis установите пакет redis")
+            raise
+        logger.info("✅ FSM хранится в Redis")
+        return RedisStorage.from_url(
+            FSM_REDIS_URL,
+            key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+            state_ttl=FSM_STATE_TTL,
+            data_ttl=FSM_STATE_TTL
+        )
+    if FSM_STORAGE == "memory":
+        logger.info("✅ FSM хранится в памяти процесса")
+        return MemoryStorage()
+    logger.info(f"✅ FSM хранится в SQLite: {FSM_SQLITE_PATH}")
+    return SQLiteStorage()
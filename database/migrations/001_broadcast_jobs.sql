@@ -0,0 +1,42 @@
+-- Фоновые рассылки администратора с сохраняемым курсором
+
+create table if not exists broadcast_jobs (
+    id bigint generated always as identity primary key,
+    from_chat_id bigint not null,
+    message_id bigint not null,
+    status_chat_id bigint not null,
+    status_message_id bigint not null,
+    status text not null default 'running',
+    cursor bigint not null default 0,
+    total integer not null default 0,
+    sent integer not null default 0,
+    blocked integer not null default 0,
+    failed integer not null default 0,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create or replace function create_broadcast_job(
+    p_from_chat_id bigint, p_message_id bigint,
+    p_status_chat_id bigint, p_status_message_id bigint, p_total integer
+) returns bigint language sql as $$
+    insert into broadcast_jobs (from_chat_id, message_id, status_chat_id, status_message_id, total)
+    values (p_from_chat_id, p_message_id, p_status_chat_id, p_status_message_id, p_total)
+    returning id;
+$$;
+
+create or replace function update_broadcast_job(
+    p_id bigint, p_status text, p_cursor bigint, p_total integer,
+    p_sent integer, p_blocked integer, p_failed integer
+) returns void language sql as $$
+    update broadcast_jobs
+    set status = p_status, cursor = p_cursor, total = p_total,
+        sent = p_sent, blocked = p_blocked, failed = p_failed,
+        updated_at = now()
+    where id = p_id;
+$$;
+
+create or replace function get_unfinished_broadcast_jobs()
+returns setof broadcast_jobs language sql stable as $$
+    select * from broadcast_jobs where status in ('running', 'paused') order by id;
+$$;
@@ -0,0 +1,4 @@
+-- Индексы для постраничного обхода подписчиков по user_id (keyset pagination)
+
+create index if not exists user_subscriptions_category_user_idx
+    on user_subscriptions (category_id, user_id);
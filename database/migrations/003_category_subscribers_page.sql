@@ -0,0 +1,13 @@
+-- Страница подписчиков категории вместе со всеми их подписками (для прогрева кэша)
+
+create or replace function get_category_subscribers_page(
+    p_category_id bigint, p_after bigint, p_limit integer
+) returns table (user_id bigint, category_ids bigint[]) language sql stable as $$
+    select s.user_id, array_agg(a.category_id order by a.category_id)
+    from user_subscriptions s
+    join user_subscriptions a on a.user_id = s.user_id
+    where s.category_id = p_category_id and s.user_id > p_after
+    group by s.user_id
+    order by s.user_id
+    limit p_limit;
+$$;
@@ -0,0 +1,23 @@
+-- Журнал запусков плановых задач: каждое срабатывание захватывает ровно одна реплика
+
+create table if not exists job_runs (
+    job_id text not null,
+    fire_time timestamptz not null,
+    owner text not null,
+    claimed_at timestamptz not null default now(),
+    primary key (job_id, fire_time)
+);
+
+create or replace function claim_job_run(p_job_id text, p_fire_time timestamptz, p_owner text)
+returns boolean language plpgsql as $$
+begin
+    insert into job_runs (job_id, fire_time, owner) values (p_job_id, p_fire_time, p_owner)
+    on conflict do nothing;
+    return found;
+end;
+$$;
+
+create or replace function get_last_job_run(p_job_id text)
+returns timestamptz language sql stable as $$
+    select max(fire_time) from job_runs where job_id = p_job_id;
+$$;
@@ -0,0 +1,80 @@
+-- Персистентная очередь доставки: строка на (рассылка, пользователь, часть сообщения)
+
+create table if not exists delivery_jobs (
+    id text primary key,
+    parts jsonb not null,
+    created_at timestamptz not null default now()
+);
+
+create table if not exists delivery_outbox (
+    job_id text not null references delivery_jobs (id) on delete cascade,
+    user_id bigint not null,
+    part integer not null,
+    status text not null default 'pending',
+    owner text,
+    claimed_at timestamptz,
+    created_at timestamptz not null default now(),
+    acked_at timestamptz,
+    primary key (job_id, user_id, part)
+);
+
+create index if not exists delivery_outbox_pending_idx
+    on delivery_outbox (job_id, user_id, part) where status = 'pending';
+
+-- Создает рассылку и ставит в очередь всех подписчиков категории; повторный вызов ничего не дублирует
+create or replace function create_delivery_job(p_job_id text, p_parts jsonb, p_category_id bigint)
+returns integer language plpgsql as $$
+declare
+    v_count integer;
+begin
+    insert into delivery_jobs (id, parts) values (p_job_id, p_parts) on conflict do nothing;
+    insert into delivery_outbox (job_id, user_id, part)
+    select p_job_id, s.user_id, p.part
+    from user_subscriptions s
+    cross join generate_series(0, jsonb_array_length(p_parts) - 1) as p(part)
+    where s.category_id = p_category_id
+    on conflict do nothing;
+    get diagnostics v_count = row_count;
+    return v_count;
+end;
+$$;
+
+-- Забирает пачку невыполненных задач; чужие захваты старше p_claim_timeout сек. считаются брошенными.
+-- category_ids — текущие подписки пользователя, чтобы бот прогрел кэш без отдельных запросов
+create or replace function claim_outbox(p_job_id text, p_owner text, p_limit integer, p_claim_timeout integer)
+returns table (user_id bigint, part integer, category_ids bigint[]) language sql as $$
+    update delivery_outbox o
+    set owner = p_owner, claimed_at = now()
+    from (
+        select job_id, user_id, part from delivery_outbox
+        where job_id = p_job_id and status = 'pending'
+          and (claimed_at is null or claimed_at < now() - make_interval(secs => p_claim_timeout))
+        order by user_id, part
+        limit p_limit
+        for update skip locked
+    ) c
+    where o.job_id = c.job_id and o.user_id = c.user_id and o.part = c.part
+    returning o.user_id, o.part,
+        array(select s.category_id from user_subscriptions s where s.user_id = o.user_id order by s.category_id);
+$$;
+
+-- Пакетное подтверждение: p_acks = [{"user_id": ..., "part": ..., "status": "sent|blocked|failed"}, ...]
+create or replace function ack_outbox(p_job_id text, p_acks jsonb)
+returns void language sql as $$
+    update delivery_outbox o
+    set status = a.status, acked_at = now()
+    from jsonb_to_recordset(p_acks) as a(user_id bigint, part integer, status text)
+    where o.job_id = p_job_id and o.user_id = a.user_id and o.part = a.part;
+$$;
+
+create or replace function get_pending_delivery_jobs()
+returns table (id text, parts jsonb) language sql stable as $$
+    select j.id, j.parts from delivery_jobs j
+    where exists (select 1 from delivery_outbox o where o.job_id = j.id and o.status = 'pending')
+    order by j.created_at;
+$$;
+
+create or replace function get_outbox_stats()
+returns table (pending bigint, oldest timestamptz) language sql stable as $$
+    select count(*), min(created_at) from delivery_outbox where status = 'pending';
+$$;
@@ -0,0 +1,60 @@
+-- Пользователи, заблокировавшие бота или удалившие аккаунт, исключаются из рассылок
+
+alter table users add column if not exists is_active boolean not null default true;
+alter table users add column if not exists deactivated_at timestamptz;
+
+create index if not exists users_active_idx on users (user_id) where is_active;
+
+-- Пакетная пометка неактивных пользователей, возвращает число реально отключенных
+create or replace function deactivate_users(p_user_ids bigint[])
+returns integer language plpgsql as $$
+declare
+    v_count integer;
+begin
+    update users set is_active = false, deactivated_at = now()
+    where user_id = any(p_user_ids) and is_active;
+    get diagnostics v_count = row_count;
+    return v_count;
+end;
+$$;
+
+-- Возврат пользователя в рассылки после /start; true, если он был отключен
+create or replace function reactivate_user(p_user_id bigint)
+returns boolean language plpgsql as $$
+begin
+    update users set is_active = true, deactivated_at = null
+    where user_id = p_user_id and not is_active;
+    return found;
+end;
+$$;
+
+create or replace function get_category_subscribers_page(
+    p_category_id bigint, p_after bigint, p_limit integer
+) returns table (user_id bigint, category_ids bigint[]) language sql stable as $$
+    select s.user_id, array_agg(a.category_id order by a.category_id)
+    from user_subscriptions s
+    join user_subscriptions a on a.user_id = s.user_id
+    where s.category_id = p_category_id and s.user_id > p_after
+      and not exists (select 1 from users u where u.user_id = s.user_id and not u.is_active)
+    group by s.user_id
+    order by s.user_id
+    limit p_limit;
+$$;
+
+create or replace function create_delivery_job(p_job_id text, p_parts jsonb, p_category_id bigint)
+returns integer language plpgsql as $$
+declare
+    v_count integer;
+begin
+    insert into delivery_jobs (id, parts) values (p_job_id, p_parts) on conflict do nothing;
+    insert into delivery_outbox (job_id, user_id, part)
+    select p_job_id, s.user_id, p.part
+    from user_subscriptions s
+    cross join generate_series(0, jsonb_array_length(p_parts) - 1) as p(part)
+    where s.category_id = p_category_id
+      and not exists (select 1 from users u where u.user_id = s.user_id and not u.is_active)
+    on conflict do nothing;
+    get diagnostics v_count = row_count;
+    return v_count;
+end;
+$$;
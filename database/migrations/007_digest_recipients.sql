@@ -0,0 +1,31 @@
+-- Сводные дайджесты: один проход по подписчикам всех категорий, у которых есть новости
+
+create or replace function get_digest_recipients_page(
+    p_category_ids bigint[], p_after bigint, p_limit integer
+) returns table (user_id bigint, category_ids bigint[]) language sql stable as $$
+    select s.user_id, array_agg(s.category_id order by s.category_id)
+    from user_subscriptions s
+    where s.user_id > p_after
+      and not exists (select 1 from users u where u.user_id = s.user_id and not u.is_active)
+    group by s.user_id
+    having bool_or(s.category_id = any(p_category_ids))
+    order by s.user_id
+    limit p_limit;
+$$;
+
+-- Постановка в очередь доставки для явного списка пользователей (один вариант дайджеста)
+create or replace function enqueue_delivery(p_job_id text, p_parts jsonb, p_user_ids bigint[])
+returns integer language plpgsql as $$
+declare
+    v_count integer;
+begin
+    insert into delivery_jobs (id, parts) values (p_job_id, p_parts) on conflict do nothing;
+    insert into delivery_outbox (job_id, user_id, part)
+    select p_job_id, u.user_id, p.part
+    from unnest(p_user_ids) as u(user_id)
+    cross join generate_series(0, jsonb_array_length(p_parts) - 1) as p(part)
+    on conflict do nothing;
+    get diagnostics v_count = row_count;
+    return v_count;
+end;
+$$;
@@ -0,0 +1,70 @@
+-- Лента изменений подписок для инкрементальной синхронизации индекса подписчиков в памяти бота
+
+create table if not exists subscription_changes (
+    id bigserial primary key,
+    user_id bigint not null,
+    changed_at timestamptz not null default now()
+);
+
+create index if not exists subscription_changes_changed_at_idx on subscription_changes (changed_at);
+
+create or replace function log_subscription_change()
+returns trigger language plpgsql as $$
+begin
+    insert into subscription_changes (user_id) values (coalesce(new.user_id, old.user_id));
+    return null;
+end;
+$$;
+
+drop trigger if exists user_subscriptions_changes on user_subscriptions;
+create trigger user_subscriptions_changes
+    after insert or delete or update on user_subscriptions
+    for each row execute function log_subscription_change();
+
+drop trigger if exists users_active_changes on users;
+create trigger users_active_changes
+    after update of is_active on users
+    for each row when (old.is_active is distinct from new.is_active)
+    execute function log_subscription_change();
+
+-- Снимок: все пользователи с подписками или отключенные, по возрастанию user_id
+create or replace function get_subscription_snapshot_page(p_after bigint, p_limit integer)
+returns table (user_id bigint, category_ids bigint[], is_active boolean) language sql stable as $$
+    select p.user_id,
+           coalesce(array(select s.category_id from user_subscriptions s
+                          where s.user_id = p.user_id order by s.category_id), '{}'),
+           coalesce((select u.is_active from users u where u.user_id = p.user_id), true)
+    from (
+        select user_id from user_subscriptions where user_id > p_after
+        union
+        select user_id from users where not is_active and user_id > p_after
+        order by user_id
+        limit p_limit
+    ) p
+    order by p.user_id;
+$$;
+
+create or replace function get_subscription_changes_cursor()
+returns bigint language sql stable as $$
+    select coalesce(max(id), 0) from subscription_changes;
+$$;
+
+-- Изменения после курсора: текущее состояние каждого затронутого пользователя и id последнего изменения.
+-- Самые свежие записи придерживаются, чтобы не перескочить id еще не закоммиченных транзакций
+create or replace function get_subscription_changes(p_after bigint, p_limit integer)
+returns table (id bigint, user_id bigint, category_ids bigint[], is_active boolean) language sql stable as $$
+    select max(c.id), c.user_id,
+           coalesce(array(select s.category_id from user_subscriptions s
+                          where s.user_id = c.user_id order by s.category_id), '{}'),
+           coalesce((select u.is_active from users u where u.user_id = c.user_id), true)
+    from (
+        select id, user_id from subscription_changes
+        where id > p_after and changed_at < now() - interval '2 seconds'
+        order by id limit p_limit
+    ) c
+    group by c.user_id
+    order by 1;
+$$;
+
+-- Ленту достаточно хранить дольше самого долгого простоя бота, например через pg_cron:
+-- delete from subscription_changes where changed_at < now() - interval '7 days';
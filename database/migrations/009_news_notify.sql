@@ -0,0 +1,14 @@
+-- Уведомление бота о новых новостях: NOTIFY news_ingest с именем источника в payload
+
+create or replace function notify_news_ingest()
+returns trigger language plpgsql as $$
+begin
+    perform pg_notify('news_ingest', tg_argv[0]);
+    return null;
+end;
+$$;
+
+drop trigger if exists tech_news_notify on tech_news;
+create trigger tech_news_notify
+    after insert on tech_news
+    for each statement execute function notify_news_ingest('tech_news');
@@ -0,0 +1,53 @@
+-- Шардированная доставка: воркеры делят получателей рассылки по хэшу user_id
+-- и общий лимит скорости по числу живых воркеров
+
+create table if not exists mailing_workers (
+    owner text primary key,
+    shard integer not null,
+    shards integer not null,
+    seen_at timestamptz not null default now()
+);
+
+-- Новая сигнатура с p_shard/p_shards; со старой вызов с четырьмя параметрами был бы неоднозначным
+drop function if exists claim_outbox(text, text, integer, integer);
+
+-- Как в 005, но только строки своего шарда: (hashint8(user_id) & 0x7fffffff) % p_shards = p_shard.
+-- Без p_shard/p_shards (один процесс) забирает все строки
+create or replace function claim_outbox(p_job_id text, p_owner text, p_limit integer, p_claim_timeout integer,
+                                        p_shard integer default 0, p_shards integer default 1)
+returns table (user_id bigint, part integer, category_ids bigint[]) language sql as $$
+    update delivery_outbox o
+    set owner = p_owner, claimed_at = now()
+    from (
+        select job_id, user_id, part from delivery_outbox
+        where job_id = p_job_id and status = 'pending'
+          and (claimed_at is null or claimed_at < now() - make_interval(secs => p_claim_timeout))
+          and (p_shards <= 1 or (hashint8(user_id) & 2147483647) % p_shards = p_shard)
+        order by user_id, part
+        limit p_limit
+        for update skip locked
+    ) c
+    where o.job_id = c.job_id and o.user_id = c.user_id and o.part = c.part
+    returning o.user_id, o.part,
+        array(select s.category_id from user_subscriptions s where s.user_id = o.user_id order by s.category_id);
+$$;
+
+-- Отметка живого воркера; возвращает число воркеров, отметившихся за последние p_ttl секунд
+create or replace function heartbeat_mailing_worker(p_owner text, p_shard integer, p_shards integer, p_ttl integer)
+returns integer language plpgsql as $$
+declare
+    v_count integer;
+begin
+    delete from mailing_workers where seen_at < now() - make_interval(secs => p_ttl);
+    insert into mailing_workers (owner, shard, shards) values (p_owner, p_shard, p_shards)
+    on conflict (owner) do update set shard = excluded.shard, shards = excluded.shards, seen_at = now();
+    select count(*) into v_count from mailing_workers;
+    return v_count;
+end;
+$$;
+
+-- Снять отметку при штатной остановке, чтобы остальные сразу забрали его долю лимита
+create or replace function leave_mailing_workers(p_owner text)
+returns void language sql as $$
+    delete from mailing_workers where owner = p_owner;
+$$;
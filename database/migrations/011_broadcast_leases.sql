@@ -0,0 +1,63 @@
+-- Владение фоновыми рассылками: рассылку ведет одна реплика, пока продлевает аренду.
+-- Остальные подхватывают ее, только когда аренда истекла (реплика упала или остановлена)
+
+alter table broadcast_jobs add column if not exists owner text;
+alter table broadcast_jobs add column if not exists lease_until timestamptz;
+-- Пауза/продолжение/отмена, запрошенные с любой реплики; владелец применяет при продлении аренды
+alter table broadcast_jobs add column if not exists requested_status text;
+
+drop function if exists create_broadcast_job(bigint, bigint, bigint, bigint, integer);
+
+create or replace function create_broadcast_job(
+    p_from_chat_id bigint, p_message_id bigint,
+    p_status_chat_id bigint, p_status_message_id bigint, p_total integer,
+    p_owner text, p_lease integer
+) returns bigint language sql as $$
+    insert into broadcast_jobs (from_chat_id, message_id, status_chat_id, status_message_id, total,
+                                owner, lease_until)
+    values (p_from_chat_id, p_message_id, p_status_chat_id, p_status_message_id, p_total,
+            p_owner, now() + make_interval(secs => p_lease))
+    returning id;
+$$;
+
+drop function if exists update_broadcast_job(bigint, text, bigint, integer, integer, integer, integer);
+
+-- Сохранить прогресс и продлить аренду. Возвращает запрошенный статус ('' — нет запроса)
+-- или null, если рассылку уже ведет другая реплика
+create or replace function update_broadcast_job(
+    p_id bigint, p_status text, p_cursor bigint, p_total integer,
+    p_sent integer, p_blocked integer, p_failed integer,
+    p_owner text, p_lease integer
+) returns text language sql as $$
+    update broadcast_jobs
+    set status = p_status, cursor = p_cursor, total = p_total,
+        sent = p_sent, blocked = p_blocked, failed = p_failed,
+        lease_until = now() + make_interval(secs => p_lease),
+        updated_at = now()
+    where id = p_id and owner = p_owner
+    returning coalesce(requested_status, '');
+$$;
+
+-- Забрать незавершенные рассылки с истекшей арендой
+create or replace function claim_broadcast_jobs(p_owner text, p_lease integer)
+returns setof broadcast_jobs language sql as $$
+    update broadcast_jobs b
+    set owner = p_owner, lease_until = now() + make_interval(secs => p_lease)
+    from (
+        select id from broadcast_jobs
+        where status in ('running', 'paused') and (lease_until is null or lease_until < now())
+        order by id
+        for update skip locked
+    ) c
+    where b.id = c.id
+    returning b.*;
+$$;
+
+create or replace function control_broadcast_job(p_id bigint, p_status text)
+returns boolean language plpgsql as $$
+begin
+    update broadcast_jobs set requested_status = p_status
+    where id = p_id and status in ('running', 'paused');
+    return found;
+end;
+$$;
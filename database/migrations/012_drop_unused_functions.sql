@@ -0,0 +1,5 @@
+-- Рассылка по одной категории заменена сводными дайджестами (007) и enqueue_delivery:
+-- эти функции больше никто не вызывает
+
+drop function if exists create_delivery_job(text, jsonb, bigint);
+drop function if exists get_category_subscribers_page(bigint, bigint, integer);
@@ -0,0 +1,27 @@
+-- UPDATE ... RETURNING не сохраняет порядок подзапроса: строки одного пользователя могли
+-- прийти вперемешку с чужими, и бот слал части дайджеста не по порядку или дважды.
+-- Забранные строки возвращаются отсортированными по (user_id, part)
+
+create or replace function claim_outbox(p_job_id text, p_owner text, p_limit integer, p_claim_timeout integer,
+                                        p_shard integer default 0, p_shards integer default 1)
+returns table (user_id bigint, part integer, category_ids bigint[]) language sql as $$
+    with claimed as (
+        update delivery_outbox o
+        set owner = p_owner, claimed_at = now()
+        from (
+            select job_id, user_id, part from delivery_outbox
+            where job_id = p_job_id and status = 'pending'
+              and (claimed_at is null or claimed_at < now() - make_interval(secs => p_claim_timeout))
+              and (p_shards <= 1 or (hashint8(user_id) & 2147483647) % p_shards = p_shard)
+            order by user_id, part
+            limit p_limit
+            for update skip locked
+        ) c
+        where o.job_id = c.job_id and o.user_id = c.user_id and o.part = c.part
+        returning o.user_id, o.part
+    )
+    select c.user_id, c.part,
+        array(select s.category_id from user_subscriptions s where s.user_id = c.user_id order by s.category_id)
+    from claimed c
+    order by c.user_id, c.part;
+$$;
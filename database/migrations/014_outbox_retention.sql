@@ -0,0 +1,20 @@
+-- Очистка очереди доставки: строки с итоговым статусом (sent, blocked, failed) старше p_days дней
+-- удаляются, затем рассылки, у которых не осталось строк. Вызывается задачей планировщика purge_outbox
+
+create index if not exists delivery_outbox_acked_idx
+    on delivery_outbox (acked_at) where status <> 'pending';
+
+create or replace function purge_delivery_outbox(p_days integer)
+returns integer language plpgsql as $$
+declare
+    v_count integer;
+begin
+    delete from delivery_outbox
+    where status <> 'pending' and acked_at < now() - make_interval(days => p_days);
+    get diagnostics v_count = row_count;
+    delete from delivery_jobs j
+    where j.created_at < now() - make_interval(days => p_days)
+      and not exists (select 1 from delivery_outbox o where o.job_id = j.id);
+    return v_count;
+end;
+$$;
@@ -0,0 +1,183 @@
+import os
+import time
+import random
+import asyncio
+import logging
+
+import httpx
+from dotenv import load_dotenv
+
+from utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Срок на весь запрос к PostgREST, включая чтение ответа; SUPABASE_TIMEOUT в client.py — на каждую операцию сокета
+SUPABASE_RPC_TIMEOUT = float(os.getenv("SUPABASE_RPC_TIMEOUT", "5"))
+# Свои сроки для тяжелых RPC: "имя=секунды,имя=секунды"
+SUPABASE_RPC_TIMEOUTS = os.getenv(
+    "SUPABASE_RPC_TIMEOUTS",
+    "get_subscription_snapshot_page=30,enqueue_delivery=20,purge_delivery_outbox=60,fetch_and_update_tech_news=15"
+)
+SUPABASE_RETRIES = int(os.getenv("SUPABASE_RETRIES", "2"))
+SUPABASE_RETRY_BASE = float(os.getenv("SUPABASE_RETRY_BASE", "0.1"))
+SUPABASE_RETRY_MAX = float(os.getenv("SUPABASE_RETRY_MAX", "1"))
+SUPABASE_BREAKER_FAILURES = int(os.getenv("SUPABASE_BREAKER_FAILURES", "5"))
+SUPABASE_BREAKER_COOLDOWN = float(os.getenv("SUPABASE_BREAKER_COOLDOWN", "15"))
+
+# Повторяются только запросы, повтор которых безопасен, даже если первый успел выполниться:
+# чтения таблиц (GET) и перечисленные RPC. Остальные RPC (add_new_category, create_broadcast_job,
+# claim_outbox, claim_broadcast_jobs, claim_job_run, fetch_and_update_tech_news) меняют состояние так,
+# что повтор после потерянного ответа создаст дубликат или потеряет уже забранные строки
+IDEMPOTENT_RPCS = {
+    "get_all_categories", "get_category_description", "get_user_subscriptions", "get_categories_stats",
+    "get_unique_subscribers_count", "get_digest_recipients_page",
+    "get_subscription_snapshot_page", "get_subscription_changes_cursor", "get_subscription_changes",
+    "get_unfinished_broadcast_jobs", "get_pending_delivery_jobs", "get_outbox_stats", "get_last_job_run",
+    "update_user_subscriptions", "update_category_field", "delete_category", "update_broadcast_job",
+    "control_broadcast_job", "deactivate_users", "reactivate_user", "enqueue_delivery", "ack_outbox",
+    "heartbeat_mailing_worker", "leave_mailing_workers", "purge_delivery_outbox",
+}
+# Бэкенд недоступен (шлюз, пул соединений PostgREST); 500 — ошибка SQL, ее повтор не поможет
+TRANSIENT_STATUSES = {502, 503, 504}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+BREAKER_STATUS_LABELS = {CLOSED: "✅ доступен", HALF_OPEN: "🟡 пробный запрос", OPEN: "🔴 недоступен"}
+
+
+def _parse_timeouts(value: str) -> dict:
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, seconds = item.partition("=")
+        timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Supabase недоступен, запрос отклонен без обращения к сети"""
+
+
+class CircuitBreaker:
+    """Предохранитель на весь бэкенд.
+
+    После failures подряд неудачных запросов размыкается: cooldown секунд запросы
+    сразу завершаются CircuitOpenError, и обработчики не ждут таймаута. Затем
+    пропускает один пробный запрос: успех замыкает цепь, ошибка размыкает снова.
+    """
+
+    def __init__(self, failures: int = SUPABASE_BREAKER_FAILURES, cooldown: float = SUPABASE_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self._failed = 0
+        self._opened_at = 0.0
+        self._probe_at = 0.0
+
+    def allow(self):
+        if self.state == CLOSED:
+            return
+        now = time.monotonic()
+        if self.state == OPEN and now - self._opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self._probe_at = 0.0
+        # пробный запрос мог быть отменен, не дождавшись ответа: через cooldown пускаем следующий
+        if self.state == HALF_OPEN and now - self._probe_at >= self.cooldown:
+            self._probe_at = now
+            return
+        raise CircuitOpenError("Supabase недоступен, предохранитель разомкнут")
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info("🔌 Supabase снова отвечает, предохранитель замкнут")
+        self.state = CLOSED
+        self._failed = 0
+
+    def record_failure(self):
+        self._failed += 1
+        if self.state == HALF_OPEN or self._failed >= self.failures:
+            if self.state != OPEN:
+                logger.error(f"🔌 Supabase не отвечает ({self._failed} ошибок подряд), "
+                             f"запросы отклоняются {self.cooldown:.0f} сек.")
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker()
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """Транспорт httpx для PostgREST: срок на запрос, повторы с jitter и предохранитель.
+
+    Повторяются только сбои сети, истечение срока и 502/503/504, и только для
+    запросов, заведомо безопасных для повтора (GET и IDEMPOTENT_RPCS). Ответы 4xx и 500 значат, что бэкенд жив, и
+    возвращаются как есть.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker = breaker,
+                 timeout: float = SUPABASE_RPC_TIMEOUT, timeouts: dict = None,
+                 retries: int = SUPABASE_RETRIES, retry_base: float = SUPABASE_RETRY_BASE,
+                 retry_max: float = SUPABASE_RETRY_MAX):
+        self.transport = transport
+        self.breaker = breaker
+        self.timeout = timeout
+        self.timeouts = _parse_timeouts(SUPABASE_RPC_TIMEOUTS) if timeouts is None else timeouts
+        self.retries = retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+    async def _send(self, request: httpx.Request, timeout: float) -> httpx.Response:
+        async def send():
+            response = await self.transport.handle_async_request(request)
+            try:
+                await response.aread()
+            finally:
+                await response.aclose()
+            return response
+
+        try:
+            return await asyncio.wait_for(send(), timeout)
+        except asyncio.TimeoutError:
+            raise httpx.TimeoutException(f"Нет ответа за {timeout:.1f} сек.", request=request) from None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = request.url.path.split("/rest/v1/", 1)[-1]
+        name = endpoint.removeprefix("rpc/")
+        idempotent = request.method in ("GET", "HEAD") or (endpoint.startswith("rpc/") and name in IDEMPOTENT_RPCS)
+        retries = self.retries if idempotent else 0
+        timeout = self.timeouts.get(name, self.timeout)
+        attempt = 0
+        while True:
+            try:
+                self.breaker.allow()
+            except CircuitOpenError:
+                metrics.postgrest_failures.inc(endpoint, "circuit_open")
+                raise
+            try:
+                response = await self._send(request, timeout)
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                reason, error, response = type(e).__name__, e, None
+            else:
+                if response.status_code not in TRANSIENT_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                reason, error = str(response.status_code), None
+            metrics.postgrest_failures.inc(endpoint, reason)
+            if attempt >= retries or self.breaker.state == OPEN:
+                if error is not None:
+                    raise error
+                return response
+            attempt += 1
+            logger.warning(f"Повтор {attempt}/{retries} запроса {endpoint} после {reason}")
+            # full jitter: одновременные повторы многих обработчиков не приходят к бэкенду разом
+            await asyncio.sleep(random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt)))
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+@metrics.collector
+def _collect_breaker():
+    metrics.postgrest_circuit.set((CLOSED, HALF_OPEN, OPEN).index(breaker.state))
@@ -0,0 +1,184 @@
+import heapq
+import logging
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+from typing import AsyncIterable, Dict, Iterable, Iterator, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Порог накопленных изменений категории, после которого они вливаются в основной массив
+COMPACT_THRESHOLD = 1024
+
+
+def _contains(members: array, user_id: int) -> bool:
+    i = bisect_left(members, user_id)
+    return i < len(members) and members[i] == user_id
+
+
+def _tagged(members: array, start: int, category_id: int):
+    for i in range(start, len(members)):
+        yield members[i], category_id
+
+
+class SubscriptionIndex:
+    """Компактный индекс категория → подписчики в памяти процесса.
+
+    Подписчики каждой категории хранятся отсортированным array('q') (8 байт на подписку).
+    Точечные изменения копятся в небольших множествах добавленных/удаленных и вливаются
+    в массив при чтении или по достижении COMPACT_THRESHOLD. Отключенные пользователи
+    остаются в массивах и отфильтровываются при выдаче. Число активных подписчиков
+    каждой категории и число активных пользователей с подписками считаются при загрузке
+    и поддерживаются при каждом изменении, поэтому статистика не обходит массивы.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.cursor = 0
+        self._members: Dict[int, array] = {}
+        self._added: Dict[int, Set[int]] = {}
+        self._removed: Dict[int, Set[int]] = {}
+        self._inactive: Set[int] = set()
+        self._active_counts: Dict[int, int] = {}
+        self._users_count = 0
+
+    async def load(self, pages: AsyncIterable[List[Tuple[int, Iterable[int], bool]]], cursor: int):
+        """Построить индекс по снимку из страниц (user_id, категории, активен) по возрастанию user_id.
+        cursor — позиция ленты изменений, прочитанная до снимка"""
+        members: Dict[int, array] = {}
+        inactive: Set[int] = set()
+        active_counts: Dict[int, int] = {}
+        users_count = 0
+        async for rows in pages:
+            for user_id, category_ids, is_active in rows:
+                for category_id in category_ids:
+                    members.setdefault(category_id, array('q')).append(user_id)
+                    if is_active:
+                        active_counts[category_id] = active_counts.get(category_id, 0) + 1
+                if not is_active:
+                    inactive.add(user_id)
+                elif category_ids:
+                    users_count += 1
+        self._members, self._inactive = members, inactive
+        self._added, self._removed = {}, {}
+        self._active_counts, self._users_count = active_counts, users_count
+        self.cursor = cursor
+        self.ready = True
+
+    def _has(self, category_id: int, user_id: int) -> bool:
+        if user_id in self._added.get(category_id, ()):
+            return True
+        if user_id in self._removed.get(category_id, ()):
+            return False
+        members = self._members.get(category_id)
+        return members is not None and _contains(members, user_id)
+
+    def _compact(self, category_id: int) -> array:
+        members = self._members.get(category_id, array('q'))
+        added = self._added.pop(category_id, None)
+        removed = self._removed.pop(category_id, None)
+        if added or removed:
+            merged = heapq.merge(
+                (user_id for user_id in members if not removed or user_id not in removed),
+                sorted(added or ())
+            )
+            members = self._members[category_id] = array('q', merged)
+        return members
+
+    def set_user(self, user_id: int, category_ids: Iterable[int]):
+        """Заменить подписки пользователя (идемпотентно)"""
+        wanted = set(category_ids)
+        active = user_id not in self._inactive
+        before = 0
+        for category_id in wanted | self._members.keys() | self._added.keys():
+            subscribed = self._has(category_id, user_id)
+            before += subscribed
+            if category_id in wanted and not subscribed:
+                removed = self._removed.get(category_id)
+                if removed and user_id in removed:
+                    removed.discard(user_id)
+                else:
+                    self._added.setdefault(category_id, set()).add(user_id)
+                delta = 1
+            elif category_id not in wanted and subscribed:
+                added = self._added.get(category_id)
+                if added and user_id in added:
+                    added.discard(user_id)
+                else:
+                    self._removed.setdefault(category_id, set()).add(user_id)
+                delta = -1
+            else:
+                continue
+            if active:
+                self._active_counts[category_id] = self._active_counts.get(category_id, 0) + delta
+            if len(self._added.get(category_id, ())) + len(self._removed.get(category_id, ())) >= COMPACT_THRESHOLD:
+                self._compact(category_id)
+        if active:
+            self._users_count += bool(wanted) - bool(before)
+
+    def set_active(self, user_id: int, active: bool):
+        if active == (user_id not in self._inactive):
+            return
+        if active:
+            self._inactive.discard(user_id)
+        else:
+            self._inactive.add(user_id)
+        delta = 1 if active else -1
+        categories = self.user_categories(user_id)
+        for category_id in categories:
+            self._active_counts[category_id] = self._active_counts.get(category_id, 0) + delta
+        if categories:
+            self._users_count += delta
+
+    def is_active(self, user_id: int) -> bool:
+        return user_id not in self._inactive
+
+    @property
+    def inactive_count(self) -> int:
+        return len(self._inactive)
+
+    def drop_category(self, category_id: int):
+        members = self._compact(category_id)
+        self._members.pop(category_id, None)
+        self._active_counts.pop(category_id, None)
+        # пользователи, у которых это была единственная подписка, больше не считаются
+        others = list(self._members.keys() | self._added.keys())
+        for user_id in members:
+            if user_id not in self._inactive and not any(self._has(c, user_id) for c in others):
+                self._users_count -= 1
+
+    def user_categories(self, user_id: int) -> frozenset:
+        return frozenset(c for c in self._members.keys() | self._added.keys() if self._has(c, user_id))
+
+    def count(self, category_id: int) -> int:
+        """Число активных подписчиков категории"""
+        return self._active_counts.get(category_id, 0)
+
+    def count_users(self) -> int:
+        """Число уникальных активных пользователей хотя бы с одной подпиской"""
+        return self._users_count
+
+    def iter_subscribers(self, category_ids: Iterable[int], page_size: int,
+                         after: int = 0) -> Iterator[List[Tuple[int, frozenset]]]:
+        """Активные подписчики любой из категорий пачками пар (user_id, его подписки среди category_ids)"""
+        streams = []
+        for category_id in set(category_ids):
+            members = self._compact(category_id)
+            streams.append(_tagged(members, bisect_left(members, after + 1), category_id))
+        batch = []
+        for user_id, group in groupby(heapq.merge(*streams), key=lambda item: item[0]):
+            if user_id in self._inactive:
+                continue
+            batch.append((user_id, frozenset(category_id for _, category_id in group)))
+            if len(batch) == page_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def memory_usage(self) -> int:
+        """Размер массивов подписчиков в байтах"""
+        return sum(members.buffer_info()[1] * members.itemsize for members in self._members.values())
+
+
+subscription_index = SubscriptionIndex()
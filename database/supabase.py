@@ -1,185 +1,552 @@
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
-import logging
-from cachetools import TTLCache, cached
 import asyncio
-from threading import Lock
+import logging
+from dotenv import load_dotenv
+
+from database.cache import AsyncCache
+from database.client import postgrest
+from database.subscription_index import subscription_index
+from utils.metrics import timed_db
 
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+SUBSCRIBERS_PAGE_SIZE = int(os.getenv("SUBSCRIBERS_PAGE_SIZE", "1000"))
+SUBSCRIPTIONS_CACHE_SIZE = int(os.getenv("SUBSCRIPTIONS_CACHE_SIZE", "50000"))
+SUBSCRIPTIONS_CACHE_TTL = int(os.getenv("SUBSCRIPTIONS_CACHE_TTL", "3600"))
+SUBSCRIPTION_INDEX = os.getenv("SUBSCRIPTION_INDEX", "1") == "1"
+SUBSCRIPTION_INDEX_PAGE_SIZE = int(os.getenv("SUBSCRIPTION_INDEX_PAGE_SIZE", "1000"))
+SUBSCRIPTION_INDEX_POLL = float(os.getenv("SUBSCRIPTION_INDEX_POLL", "30"))
 
-cache = TTLCache(maxsize=100, ttl=3600 * 24) 
+# Сколько хранить последнее значение для stale-while-revalidate и на время сбоев Supabase
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", str(3600 * 24 * 7)))
+
+CACHE_TTL = 3600 * 24
+
+categories_cache = AsyncCache("categories", maxsize=1, ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL)
+descriptions_cache = AsyncCache("descriptions", maxsize=100, ttl=CACHE_TTL, normalize=int,
+                                stale_ttl=CACHE_STALE_TTL)
+subscriptions_cache = AsyncCache("subscriptions", maxsize=SUBSCRIPTIONS_CACHE_SIZE,
+                                 ttl=SUBSCRIPTIONS_CACHE_TTL, normalize=int, stale_ttl=CACHE_STALE_TTL)
 logger = logging.getLogger(__name__)
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    logger.critical("❌ Отсутствуют SUPABASE_URL или SUPABASE_KEY в .env!")
-else:
-    logger.info("✅ Переменные окружения для Supabase загружены.")
 
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-except Exception as e:
-    logger.critical(f"❌ Ошибка подключения к Supabase: {e}", exc_info=True)
-    raise e
+async def _iter_keyset(fetch_page, page_size, after=0, key=lambda item: item):
+    """Постраничный обход по user_id: следующая страница грузится, пока обрабатывается текущая.
+    key достает user_id из элемента страницы. Обход заканчивается только на пустой странице:
+    PostgREST режет ответ до db-max-rows, и короткая страница не значит, что она последняя"""
+    next_page = asyncio.create_task(fetch_page(after, page_size))
+    try:
+        while True:
+            batch = await next_page
+            if not batch:
+                next_page = None
+                return
+            next_page = asyncio.create_task(fetch_page(key(batch[-1]), page_size))
+            yield batch
+    finally:
+        if next_page is not None and not next_page.done():
+            next_page.cancel()
 
-lock = Lock()
 
-@cached(cache, lock=lock)
-def _get_all_categories_sync():
-    """RPC: Получение списка всех категорий для меню"""
+async def _load_all_categories():
     logger.info("📡 Запрос всех категорий через RPC...")
-    response = supabase.rpc("get_all_categories").execute()
+    response = await postgrest.rpc("get_all_categories", {}).execute()
     return response.data
 
+
+@timed_db
 async def get_all_categories():
-    """Асинхронная обертка"""
+    """RPC: Получение списка всех категорий для меню"""
     try:
-        return await asyncio.to_thread(_get_all_categories_sync)
+        return await categories_cache.get_or_load("all", _load_all_categories)
     except Exception as e:
         logger.error(f"Ошибка в get_all_categories: {e}")
         return []
 
-@cached(cache, lock=lock)
-def _get_category_description_sync(cat_id):
-    """RPC: Получаем текст описания"""
-    logger.info(f"📡 Запрос описания ID={cat_id}...")
-    response = supabase.rpc("get_category_description", {"p_cat_id": cat_id}).execute()
-    return response.data
-    
+
+_catalog = {"version": 0, "categories": None}
+
+
+@timed_db
+async def get_catalog():
+    """Список категорий вместе с номером версии каталога.
+    Версия меняется, только когда меняется содержимое списка (добавление, правка, удаление).
+    При ошибке БД отдается последний удачно загруженный каталог с прежней версией"""
+    try:
+        categories = await categories_cache.get_or_load("all", _load_all_categories)
+    except Exception as e:
+        logger.error(f"Ошибка в get_catalog: {e}")
+        return _catalog["version"], _catalog["categories"] or []
+    if categories is not _catalog["categories"] and categories != _catalog["categories"]:
+        _catalog["version"] += 1
+    _catalog["categories"] = categories
+    return _catalog["version"], categories
+
+
+@timed_db
 async def get_category_description(category_id: int):
-    """Асинхронная обертка"""
+    """RPC: Получаем текст описания"""
+    async def load():
+        logger.info(f"📡 Запрос описания ID={category_id}...")
+        response = await postgrest.rpc("get_category_description", {"p_cat_id": int(category_id)}).execute()
+        return response.data
+
     try:
-        return await asyncio.to_thread(_get_category_description_sync, category_id)
+        return await descriptions_cache.get_or_load(category_id, load)
     except Exception as e:
         logger.error(f"Ошибка в get_category_description: {e}")
-    
 
-def _get_user_subscriptions_sync(user_id):
-    """RPC: Получаем список ID категорий"""
-    response = supabase.rpc("get_user_subscriptions", {"p_user_id": user_id}).execute()
-    return [item['category_id'] for item in response.data] if response.data else []
-    
+
+@timed_db
 async def get_user_subscriptions(user_id: int):
+    """RPC: Получаем список ID категорий"""
+    async def load():
+        response = await postgrest.rpc("get_user_subscriptions", {"p_user_id": user_id}).execute()
+        return frozenset(item['category_id'] for item in response.data) if response.data else frozenset()
+
+    if subscription_index.ready:
+        return sorted(subscription_index.user_categories(user_id))
     try:
-        return await asyncio.to_thread(_get_user_subscriptions_sync, user_id)
+        return sorted(await subscriptions_cache.get_or_load(user_id, load))
     except Exception as e:
         logger.error(f"Ошибка в get_user_subscriptions: {e}")
         return []
 
-def _update_user_subscriptions_sync(user_id, category_ids):
-    """RPC: Удаляет старые и вставляет новые подписки одной транзакцией"""
-    supabase.rpc("update_user_subscriptions", {
-        "p_user_id": user_id, 
-        "p_category_ids": category_ids
-    }).execute()
-    logger.info(f"✅ Подписки пользователя {user_id} обновлены через RPC")
-    return True
-
 
+@timed_db
 async def update_user_subscriptions(user_id: int, category_ids: list):
+    """RPC: Удаляет старые и вставляет новые подписки одной транзакцией"""
     try:
-        return await asyncio.to_thread(_update_user_subscriptions_sync, user_id, category_ids)
+        await postgrest.rpc("update_user_subscriptions", {
+            "p_user_id": user_id,
+            "p_category_ids": category_ids
+        }).execute()
+        subscriptions_cache.set(user_id, frozenset(category_ids))
+        subscription_index.set_user(user_id, category_ids)
+        logger.info(f"✅ Подписки пользователя {user_id} обновлены через RPC")
+        return True
     except Exception as e:
         logger.error(f"Ошибка в update_user_subscriptions: {e}")
         return False
 
 
-def _get_all_users_sync():
-    """RPC: Получить список user_id пользователей"""
-    response = supabase.rpc("get_all_users").execute()
-    return response.data
-    
+async def _fetch_users_page(after, limit):
+    res = await postgrest.table("users")\
+        .select("user_id")\
+        .eq("is_active", True)\
+        .gt("user_id", after)\
+        .order("user_id")\
+        .limit(limit).execute()
+    return [item['user_id'] for item in res.data]
+
 
-async def get_all_users():
+async def iter_all_users(page_size: int = SUBSCRIBERS_PAGE_SIZE, after: int = 0):
+    """user_id активных пользователей пачками по page_size, по возрастанию, начиная после after"""
     try:
-        return await asyncio.to_thread(_get_all_users_sync)
+        async for batch in _iter_keyset(_fetch_users_page, page_size, after):
+            yield batch
     except Exception as e:
-        logger.error(f"Ошибка в get_all_users: {e}")
-        return []
+        logger.error(f"Ошибка в iter_all_users: {e}")
+        raise
 
 
-def _get_count_users_sync():
-    """RPC: Получить количество пользователей"""
-    response = supabase.rpc("get_unique_subscribers_count").execute()
-    return response.data
-    
+@timed_db
+async def get_count_all_users():
+    """Количество активных пользователей бота"""
+    try:
+        res = await postgrest.table("users").select("user_id", count="exact")\
+            .eq("is_active", True).limit(1).execute()
+        return res.count
+    except Exception as e:
+        logger.error(f"Ошибка в get_count_all_users: {e}")
+        return -1
+
+
+@timed_db
+async def get_count_inactive_users():
+    """Количество пользователей, исключенных из рассылок"""
+    if subscription_index.ready:
+        return subscription_index.inactive_count
+    try:
+        res = await postgrest.table("users").select("user_id", count="exact")\
+            .eq("is_active", False).limit(1).execute()
+        return res.count
+    except Exception as e:
+        logger.error(f"Ошибка в get_count_inactive_users: {e}")
+        return -1
+
+
+@timed_db
+async def deactivate_users(user_ids: list):
+    """RPC: Пакетно исключить пользователей из рассылок, вернуть число отключенных"""
+    try:
+        response = await postgrest.rpc("deactivate_users", {"p_user_ids": user_ids}).execute()
+        for user_id in user_ids:
+            subscription_index.set_active(user_id, False)
+        return response.data
+    except Exception as e:
+        logger.error(f"Ошибка в deactivate_users: {e}")
+        return None
+
+
+@timed_db
+async def reactivate_user(user_id: int):
+    """RPC: Вернуть пользователя в рассылки"""
+    if subscription_index.ready and subscription_index.is_active(user_id):
+        return False
+    try:
+        response = await postgrest.rpc("reactivate_user", {"p_user_id": user_id}).execute()
+        subscription_index.set_active(user_id, True)
+        return response.data
+    except Exception as e:
+        logger.error(f"Ошибка в reactivate_user: {e}")
+        return False
+
 
+@timed_db
 async def get_count_users():
+    """RPC: Получить количество пользователей"""
+    if subscription_index.ready:
+        return subscription_index.count_users()
     try:
-        return await asyncio.to_thread(_get_count_users_sync)
+        response = await postgrest.rpc("get_unique_subscribers_count", {}).execute()
+        return response.data
     except Exception as e:
         logger.error(f"Ошибка в get_count_users: {e}")
         return -1
-    
-def _get_categories_stats():
-    """RPC: Статистика по категориям: category_name: count_users"""
-    response = supabase.rpc("get_categories_stats").execute()
-    return response.data
-    
 
+
+@timed_db
 async def get_categories_stats():
+    """RPC: Статистика по категориям: category_name: count_users"""
+    if subscription_index.ready:
+        return [{"name": cat['category_name'], "count": subscription_index.count(cat['id'])}
+                for cat in await get_all_categories()]
     try:
-        return await asyncio.to_thread(_get_categories_stats)
+        response = await postgrest.rpc("get_categories_stats", {}).execute()
+        return response.data
     except Exception as e:
         logger.error(f"Ошибка в get_categories_stats: {e}")
         return []
 
 
-def _add_new_category_sync(name, desc):
-    """RPC: Добавление новой категории в БД"""
-    response = supabase.rpc("add_new_category", {
-        "p_name": name,
-        "p_description": desc
-    }).execute()
-    cache.clear() 
-    return response.data 
-
-
+@timed_db
 async def add_new_category(name, desc):
-    """Асинхронная обертка для админки"""
+    """RPC: Добавление новой категории в БД"""
     try:
-        new_id = await asyncio.to_thread(_add_new_category_sync, name, desc)
+        response = await postgrest.rpc("add_new_category", {
+            "p_name": name,
+            "p_description": desc
+        }).execute()
+        categories_cache.invalidate("all")
+        new_id = response.data
         logger.info(f"✅ В базу добавлена новая категория: {name} (ID: {new_id})")
         return new_id
     except Exception as e:
         logger.error(f"❌ Ошибка при добавлении категории в БД: {e}")
         return None
-    
 
+
+@timed_db
 async def update_category_field(cat_id, field, value):
-    def _sync():
-        """RPC: Изменение названия/описания рассылки"""
-        supabase.rpc("update_category_field", {
-            "p_id": cat_id,
-            "p_field": field,
-            "p_value": value
-        }).execute()
-        cache.clear()
-    await asyncio.to_thread(_sync)
+    """RPC: Изменение названия/описания рассылки"""
+    await postgrest.rpc("update_category_field", {
+        "p_id": cat_id,
+        "p_field": field,
+        "p_value": value
+    }).execute()
+    if field == "description":
+        descriptions_cache.set(cat_id, value)
+    elif field == "name":
+        _patch_cached_categories(lambda cats: [
+            {**cat, 'category_name': value} if cat['id'] == int(cat_id) else cat for cat in cats
+        ])
+    else:
+        categories_cache.invalidate("all")
 
 
+@timed_db
 async def delete_category(cat_id):
-    def _sync():
-        """RPC: Удаление рассылки"""
-        supabase.rpc("delete_category", {"p_id": cat_id}).execute()
-        cache.clear()
-    await asyncio.to_thread(_sync)
+    """RPC: Удаление рассылки"""
+    await postgrest.rpc("delete_category", {"p_id": cat_id}).execute()
+    descriptions_cache.invalidate(cat_id)
+    subscription_index.drop_category(int(cat_id))
+    _patch_cached_categories(lambda cats: [cat for cat in cats if cat['id'] != int(cat_id)])
 
 
-def _get_category_subscribers_sync(category_id):
-    """RPC: Получить список пользователей по калегории"""
-    res = supabase.table("user_subscriptions")\
-        .select("user_id")\
-        .eq("category_id", category_id).execute()
-    return [item['user_id'] for item in res.data]
+def _patch_cached_categories(patch):
+    """Точечно обновить закэшированный список категорий без повторного RPC"""
+    categories = categories_cache.peek("all")
+    if categories is not None:
+        categories_cache.set("all", patch(categories))
+    else:
+        # сохраненный для сбоев список уже не актуален: следующий запрос пойдет в БД
+        categories_cache.invalidate("all")
+
+
+async def iter_digest_recipients(category_ids: list, page_size: int = SUBSCRIBERS_PAGE_SIZE):
+    """Подписчики любой из категорий пачками пар (user_id, все подписки пользователя).
+    Одним проходом по базе вместо отдельного на каждую категорию, попутно прогревает кэш подписок.
+    Из индекса в памяти отдаются только подписки среди category_ids"""
+    if subscription_index.ready:
+        async for batch in _iter_index(category_ids, page_size):
+            yield batch
+        return
+
+    async def fetch_page(after, limit):
+        res = await postgrest.rpc("get_digest_recipients_page", {
+            "p_category_ids": list(category_ids),
+            "p_after": after,
+            "p_limit": limit
+        }).execute()
+        page = []
+        for item in res.data:
+            subscriptions = frozenset(item['category_ids'])
+            subscriptions_cache.set(item['user_id'], subscriptions)
+            page.append((item['user_id'], subscriptions))
+        return page
+
+    try:
+        async for batch in _iter_keyset(fetch_page, page_size, key=lambda item: item[0]):
+            yield batch
+    except Exception as e:
+        logger.error(f"Ошибка в iter_digest_recipients: {e}")
+        raise
+
+
+async def _iter_index(category_ids, page_size):
+    for batch in subscription_index.iter_subscribers(category_ids, page_size):
+        yield batch
+        await asyncio.sleep(0)
+
+
+async def _fetch_snapshot_page(after, limit):
+    res = await postgrest.rpc("get_subscription_snapshot_page", {"p_after": after, "p_limit": limit}).execute()
+    return [(item['user_id'], item['category_ids'], item['is_active']) for item in res.data]
+
+
+@timed_db
+async def load_subscription_index():
+    """Построить индекс подписчиков по снимку таблицы подписок"""
+    cursor = (await postgrest.rpc("get_subscription_changes_cursor", {}).execute()).data
+    await subscription_index.load(
+        _iter_keyset(_fetch_snapshot_page, SUBSCRIPTION_INDEX_PAGE_SIZE, key=lambda item: item[0]), cursor
+    )
+    logger.info(f"✅ Индекс подписчиков загружен: {subscription_index.count_users()} пользователей, "
+                f"{subscription_index.memory_usage() / 2 ** 20:.1f} МиБ")
+
+
+@timed_db
+async def sync_subscription_index():
+    """Применить к индексу изменения подписок из ленты subscription_changes"""
+    while True:
+        res = await postgrest.rpc("get_subscription_changes", {
+            "p_after": subscription_index.cursor,
+            "p_limit": SUBSCRIPTION_INDEX_PAGE_SIZE
+        }).execute()
+        if not res.data:
+            return
+        for item in res.data:
+            subscription_index.set_user(item['user_id'], item['category_ids'])
+            subscription_index.set_active(item['user_id'], item['is_active'])
+        subscription_index.cursor = max(item['id'] for item in res.data)
+
+
+async def keep_subscription_index_synced():
+    """Загрузить индекс и держать его в актуальном состоянии опросом ленты изменений"""
+    if not SUBSCRIPTION_INDEX:
+        return
+    while not subscription_index.ready:
+        try:
+            await load_subscription_index()
+        except Exception as e:
+            logger.error(f"Ошибка загрузки индекса подписчиков: {e}")
+            await asyncio.sleep(SUBSCRIPTION_INDEX_POLL)
+    while True:
+        await asyncio.sleep(SUBSCRIPTION_INDEX_POLL)
+        try:
+            await sync_subscription_index()
+        except Exception as e:
+            logger.error(f"Ошибка синхронизации индекса подписчиков: {e}")
+
+
+@timed_db
+async def create_broadcast_job(from_chat_id, message_id, status_chat_id, status_message_id, total,
+                               owner: str, lease: int):
+    """RPC: Создание фоновой рассылки, сразу в аренде у owner; возвращает ID задачи"""
+    try:
+        response = await postgrest.rpc("create_broadcast_job", {
+            "p_from_chat_id": from_chat_id,
+            "p_message_id": message_id,
+            "p_status_chat_id": status_chat_id,
+            "p_status_message_id": status_message_id,
+            "p_total": total,
+            "p_owner": owner,
+            "p_lease": lease
+        }).execute()
+        return response.data
+    except Exception as e:
+        logger.error(f"Ошибка в create_broadcast_job: {e}")
+        return None
+
+
+@timed_db
+async def update_broadcast_job(job_id, status, cursor, total, sent, blocked, failed, owner: str, lease: int):
+    """RPC: Сохранение курсора и счетчиков рассылки с продлением аренды.
+    Возвращает запрошенный статус ('' — нет запроса), None — рассылку ведет другая реплика, False — ошибка"""
+    try:
+        response = await postgrest.rpc("update_broadcast_job", {
+            "p_id": job_id,
+            "p_status": status,
+            "p_cursor": cursor,
+            "p_total": total,
+            "p_sent": sent,
+            "p_blocked": blocked,
+            "p_failed": failed,
+            "p_owner": owner,
+            "p_lease": lease
+        }).execute()
+        return response.data
+    except Exception as e:
+        logger.error(f"Ошибка в update_broadcast_job: {e}")
+        return False
+
+
+@timed_db
+async def get_unfinished_broadcast_jobs():
+    """RPC: Рассылки в статусе running/paused"""
+    try:
+        response = await postgrest.rpc("get_unfinished_broadcast_jobs", {}).execute()
+        return response.data
+    except Exception as e:
+        logger.error(f"Ошибка в get_unfinished_broadcast_jobs: {e}")
+        return []
 
 
-async def get_category_subscribers(category_id):
+@timed_db
+async def claim_broadcast_jobs(owner: str, lease: int):
+    """RPC: Забрать незавершенные рассылки, аренда которых истекла"""
     try:
-        return await asyncio.to_thread(_get_category_subscribers_sync, category_id)
+        response = await postgrest.rpc("claim_broadcast_jobs", {"p_owner": owner, "p_lease": lease}).execute()
+        return response.data
     except Exception as e:
-        logger.error(f"Ошибка в get_category_subscribers: {e}")
-        return False
\ No newline at end of file
+        logger.error(f"Ошибка в claim_broadcast_jobs: {e}")
+        return []
+
+
+@timed_db
+async def control_broadcast_job(job_id: int, status: str):
+    """RPC: Запросить паузу/продолжение/отмену рассылки у реплики, которая ее ведет"""
+    try:
+        response = await postgrest.rpc("control_broadcast_job", {"p_id": job_id, "p_status": status}).execute()
+        return response.data
+    except Exception as e:
+        logger.error(f"Ошибка в control_broadcast_job: {e}")
+        return False
+
+
+@timed_db
+async def enqueue_delivery(job_id: str, parts: list, user_ids: list):
+    """RPC: Поставить в очередь доставки рассылку для заданных пользователей"""
+    try:
+        response = await postgrest.rpc("enqueue_delivery", {
+            "p_job_id": job_id,
+            "p_parts": parts,
+            "p_user_ids": user_ids
+        }).execute()
+        return response.data
+    except Exception as e:
+        logger.error(f"Ошибка в enqueue_delivery: {e}")
+        return None
+
+
+@timed_db
+async def claim_outbox(job_id: str, owner: str, limit: int, claim_timeout: int, shard: int = 0, shards: int = 1):
+    """RPC: Забрать пачку (user_id, part) из очереди доставки, только из своего шарда.
+    Попутно прогревает кэш подписок получателей"""
+    try:
+        response = await postgrest.rpc("claim_outbox", {
+            "p_job_id": job_id,
+            "p_owner": owner,
+            "p_limit": limit,
+            "p_claim_timeout": claim_timeout,
+            "p_shard": shard,
+            "p_shards": shards
+        }).execute()
+        for item in response.data:
+            subscriptions_cache.set(item['user_id'], frozenset(item['category_ids']))
+        return response.data
+    except Exception as e:
+        logger.error(f"Ошибка в claim_outbox: {e}")
+        return None
+
+
+@timed_db
+async def ack_outbox(job_id: str, acks: list):
+    """RPC: Пакетное подтверждение доставки"""
+    try:
+        await postgrest.rpc("ack_outbox", {"p_job_id": job_id, "p_acks": acks}).execute()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка в ack_outbox: {e}")
+        return False
+
+
+@timed_db
+async def get_pending_delivery_jobs():
+    """RPC: Рассылки, в очереди которых остались недоставленные сообщения"""
+    try:
+        response = await postgrest.rpc("get_pending_delivery_jobs", {}).execute()
+        return response.data
+    except Exception as e:
+        logger.error(f"Ошибка в get_pending_delivery_jobs: {e}")
+        return []
+
+
+@timed_db
+async def get_outbox_stats():
+    """RPC: Глубина очереди доставки и время постановки самой старой задачи"""
+    try:
+        response = await postgrest.rpc("get_outbox_stats", {}).execute()
+        return response.data[0] if response.data else None
+    except Exception as e:
+        logger.error(f"Ошибка в get_outbox_stats: {e}")
+        return None
+
+
+@timed_db
+async def purge_delivery_outbox(days: int):
+    """RPC: Удалить доставленные и завершенные с ошибкой строки очереди старше days дней"""
+    try:
+        response = await postgrest.rpc("purge_delivery_outbox", {"p_days": days}).execute()
+        return response.data
+    except Exception as e:
+        logger.error(f"Ошибка в purge_delivery_outbox: {e}")
+        return None
+
+
+@timed_db
+async def heartbeat_mailing_worker(owner: str, shard: int, shards: int, ttl: int):
+    """RPC: Отметка воркера рассылок, возвращает число живых воркеров"""
+    try:
+        response = await postgrest.rpc("heartbeat_mailing_worker", {
+            "p_owner": owner,
+            "p_shard": shard,
+            "p_shards": shards,
+            "p_ttl": ttl
+        }).execute()
+        return response.data
+    except Exception as e:
+        logger.error(f"Ошибка в heartbeat_mailing_worker: {e}")
+        return None
+
+
+@timed_db
+async def leave_mailing_workers(owner: str):
+    """RPC: Снять отметку воркера при остановке"""
+    try:
+        await postgrest.rpc("leave_mailing_workers", {"p_owner": owner}).execute()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка в leave_mailing_workers: {e}")
+        return False
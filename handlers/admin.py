@@ -1,18 +1,27 @@
-import asyncio
 import logging
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
 
 import database.supabase as db
+from database.cache import cache_stats
+from database.resilience import BREAKER_STATUS_LABELS, breaker
+from utils.menu_cache import menus
+from mailing.broadcast import BROADCAST_ACTIONS, BROADCAST_LEASE, broadcasts
+from mailing.outbox import queue_stats
+from mailing.dedup import deduplicator
+from utils import metrics
+from utils.lanes import ADMIN, LaneMiddleware
 from utils.admin_utils import (is_admin, get_admin_main_keyboard,
                                AdminState,render_edit_actions_menu,
-                               render_edit_category_list)
+                               render_edit_category_list, render_broadcast_jobs_list,
+                               BROADCAST_STATUS_LABELS)
 
 
 router = Router()
+router.message.middleware(LaneMiddleware(ADMIN))
+router.callback_query.middleware(LaneMiddleware(ADMIN))
 logger = logging.getLogger(__name__)
 
 
@@ -29,6 +38,7 @@ async def admin_main_menu(message: Message):
 async def admin_stats(callback: CallbackQuery):
     await callback.answer("📊 Сбор статистики...")
     all_user_count = await db.get_count_users() 
+    pruned_count = await db.get_count_inactive_users()
     categories_data = await db.get_categories_stats()
     if categories_data:
         categories_text = "\n".join(
@@ -36,11 +46,31 @@ async def admin_stats(callback: CallbackQuery):
         )
     else:
         categories_text = "  <i>Рассылки еще не созданы</i>"
+    cache_text = "\n".join(
+        [f"  ├ {name}: <b>{stats.hits}</b>/{stats.hits + stats.misses} ({stats.hit_rate:.0%})"
+         + (f", устаревших: {stats.stale}" if stats.stale else "")
+         for name, stats in cache_stats().items()]
+    )
+    outbox_depth, outbox_age = await queue_stats()
+    if outbox_depth is None:
+        outbox_text = "  <i>Нет данных</i>"
+    else:
+        outbox_text = f"  ├ В очереди: <b>{outbox_depth}</b>\n  └ Самой старой задаче: <b>{outbox_age:.0f}</b> сек."
+    dedup = deduplicator.stats
     text = (
         "📊 <b>Статистика бота</b>\n\n"
-        f"👤 Всего пользователей: <b>{all_user_count}</b>\n\n"
+        f"👤 Всего пользователей: <b>{all_user_count}</b>\n"
+        f"🚫 Исключены из рассылок (заблокировали бота): <b>{pruned_count}</b>\n\n"
         "📂 <b>Количество подписчиков по рассылкам:</b>\n"
         f"{categories_text}\n\n"
+        f"🔌 Supabase: <b>{BREAKER_STATUS_LABELS[breaker.state]}</b>\n\n"
+        "🗄 <b>Кэш (попадания/запросы):</b>\n"
+        f"{cache_text}\n\n"
+        "📬 <b>Очередь доставки:</b>\n"
+        f"{outbox_text}\n\n"
+        f"🔁 Дубликатов новостей отброшено: <b>{dedup.dropped}</b>/{dedup.seen} ({dedup.drop_rate:.0%})\n\n"
+        "📈 <b>Задержки:</b>\n"
+        f"{metrics.summary()}\n"
     )
     try:
         await callback.message.edit_text(
@@ -61,29 +91,41 @@ async def start_broadcast(callback: CallbackQuery, state: FSMContext):
 @router.message(AdminState.waiting_for_broadcast_text, is_admin)
 async def process_broadcast(message: Message, state: FSMContext, bot: Bot):
     await state.clear()
-    users = await db.get_all_users()
-    count = 0
-    blocked = 0
-    logger.info(f"🚀 Рассылка запущена для {len(users)} пользователей...")
-    status_msg = await message.answer(f"🚀 Рассылка запущена для {len(users)} пользователей...")
-    for user in users:
-        try:
-            await message.copy_to(chat_id=user['user_id'])
-            count += 1
-            await asyncio.sleep(0.05) 
-        except TelegramForbiddenError:
-            blocked += 1
-        except TelegramRetryAfter as e:
-            await asyncio.sleep(e.retry_after)
-            await message.copy_to(chat_id=user['user_id'])
-            count += 1
-        except Exception as e:
-            logger.error(f"Ошибка при отправке {user['user_id']}: {e}")
-    await status_msg.edit_text(
-        f"✅ <b>Рассылка завершена!</b>\n\n"
-        f"📥 Доставлено: {count}\n",
-        parse_mode="HTML",
-    )
+    status_msg = await message.answer("🚀 Рассылка ставится в очередь...")
+    job = await broadcasts.start(bot, message, status_msg)
+    if job is None:
+        await status_msg.edit_text("❌ Не удалось создать задачу рассылки, попробуйте позже.")
+        return
+    admin_info = f"@{message.from_user.username}" if message.from_user.username else f"ID: {message.from_user.id}"
+    logger.info(f"🚀 Админ {admin_info} запустил фоновую рассылку #{job.id}")
+
+
+@router.callback_query(F.data == "admin_jobs", is_admin)
+async def broadcast_jobs_list(callback: CallbackQuery):
+    text, reply_markup = render_broadcast_jobs_list(await broadcasts.listed())
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("admin_job_"), is_admin)
+async def broadcast_job_control(callback: CallbackQuery, bot: Bot):
+    _, _, action, job_id = callback.data.split("_")
+    job_id = int(job_id)
+    status = BROADCAST_ACTIONS.get(action)
+    if status is None or not await broadcasts.control(job_id, status):
+        await callback.answer("Рассылка уже завершена", show_alert=True)
+        return
+    admin_info = f"@{callback.from_user.username}" if callback.from_user.username else f"ID: {callback.from_user.id}"
+    logger.info(f"📤 Админ {admin_info}: {action} рассылки #{job_id}")
+    job = broadcasts.get(job_id)
+    if job is None:
+        # рассылку ведет другая реплика, она применит команду при продлении аренды
+        await callback.answer(f"{BROADCAST_STATUS_LABELS.get(status, status)} — будет применено в течение "
+                              f"{BROADCAST_LEASE // 3} сек.")
+        return
+    await job.flush(bot, force=True)
+    await callback.answer(BROADCAST_STATUS_LABELS.get(job.status, job.status))
+
 
 @router.callback_query(F.data == "back_to_admin_main", is_admin)
 async def back_to_main_menu(callback: CallbackQuery, state: FSMContext):
@@ -125,11 +167,11 @@ async def add_category_final(message: Message, state: FSMContext, bot: Bot):
 @router.callback_query(F.data == "admin_edit_category", is_admin)
 async def edit_category_start(callback: CallbackQuery, state: FSMContext):
     await state.clear()
-    categories = await db.get_all_categories()
+    version, categories = await db.get_catalog()
     if not categories:
         await callback.answer("Список рассылок пуст!", show_alert=True)
         return
-    text, reply_markup = render_edit_category_list(categories)
+    text, reply_markup = menus.get("admin_edit_list", version, lambda: render_edit_category_list(categories))
     await callback.message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
     await callback.answer()
 
@@ -1,11 +1,12 @@
 from aiogram.filters import Command
 from aiogram import Router, F
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
 
 import database.supabase as db
-from utils.user_utils import get_main_menu_content, render_subs_keyboard
+from mailing.pruning import pruner
+from utils.user_utils import (get_main_menu_content, render_subs_keyboard, get_catalog_keyboard,
+                              schedule_subs_keyboard_update, cancel_subs_keyboard_update)
 from utils.user_utils import SubscriptionState
 
 
@@ -16,31 +17,25 @@ router = Router()
 async def start_command(message: Message):
     text, reply_markup = get_main_menu_content()
     await message.answer(text, parse_mode="HTML", reply_markup=reply_markup)
+    pruner.discard(message.from_user.id)
+    await db.reactivate_user(message.from_user.id)
 
 
 @router.callback_query(F.data == "show_info")
 async def show_newsletters_list(callback: CallbackQuery):
-    categories = await db.get_all_categories()
-    builder = InlineKeyboardBuilder()
-    for item in categories:
-        builder.button(
-            text=f"{item['category_name']}", 
-            callback_data=f"view_category_{item['id']}"
-        )
-    builder.adjust(1)
-    builder.row(InlineKeyboardButton(text="📋 Меню", callback_data="back_to_main"))
+    reply_markup = await get_catalog_keyboard()
     await callback.message.edit_text(
         "ℹ️ <b>Каталог рассылок</b>\n\n"
         "Выберите категорию, чтобы прочитать подробности:",
         parse_mode="HTML",
-        reply_markup=builder.as_markup()
+        reply_markup=reply_markup
     )
     await callback.answer()
 
 
 @router.callback_query(F.data.startswith("view_category_"))
 async def show_category_details(callback: CallbackQuery):
-    category_id = callback.data.split("_")[2]
+    category_id = int(callback.data.split("_")[2])
     details = await db.get_category_description(category_id)
     if not details:
         await callback.answer("Описание этой категории отсутствует", show_alert=True)
@@ -59,7 +54,10 @@ async def show_category_details(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "back_to_main")
-async def back_to_main_menu(callback: CallbackQuery):
+async def back_to_main_menu(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    cancel_subs_keyboard_update(callback.message)
+
     text, reply_markup = get_main_menu_content()
     await callback.message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
     await callback.answer()
@@ -105,7 +103,7 @@ async def toggle_subscription_handler(callback: CallbackQuery, state: FSMContext
     
     await state.update_data(subs=current_subs)
     
-    await render_subs_keyboard(callback.message, current_subs)
+    schedule_subs_keyboard_update(callback.message, state)
     await callback.answer()
 
 
@@ -117,16 +115,8 @@ async def save_subscriptions_handler(callback: CallbackQuery, state: FSMContext)
     await db.update_user_subscriptions(callback.from_user.id, final_subs)
     
     await state.clear()
+    cancel_subs_keyboard_update(callback.message)
     
     await callback.answer("✅ Настройки успешно сохранены!", show_alert=True)
     text, reply_markup = get_main_menu_content()
     await callback.message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
-
-
-@router.callback_query(F.data == "back_to_main")
-async def back_to_main_menu_wrapper(callback: CallbackQuery, state: FSMContext):
-    await state.clear()
-    
-    text, reply_markup = get_main_menu_content()
-    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
-    await callback.answer()
\ No newline at end of file
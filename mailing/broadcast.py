@@ -0,0 +1,274 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.types import Message
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+from dotenv import load_dotenv
+
+import database.supabase as db
+from mailing.delivery import engine, SENT, BLOCKED
+from mailing.outbox import OWNER
+from utils.admin_utils import render_broadcast_status
+from utils.lanes import ADMIN, lane
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "3"))
+# Аренда рассылки: владелец продлевает ее каждые BROADCAST_LEASE / 3 сек., после истечения
+# незавершенную рассылку забирает другая реплика
+BROADCAST_LEASE = int(os.getenv("BROADCAST_LEASE", "30"))
+
+RUNNING, PAUSED, CANCELLED, DONE = "running", "paused", "cancelled", "done"
+# Кнопки управления рассылкой -> запрашиваемый статус
+BROADCAST_ACTIONS = {"pause": PAUSED, "resume": RUNNING, "cancel": CANCELLED}
+
+
+class BroadcastJob:
+    """Фоновая рассылка с курсором по user_id.
+
+    Рассылку ведет реплика, которая держит ее аренду в broadcast_jobs. Пауза,
+    продолжение и отмена записываются в requested_status, и владелец применяет
+    их при очередном продлении, с какой бы реплики их ни запросили.
+    """
+
+    def __init__(self, job_id: int, from_chat_id: int, message_id: int,
+                 status_chat_id: int, status_message_id: int, total: int = 0,
+                 cursor: int = 0, sent: int = 0, blocked: int = 0, failed: int = 0,
+                 status: str = RUNNING, **_):
+        self.id = job_id
+        self.from_chat_id = from_chat_id
+        self.message_id = message_id
+        self.status_chat_id = status_chat_id
+        self.status_message_id = status_message_id
+        self.total = total
+        self.cursor = cursor
+        self.sent = sent
+        self.blocked = blocked
+        self.failed = failed
+        self.status = status
+        self._resume = asyncio.Event()
+        if status == RUNNING:
+            self._resume.set()
+        self._pending: deque = deque()
+        self._done: set = set()
+        self._started = time.monotonic()
+        self._processed_at_start = self.processed
+        self._last_flush = 0.0
+        self._bot: Optional[Bot] = None
+        # аренду перехватила другая реплика: прекращаем отправку, не трогая состояние в БД
+        self.lost = False
+
+    @classmethod
+    def from_row(cls, row: dict) -> "BroadcastJob":
+        return cls(job_id=row['id'], **{k: v for k, v in row.items() if k != 'id'})
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.blocked + self.failed
+
+    @property
+    def rate(self) -> float:
+        """Получателей в секунду с момента (пере)запуска"""
+        elapsed = time.monotonic() - self._started
+        return (self.processed - self._processed_at_start) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.lost or self.status in (CANCELLED, DONE)
+
+    def pause(self):
+        if self.status == RUNNING:
+            self.status = PAUSED
+            self._resume.clear()
+
+    def resume(self):
+        if self.status == PAUSED:
+            self.status = RUNNING
+            self._resume.set()
+
+    def cancel(self):
+        if not self.finished:
+            self.status = CANCELLED
+            self._resume.set()
+
+    async def _recipients(self):
+        if self.total <= 0:
+            # -1 — счетчик не загрузился: итог неизвестен и дальше считается по ходу обхода
+            self.total = max(await db.get_count_all_users(), 0)
+        listed = self.processed
+        async for batch in db.iter_all_users(after=self.cursor):
+            for user_id in batch:
+                await self._resume.wait()
+                if self.status == CANCELLED or self.lost:
+                    return
+                listed += 1
+                self.total = max(self.total, listed)
+                self._pending.append(user_id)
+                yield user_id
+
+    async def _on_result(self, chat_id: int, status: str):
+        if status == SENT:
+            self.sent += 1
+        elif status == BLOCKED:
+            self.blocked += 1
+        else:
+            self.failed += 1
+        self._done.add(chat_id)
+        while self._pending and self._pending[0] in self._done:
+            self.cursor = self._pending.popleft()
+            self._done.discard(self.cursor)
+        await self.flush(self._bot)
+
+    def apply(self, status: str):
+        """Привести рассылку к запрошенному статусу"""
+        if status == PAUSED:
+            self.pause()
+        elif status == RUNNING:
+            self.resume()
+        elif status == CANCELLED:
+            self.cancel()
+
+    async def save(self) -> bool:
+        """Сохранить курсор и продлить аренду; True — статус изменился по запросу с другой реплики"""
+        requested = await db.update_broadcast_job(self.id, self.status, self.cursor, self.total, self.sent,
+                                                  self.blocked, self.failed, OWNER, BROADCAST_LEASE)
+        if requested is None:
+            logger.warning(f"Рассылку #{self.id} ведет другая реплика, отправка остановлена")
+            self.lost = True
+            self._resume.set()
+            return False
+        if not requested or self.finished:
+            return False
+        status = self.status
+        self.apply(requested)
+        return self.status != status
+
+    async def _keep_lease(self):
+        while True:
+            await asyncio.sleep(BROADCAST_LEASE / 3)
+            if await self.save():
+                await self.flush(self._bot, force=True)
+
+    async def flush(self, bot: Bot, force: bool = False):
+        """Сохранить курсор и обновить сообщение со статусом (не чаще интервала)"""
+        now = time.monotonic()
+        if not force and now - self._last_flush < BROADCAST_PROGRESS_INTERVAL:
+            return
+        self._last_flush = now
+        if await self.save():
+            # применен запрос с другой реплики — сразу записать новый статус
+            await self.save()
+        if self.lost:
+            return
+        text, reply_markup = render_broadcast_status(self)
+        try:
+            with lane(ADMIN):
+                await bot.edit_message_text(
+                    text,
+                    chat_id=self.status_chat_id,
+                    message_id=self.status_message_id,
+                    parse_mode="HTML",
+                    reply_markup=reply_markup
+                )
+        except TelegramBadRequest as e:
+            logger.debug(f"Статус рассылки #{self.id} не обновлен: {e}")
+        except TelegramAPIError as e:
+            logger.warning(f"Статус рассылки #{self.id} не обновлен: {e}")
+
+    async def run(self, bot: Bot):
+        self._bot = bot
+        logger.info(f"🚀 Рассылка #{self.id} запущена с курсора {self.cursor}")
+        await self.flush(bot, force=True)
+        lease = asyncio.create_task(self._keep_lease())
+        try:
+            await engine.run(
+                self._recipients(),
+                [lambda chat_id: bot.copy_message(chat_id=chat_id, from_chat_id=self.from_chat_id,
+                                                  message_id=self.message_id)],
+                on_result=self._on_result
+            )
+        finally:
+            lease.cancel()
+        if self.lost:
+            return
+        if self.status != CANCELLED:
+            self.status = DONE
+        await self.flush(bot, force=True)
+        logger.info(f"✅ Рассылка #{self.id} завершена ({self.status}): доставлено {self.sent}, "
+                    f"заблокировали {self.blocked}, ошибок {self.failed}")
+
+
+class BroadcastManager:
+    """Реестр фоновых рассылок текущего процесса"""
+
+    def __init__(self):
+        self.jobs: dict[int, BroadcastJob] = {}
+        self._tasks: set = set()
+
+    def _spawn(self, bot: Bot, job: BroadcastJob):
+        self.jobs[job.id] = job
+        task = asyncio.create_task(job.run(bot))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def get(self, job_id: int) -> Optional[BroadcastJob]:
+        return self.jobs.get(job_id)
+
+    def active(self) -> list:
+        return [job for job in self.jobs.values() if not job.finished]
+
+    async def start(self, bot: Bot, message: Message, status_msg: Message) -> Optional[BroadcastJob]:
+        job_id = await db.create_broadcast_job(message.chat.id, message.message_id,
+                                               status_msg.chat.id, status_msg.message_id, 0,
+                                               OWNER, BROADCAST_LEASE)
+        if job_id is None:
+            return None
+        job = BroadcastJob(job_id, message.chat.id, message.message_id,
+                           status_msg.chat.id, status_msg.message_id)
+        self._spawn(bot, job)
+        return job
+
+    async def listed(self) -> list:
+        """Незавершенные рассылки всех реплик: свои — живые объекты, чужие — снимки из БД"""
+        jobs = self.active()
+        local = {job.id for job in jobs}
+        jobs += [BroadcastJob.from_row(row) for row in await db.get_unfinished_broadcast_jobs()
+                 if row['id'] not in local]
+        return sorted(jobs, key=lambda job: job.id)
+
+    async def control(self, job_id: int, status: str) -> bool:
+        """Пауза/продолжение/отмена: записать запрос в БД и сразу применить, если рассылка своя"""
+        if not await db.control_broadcast_job(job_id, status):
+            return False
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.apply(status)
+        return True
+
+    async def resume_unfinished(self, bot: Bot):
+        """Забрать рассылки с истекшей арендой: прерванные перезапуском или падением реплики"""
+        for row in await db.claim_broadcast_jobs(OWNER, BROADCAST_LEASE):
+            job = BroadcastJob.from_row(row)
+            if row.get('requested_status'):
+                job.apply(row['requested_status'])
+            logger.info(f"🔁 Восстановлена рассылка #{job.id} ({job.status}), курсор {job.cursor}")
+            self._spawn(bot, job)
+
+    async def keep_resuming(self, bot: Bot):
+        """Проверять чужие рассылки раз в BROADCAST_LEASE: аренда остановленной реплики истекает"""
+        while True:
+            try:
+                await self.resume_unfinished(bot)
+            except Exception as e:
+                logger.error(f"Ошибка восстановления рассылок: {e}")
+            await asyncio.sleep(BROADCAST_LEASE)
+
+
+broadcasts = BroadcastManager()
@@ -0,0 +1,173 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+from dataclasses import dataclass
+from typing import List, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEDUP_PATH = os.getenv("DEDUP_PATH", "dedup.sqlite3")
+DEDUP_TTL = int(os.getenv("DEDUP_TTL", str(3600 * 24 * 30)))
+DEDUP_SIMHASH_DISTANCE = int(os.getenv("DEDUP_SIMHASH_DISTANCE", "6"))
+
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|yclid|ref)$")
+WORD = re.compile(r"\w+")
+
+# 64 бита делятся на 8 полос по 8: при расстоянии Хэмминга <= 7 хотя бы одна полоса совпадает
+BANDS = 8
+BAND_BITS = 64 // BANDS
+
+_SCHEMA = (
+    "create table if not exists seen_keys (key integer primary key, seen_at real not null)",
+    "create index if not exists seen_keys_seen_at on seen_keys (seen_at)",
+    "create table if not exists simhashes (simhash integer not null, band integer not null, "
+    "value integer not null, seen_at real not null, numbers integer not null default 0)",
+    "create index if not exists simhashes_band on simhashes (band, value)",
+    "create index if not exists simhashes_seen_at on simhashes (seen_at)",
+)
+
+
+def normalize_url(url: str) -> str:
+    """Схема и хост в нижнем регистре, без www, фрагмента, меток трекинга и хвостового слэша"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAMS.match(k)))
+    return urlunsplit((parts.scheme.lower(), host, parts.path.rstrip("/"), query, ""))
+
+
+def normalize_text(text: str) -> List[str]:
+    return WORD.findall(text.lower())
+
+
+def _hash64(value: str) -> int:
+    """64-битный хэш со знаком — так он ложится в INTEGER SQLite"""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def numbers_key(words: Sequence[str]) -> int:
+    """Хэш чисел текста (даты, время, суммы, версии) по порядку; 0 — чисел нет"""
+    numbers = [word for word in words if any(char.isdigit() for char in word)]
+    return _hash64("numbers:" + " ".join(numbers)) if numbers else 0
+
+
+def simhash(words: Sequence[str], shingle: int = 2) -> int:
+    """SimHash по словесным шинглам, беззнаковое 64-битное число"""
+    grams = [" ".join(words[i:i + shingle]) for i in range(max(len(words) - shingle + 1, 1))]
+    weights = [0] * 64
+    for gram in grams:
+        h = _hash64(gram) & (2 ** 64 - 1)
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def _bands(value: int):
+    return [(band, value >> (band * BAND_BITS) & (2 ** BAND_BITS - 1)) for band in range(BANDS)]
+
+
+def _signed(value: int) -> int:
+    return value - 2 ** 64 if value >= 2 ** 63 else value
+
+
+@dataclass
+class DedupStats:
+    seen: int = 0
+    dropped: int = 0
+
+    @property
+    def drop_rate(self) -> float:
+        return self.dropped / self.seen if self.seen else 0.0
+
+
+class NewsDeduplicator:
+    """Индекс уже разосланных новостей на диске (SQLite) с вытеснением по времени.
+
+    Новость считается дубликатом, если совпадает хэш текста, либо нормализованный URL
+    или SimHash текста (не дальше max_distance бит) при тех же числах в тексте.
+    Объявление, переизданное с новой датой или временем, почти не меняет SimHash, но
+    должно дойти до подписчиков; цена — пересказ той же новости с другой цифрой тоже
+    пройдет. В индексе хранятся только 64-битные ключи, без текстов.
+    """
+
+    def __init__(self, path: str = DEDUP_PATH, ttl: int = DEDUP_TTL,
+                 max_distance: int = DEDUP_SIMHASH_DISTANCE):
+        if max_distance >= BANDS:
+            raise ValueError(f"DEDUP_SIMHASH_DISTANCE должен быть меньше {BANDS}")
+        self.path = path
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.stats = DedupStats()
+        self._ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._ready:
+            conn.execute("pragma journal_mode=wal")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            columns = [row[1] for row in conn.execute("pragma table_info(simhashes)")]
+            if "numbers" not in columns:
+                # индекс до учета чисел: его записи совпадут только с новостями без чисел
+                conn.execute("alter table simhashes add column numbers integer not null default 0")
+            self._ready = True
+        return conn
+
+    def _is_near(self, conn, value: int, numbers: int) -> bool:
+        for band, band_value in _bands(value):
+            for (candidate,) in conn.execute(
+                    "select simhash from simhashes where band = ? and value = ? and numbers = ?",
+                    (band, band_value, numbers)):
+                if bin((candidate & (2 ** 64 - 1)) ^ value).count("1") <= self.max_distance:
+                    return True
+        return False
+
+    def _check_sync(self, items: Sequence[dict]) -> List[bool]:
+        now = time.time()
+        keep = []
+        with self._connect() as conn:
+            conn.execute("delete from seen_keys where seen_at < ?", (now - self.ttl,))
+            conn.execute("delete from simhashes where seen_at < ?", (now - self.ttl,))
+            for item in items:
+                words = normalize_text(f"{item.get('title', '')} {item.get('summary', '')}")
+                numbers = numbers_key(words)
+                # хэш текста уже включает числа; URL совпадает только при тех же числах —
+                # объявление по тому же адресу с новой датой не дубликат
+                keys = [_hash64("text:" + " ".join(words))]
+                if item.get('url'):
+                    keys.append(_hash64(f"url:{numbers}:" + normalize_url(item['url'])))
+                value = simhash(words)
+                duplicate = any(
+                    conn.execute("select 1 from seen_keys where key = ?", (key,)).fetchone() for key in keys
+                ) or (len(words) >= 3 and self._is_near(conn, value, numbers))
+                keep.append(not duplicate)
+                conn.executemany("insert or replace into seen_keys (key, seen_at) values (?, ?)",
+                                 [(key, now) for key in keys])
+                if not duplicate:
+                    conn.executemany(
+                        "insert into simhashes (simhash, band, value, seen_at, numbers) values (?, ?, ?, ?, ?)",
+                        [(_signed(value), band, band_value, now, numbers) for band, band_value in _bands(value)]
+                    )
+        return keep
+
+    async def check(self, items: Sequence[dict]) -> List[bool]:
+        """Для каждой новости: True — новая, False — дубликат уже разосланной"""
+        try:
+            keep = await asyncio.to_thread(self._check_sync, items)
+        except Exception as e:
+            logger.error(f"Ошибка индекса дубликатов: {e}")
+            return [True] * len(items)
+        self.stats.seen += len(items)
+        self.stats.dropped += keep.count(False)
+        return keep
+
+
+deduplicator = NewsDeduplicator()
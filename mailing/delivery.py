@@ -0,0 +1,213 @@
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import AsyncIterable, Awaitable, Callable, Iterable, Optional, Sequence, Tuple, Union
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from dotenv import load_dotenv
+
+from mailing.pruning import pruner
+from utils import metrics
+from utils.lanes import BULK, current_lane
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_RATE = float(os.getenv("DELIVERY_RATE", "25"))
+DELIVERY_CHAT_INTERVAL = float(os.getenv("DELIVERY_CHAT_INTERVAL", "1.0"))
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "20"))
+DELIVERY_MAX_RETRIES = 3
+
+SENT, BLOCKED, FAILED = "sent", "blocked", "failed"
+
+SendPart = Callable[[int], Awaitable]
+Recipient = Union[int, Tuple[int, Sequence[int]]]
+Recipients = Union[Iterable[Recipient], AsyncIterable[Recipient]]
+
+
+class RateLimiter:
+    """Глобальный token bucket + пауза между сообщениями в один чат"""
+
+    def __init__(self, rate: float = DELIVERY_RATE, chat_interval: float = DELIVERY_CHAT_INTERVAL):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.chat_interval = chat_interval
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._chat_next: dict[int, float] = {}
+        self._lock = asyncio.Lock()
+
+    def set_rate(self, rate: float):
+        """Новая доля общего лимита, когда его делят несколько процессов"""
+        if rate != self.rate:
+            self.rate = rate
+            self.capacity = max(1.0, rate)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def pause(self, seconds: float):
+        """Flood limit: останавливаем всю корзину, а не одну корутину"""
+        until = time.monotonic() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            self._tokens = 0.0
+            logger.warning(f"⏸ Flood limit! Отправка приостановлена на {seconds} сек.")
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def _wait_chat(self, chat_id: int):
+        wait = self._chat_next.get(chat_id, 0.0) - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _mark_chat(self, chat_id: int):
+        now = time.monotonic()
+        self._chat_next[chat_id] = now + self.chat_interval
+        if len(self._chat_next) > 10_000:
+            self._chat_next = {k: v for k, v in self._chat_next.items() if v > now}
+
+    async def acquire(self, chat_id: int):
+        await self._wait_chat(chat_id)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+        # пауза в чат отсчитывается от фактической отправки: ожидание общего токена
+        # (очередь, flood limit) не должно съедать интервал до следующего сообщения
+        self._mark_chat(chat_id)
+
+
+@dataclass
+class DeliveryStats:
+    sent: int = 0
+    blocked: int = 0
+    failed: int = 0
+    messages: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.blocked + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """Сообщений в секунду"""
+        return self.messages / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class DeliveryEngine:
+    """Пул воркеров отправки с общим лимитом скорости"""
+
+    def __init__(self, limiter: RateLimiter, workers: int = DELIVERY_WORKERS, pruner=None):
+        self.limiter = limiter
+        self.workers = workers
+        self.pruner = pruner
+        # очереди и статистика идущих рассылок — для метрик
+        self.active: list = []
+
+    async def _send_part(self, send: SendPart, chat_id: int, stats: DeliveryStats):
+        for _ in range(DELIVERY_MAX_RETRIES):
+            await self.limiter.acquire(chat_id)
+            try:
+                await send(chat_id)
+                stats.messages += 1
+                metrics.delivery_messages.inc()
+                return
+            except TelegramRetryAfter as e:
+                self.limiter.pause(e.retry_after)
+        raise RuntimeError(f"превышено число повторов ({DELIVERY_MAX_RETRIES})")
+
+    async def _deliver_one(self, chat_id: int, parts: Sequence[SendPart], indexes: Iterable[int],
+                           stats: DeliveryStats, on_part) -> str:
+        try:
+            for index in indexes:
+                await self._send_part(parts[index], chat_id, stats)
+                if on_part:
+                    await on_part(chat_id, index)
+            stats.sent += 1
+            return SENT
+        except TelegramForbiddenError:
+            stats.blocked += 1
+            logger.warning(f"Пользователь {chat_id} заблокировал бота.")
+            if self.pruner:
+                self.pruner.add(chat_id)
+            return BLOCKED
+        except Exception as e:
+            stats.failed += 1
+            logger.error(f"Ошибка отправки пользователю {chat_id}: {e}")
+            return FAILED
+
+    async def run(self, recipients: Recipients, parts: Sequence[SendPart],
+                  on_result: Optional[Callable[[int, str], Awaitable]] = None,
+                  on_part: Optional[Callable[[int, int], Awaitable]] = None) -> DeliveryStats:
+        """Отправить каждому получателю все части по порядку.
+
+        Получатель — chat_id или пара (chat_id, номера частей), если нужна только часть сообщений.
+        on_part(chat_id, index) вызывается после каждой доставленной части,
+        on_result(chat_id, status) — после обработки каждого получателя"""
+        stats = DeliveryStats()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+
+        async def worker():
+            current_lane.set(BULK)
+            while True:
+                item = await queue.get()
+                try:
+                    if item is None:
+                        return
+                    chat_id, indexes = item if isinstance(item, tuple) else (item, range(len(parts)))
+                    status = await self._deliver_one(chat_id, parts, indexes, stats, on_part)
+                    if on_result:
+                        # сбой колбэка не должен убивать воркер: иначе очередь встанет и рассылка зависнет
+                        try:
+                            await on_result(chat_id, status)
+                        except Exception as e:
+                            logger.error(f"Ошибка обработки результата для {chat_id}: {e}", exc_info=True)
+                finally:
+                    queue.task_done()
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        self.active.append((queue, stats))
+        try:
+            if isinstance(recipients, AsyncIterable):
+                async for item in recipients:
+                    await queue.put(item)
+            else:
+                for item in recipients:
+                    await queue.put(item)
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+            if self.pruner:
+                await self.pruner.flush()
+        finally:
+            self.active.remove((queue, stats))
+            for task in tasks:
+                task.cancel()
+        return stats
+
+
+limiter = RateLimiter()
+engine = DeliveryEngine(limiter, pruner=pruner)
+
+
+@metrics.collector
+def _collect_delivery():
+    metrics.delivery_queue.set(sum(queue.qsize() for queue, _ in engine.active))
+    metrics.delivery_rate.set(sum(stats.rate for _, stats in engine.active))
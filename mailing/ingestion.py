@@ -0,0 +1,117 @@
+import os
+import asyncio
+import logging
+from typing import Optional, Sequence
+
+from aiogram import Bot
+from dotenv import load_dotenv
+
+from mailing.pipeline import register_jobs, run_sources
+from mailing.sources import MailingSource, sources
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+NEWS_INGESTION = os.getenv("NEWS_INGESTION", "cron")
+NEWS_DATABASE_URL = os.getenv("NEWS_DATABASE_URL", "")
+NEWS_CHANNEL = os.getenv("NEWS_CHANNEL", "news_ingest")
+NEWS_DEBOUNCE = float(os.getenv("NEWS_DEBOUNCE", "3"))
+NEWS_POLL_MIN = float(os.getenv("NEWS_POLL_MIN", "15"))
+NEWS_POLL_MAX = float(os.getenv("NEWS_POLL_MAX", "300"))
+
+
+class NewsIngestor:
+    """Забор новостей по событиям вместо часового cron.
+
+    В режиме listen бот подписывается на LISTEN news_ingest в Postgres; уведомления,
+    пришедшие в течение debounce секунд, обрабатываются одним запуском конвейера.
+    Пока подписки нет (режим poll, нет asyncpg или соединение потеряно), источники
+    опрашиваются адаптивно: после новостей интервал сбрасывается до poll_min,
+    в простое удваивается до poll_max. При живой подписке раз в poll_max все равно
+    выполняется страховочный опрос.
+    """
+
+    def __init__(self, bot: Bot, due: Sequence[MailingSource], debounce: float = NEWS_DEBOUNCE,
+                 poll_min: float = NEWS_POLL_MIN, poll_max: float = NEWS_POLL_MAX):
+        self.bot = bot
+        self.sources = {source.name: source for source in due}
+        self.debounce = debounce
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.interval = poll_min
+        self.listening = False
+        self._due: set = set()
+        self._wakeup = asyncio.Event()
+
+    def notify(self, name: str = ""):
+        """Отметить источник как имеющий новости; неизвестное имя — проверить все"""
+        if name in self.sources:
+            self._due.add(name)
+        else:
+            self._due.update(self.sources)
+        self._wakeup.set()
+
+    async def _wait(self):
+        timeout = self.poll_max if self.listening else self.interval
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            self._due.update(self.sources)
+            return
+        await asyncio.sleep(self.debounce)
+
+    async def run(self):
+        while True:
+            await self._wait()
+            self._wakeup.clear()
+            due, self._due = [self.sources[name] for name in sorted(self._due)], set()
+            try:
+                found = await run_sources(self.bot, due)
+            except Exception as e:
+                logger.error(f"Ошибка обработки новостей: {e}", exc_info=True)
+                found = 0
+            self.interval = self.poll_min if found else min(self.interval * 2, self.poll_max)
+
+    async def listen(self, dsn: str = NEWS_DATABASE_URL, channel: str = NEWS_CHANNEL):
+        """Держать LISTEN-подписку, переподключаясь при обрыве"""
+        try:
+            import asyncpg
+        except ImportError:
+            logger.critical("❌ Для NEWS_INGESTION=listen установите пакет asyncpg, используется опрос")
+            return
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                conn.add_termination_listener(lambda _: closed.set())
+                await conn.add_listener(channel, lambda _conn, _pid, _channel, payload: self.notify(payload))
+                self.listening = True
+                logger.info(f"✅ Подписка LISTEN {channel} активна")
+                # новости, добавленные пока подписки не было
+                self.notify()
+                await closed.wait()
+                logger.warning(f"⚠️ Соединение LISTEN {channel} закрыто, переход на опрос")
+            except Exception as e:
+                logger.error(f"Ошибка подписки LISTEN {channel}: {e}")
+            finally:
+                self.listening = False
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(self.poll_min)
+
+
+def start_ingestion(bot: Bot, jobs) -> Optional[asyncio.Future]:
+    """Запустить забор новостей по NEWS_INGESTION: cron (по расписанию источников), listen или poll"""
+    if NEWS_INGESTION == "cron":
+        register_jobs(jobs, bot)
+        return None
+    ingestor = NewsIngestor(bot, list(sources.values()))
+    if NEWS_INGESTION == "listen":
+        logger.info(f"✅ Новости забираются по LISTEN {NEWS_CHANNEL}, debounce {NEWS_DEBOUNCE} сек.")
+        tasks = [ingestor.run(), ingestor.listen()]
+    else:
+        logger.info(f"✅ Новости забираются адаптивным опросом ({NEWS_POLL_MIN}–{NEWS_POLL_MAX} сек.)")
+        tasks = [ingestor.run()]
+    return asyncio.gather(*tasks)
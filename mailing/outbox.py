@@ -0,0 +1,174 @@
+import os
+import json
+import socket
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Sequence
+
+from aiogram import Bot
+from aiogram.types import LinkPreviewOptions
+from dotenv import load_dotenv
+
+import database.supabase as db
+from mailing.delivery import engine, DeliveryStats, SendPart, SENT
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PAGE_SIZE = int(os.getenv("OUTBOX_PAGE_SIZE", "500"))
+OUTBOX_ACK_BATCH = int(os.getenv("OUTBOX_ACK_BATCH", "200"))
+OUTBOX_ACK_INTERVAL = float(os.getenv("OUTBOX_ACK_INTERVAL", "1.0"))
+OUTBOX_CLAIM_TIMEOUT = int(os.getenv("OUTBOX_CLAIM_TIMEOUT", "300"))
+OUTBOX_ENQUEUE_BATCH = int(os.getenv("OUTBOX_ENQUEUE_BATCH", "1000"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+# 1 — бот только ставит рассылки в очередь, доставляют отдельные процессы worker.py
+MAILING_WORKERS = os.getenv("MAILING_WORKERS", "0") == "1"
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+NO_PREVIEW = LinkPreviewOptions(is_disabled=True)
+
+
+def digest_job_id(source: str, parts: Sequence[str], run: str) -> str:
+    """Идемпотентный ID рассылки: одинаковый дайджест в одном запуске run дает тот же ID и не ставится
+    в очередь повторно. Тот же текст в другом запуске — новая рассылка, а не пропуск для всех,
+    кто уже есть в очереди"""
+    digest = hashlib.sha1(json.dumps(list(parts), ensure_ascii=False).encode()).hexdigest()[:16]
+    return f"{source}:{run}:{digest}"
+
+
+def text_senders(bot: Bot, parts: Sequence[str]) -> list:
+    return [
+        lambda chat_id, text=part: bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            parse_mode="HTML",
+            link_preview_options=NO_PREVIEW
+        )
+        for part in parts
+    ]
+
+
+class OutboxDrain:
+    """Выгрузка одной рассылки (или ее шарда) из очереди доставки с пакетными подтверждениями"""
+
+    def __init__(self, job_id: str, senders: Sequence[SendPart], shard: int = 0, shards: int = 1):
+        self.job_id = job_id
+        self.senders = senders
+        self.shard = shard
+        self.shards = shards
+        self._unacked: dict[int, set] = {}
+        self._acks: list = []
+
+    async def _claimed(self):
+        carry = None
+        while True:
+            rows = await db.claim_outbox(self.job_id, OWNER, OUTBOX_PAGE_SIZE, OUTBOX_CLAIM_TIMEOUT,
+                                         self.shard, self.shards)
+            if rows is None:
+                logger.error(f"Очередь {self.job_id} будет дочитана при следующем запуске")
+                return
+            # миграция 013 сортирует строки в claim_outbox; старая версия функции отдавала их вразнобой
+            rows = sorted(rows, key=lambda row: (row['user_id'], row['part']))
+            groups = []
+            for row in rows:
+                if groups and groups[-1][0] == row['user_id']:
+                    groups[-1][1].append(row['part'])
+                elif carry is not None and carry[0] == row['user_id']:
+                    carry[1].append(row['part'])
+                else:
+                    groups.append((row['user_id'], [row['part']]))
+            if carry is not None:
+                groups.insert(0, carry)
+                carry = None
+            # части последнего пользователя могли не влезть в страницу — ждем следующую
+            if len(rows) == OUTBOX_PAGE_SIZE and groups:
+                carry = groups.pop()
+            for user_id, indexes in groups:
+                self._unacked[user_id] = set(indexes)
+                yield user_id, sorted(indexes)
+            if len(rows) < OUTBOX_PAGE_SIZE:
+                return
+
+    def _ack(self, user_id: int, part: int, status: str):
+        self._acks.append({"user_id": user_id, "part": part, "status": status})
+
+    async def _on_part(self, chat_id: int, index: int):
+        self._unacked[chat_id].discard(index)
+        self._ack(chat_id, index, SENT)
+        if len(self._acks) >= OUTBOX_ACK_BATCH:
+            await self.flush()
+
+    async def _on_result(self, chat_id: int, status: str):
+        for index in self._unacked.pop(chat_id, ()):
+            self._ack(chat_id, index, status)
+
+    async def flush(self):
+        if not self._acks:
+            return
+        acks, self._acks = self._acks, []
+        if not await db.ack_outbox(self.job_id, acks):
+            self._acks = acks + self._acks
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(OUTBOX_ACK_INTERVAL)
+            await self.flush()
+
+    async def run(self) -> DeliveryStats:
+        flusher = asyncio.create_task(self._flush_periodically())
+        try:
+            return await engine.run(self._claimed(), self.senders,
+                                    on_result=self._on_result, on_part=self._on_part)
+        finally:
+            flusher.cancel()
+            await self.flush()
+
+
+async def deliver_job(bot: Bot, job_id: str, parts: Sequence[str], shard: int = 0, shards: int = 1) -> DeliveryStats:
+    return await OutboxDrain(job_id, text_senders(bot, parts), shard, shards).run()
+
+
+async def enqueue(job_id: str, parts: Sequence[str], user_ids: Sequence[int]) -> Optional[int]:
+    """Поставить рассылку в очередь для пользователей пачками по OUTBOX_ENQUEUE_BATCH"""
+    queued = 0
+    for start in range(0, len(user_ids), OUTBOX_ENQUEUE_BATCH):
+        count = await db.enqueue_delivery(job_id, list(parts), list(user_ids[start:start + OUTBOX_ENQUEUE_BATCH]))
+        if count is None:
+            return None
+        queued += count
+    return queued
+
+
+async def resume_pending(bot: Bot):
+    """Дослать рассылки, прерванные падением или перезапуском"""
+    if MAILING_WORKERS:
+        return
+    for job in await db.get_pending_delivery_jobs():
+        logger.info(f"🔁 Возобновление рассылки {job['id']} из очереди доставки")
+        stats = await deliver_job(bot, job['id'], job['parts'])
+        logger.info(f"✅ Рассылка {job['id']} дослана: {stats.sent} получателей, {stats.messages} сообщений")
+
+
+async def purge_outbox():
+    """Задача планировщика: очистить очередь доставки от завершенных строк"""
+    deleted = await db.purge_delivery_outbox(OUTBOX_RETENTION_DAYS)
+    if deleted is not None:
+        logger.info(f"🧹 Из очереди доставки удалено {deleted} строк старше {OUTBOX_RETENTION_DAYS} дн.")
+
+
+def register_outbox_jobs(jobs):
+    jobs.add_cron_job("purge_outbox", purge_outbox, hour=4, minute=30)
+
+
+async def queue_stats():
+    """Глубина очереди доставки и возраст самой старой задачи в секундах"""
+    row = await db.get_outbox_stats()
+    if not row:
+        return None, None
+    oldest = row.get('oldest')
+    age = (datetime.now(timezone.utc) - datetime.fromisoformat(oldest)).total_seconds() if oldest else 0.0
+    return row['pending'], age
@@ -0,0 +1,75 @@
+import re
+import html
+import logging
+from typing import Iterable, List
+
+logger = logging.getLogger(__name__)
+
+# Telegram считает лимит сообщения в UTF-16 единицах текста после разбора HTML-разметки
+MESSAGE_LIMIT = 4096
+
+TAG = re.compile(r"<[^>]+>")
+
+
+def utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def visible_length(markup: str) -> int:
+    """Длина HTML-сообщения так, как ее считает Telegram: без тегов, с раскрытыми сущностями"""
+    return utf16_len(html.unescape(TAG.sub("", markup)))
+
+
+def truncate(text: str, limit: int, ellipsis: str = "…") -> str:
+    """Обрезать обычный текст до limit UTF-16 единиц по границе слова"""
+    if utf16_len(text) <= limit:
+        return text
+    budget = limit - utf16_len(ellipsis)
+    cut = text.encode("utf-16-le")[:budget * 2].decode("utf-16-le", errors="ignore")
+    word_end = cut.rfind(" ")
+    if word_end > len(cut) // 2:
+        cut = cut[:word_end]
+    return cut.rstrip(" ,.;:—-") + ellipsis
+
+
+def _count_parts(lengths: List[int], capacity: int) -> int:
+    parts, current = 1, 0
+    for length in lengths:
+        if current and current + length > capacity:
+            parts += 1
+            current = 0
+        current += length
+    return parts
+
+
+def pack_digest(chunks: Iterable[str], limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Разложить отформатированные новости по минимальному числу сообщений.
+
+    Порядок новостей сохраняется. Жадное заполнение дает минимум частей, после чего
+    вместимость уменьшается бинарным поиском до наименьшей, при которой частей
+    не больше — так последняя часть не остается почти пустой.
+    """
+    chunks = [chunk for chunk in chunks if chunk.strip()]
+    if not chunks:
+        return []
+    lengths = [visible_length(chunk) for chunk in chunks]
+    for chunk, length in zip(chunks, lengths):
+        if length > limit:
+            logger.warning(f"Новость длиной {length} не помещается в одно сообщение ({limit})")
+    parts = _count_parts(lengths, limit)
+    low, high = min(max(lengths), limit), limit
+    while low < high:
+        middle = (low + high) // 2
+        if _count_parts(lengths, middle) <= parts:
+            high = middle
+        else:
+            low = middle + 1
+    messages_to_send, current, size = [], "", 0
+    for chunk, length in zip(chunks, lengths):
+        if current and size + length > high:
+            messages_to_send.append(current.strip())
+            current, size = "", 0
+        current += chunk
+        size += length
+    messages_to_send.append(current.strip())
+    return messages_to_send
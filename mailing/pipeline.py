@@ -0,0 +1,167 @@
+import html
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from aiogram import Bot
+
+import database.supabase as db
+from mailing.dedup import deduplicator
+from mailing.delivery import DeliveryStats
+from mailing.outbox import MAILING_WORKERS, OUTBOX_ENQUEUE_BATCH, digest_job_id, enqueue, deliver_job
+from mailing.packing import pack_digest
+from mailing.sources import MailingSource, group_by_schedule
+
+logger = logging.getLogger(__name__)
+
+async def _fetch(source: MailingSource) -> list:
+    try:
+        return await source.fetch() or []
+    except Exception as e:
+        logger.error(f"Ошибка получения новостей {source.name}: {e}")
+        return []
+
+
+class DigestVariant:
+    """Один вариант дайджеста — общий текст для всех пользователей с одинаковым набором категорий"""
+
+    def __init__(self, categories: Tuple[int, ...], parts: List[str], run: str, bot: Optional[Bot] = None):
+        self.categories = categories
+        self.parts = parts
+        self.job_id = digest_job_id("digest", parts, run)
+        self.recipients = 0
+        self.bot = bot
+        self.results: List[DeliveryStats] = []
+        self._drain: Optional[asyncio.Task] = None
+        self._enqueued = False
+        self._buffer: List[int] = []
+
+    async def add(self, user_id: int):
+        self.recipients += 1
+        self._buffer.append(user_id)
+        if len(self._buffer) >= OUTBOX_ENQUEUE_BATCH:
+            await self.flush()
+
+    async def flush(self):
+        user_ids, self._buffer = self._buffer, []
+        if not user_ids:
+            return
+        if await enqueue(self.job_id, self.parts, user_ids) is None:
+            logger.error(f"❌ Не удалось поставить в очередь {len(user_ids)} получателей {self.job_id}")
+            return
+        if self.bot is None:
+            return
+        # доставка идет, пока читаются следующие страницы подписчиков. Выгрузка у рассылки
+        # всегда одна: две делили бы части одного пользователя на границе страницы
+        self._enqueued = True
+        if self._drain is None or self._drain.done():
+            self._drain = asyncio.create_task(self._deliver())
+
+    async def _deliver(self):
+        # выгрузка заканчивается на неполной странице очереди: пачки, поставленные
+        # после ее начала, дочитываются следующим проходом
+        while self._enqueued:
+            self._enqueued = False
+            self.results.append(await deliver_job(self.bot, self.job_id, self.parts))
+
+    async def finish(self) -> List[DeliveryStats]:
+        """Дождаться доставки всех поставленных в очередь получателей"""
+        await self.flush()
+        if self._drain is not None:
+            await self._drain
+        return self.results
+
+
+class DigestBuilder:
+    """Сводный дайджест: каждый пользователь получает одно сообщение со всеми своими категориями"""
+
+    def __init__(self, news: Dict[int, List[str]], names: Dict[int, str], bot: Optional[Bot] = None):
+        self.news = news
+        self.names = names
+        self.bot = bot
+        self.run = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        self.variants: Dict[Tuple[int, ...], DigestVariant] = {}
+
+    def _chunks(self, categories: Tuple[int, ...]):
+        for category_id in categories:
+            items = self.news[category_id]
+            if len(categories) > 1:
+                # заголовок раздела не должен отрываться от первой новости
+                name = html.escape(self.names.get(category_id, str(category_id)))
+                yield f"📂 <b>{name}</b>\n\n" + items[0]
+                yield from items[1:]
+            else:
+                yield from items
+
+    def variant(self, subscriptions: frozenset) -> DigestVariant:
+        key = tuple(sorted(subscriptions & self.news.keys()))
+        variant = self.variants.get(key)
+        if variant is None:
+            variant = self.variants[key] = DigestVariant(key, pack_digest(self._chunks(key)), self.run, self.bot)
+        return variant
+
+    def separate_messages(self) -> int:
+        """Сколько сообщений ушло бы при отдельной рассылке по каждой категории"""
+        per_category = {category_id: len(pack_digest(items)) for category_id, items in self.news.items()}
+        return sum(variant.recipients * sum(per_category[c] for c in variant.categories)
+                   for variant in self.variants.values())
+
+
+async def deliver_digests(bot: Bot, news: Dict[int, List[str]]) -> Sequence[DeliveryStats]:
+    """Один проход по подписчикам всех категорий с новостями и одна доставка на пользователя"""
+    names = {category['id']: category['category_name'] for category in await db.get_all_categories()}
+    # с воркерами рассылок бот только ставит варианты в очередь
+    builder = DigestBuilder(news, names, None if MAILING_WORKERS else bot)
+    async for batch in db.iter_digest_recipients(list(news)):
+        for user_id, subscriptions in batch:
+            await builder.variant(subscriptions).add(user_id)
+    variants = list(builder.variants.values())
+    if not variants:
+        logger.info("👥 Подписчиков на категории с новостями нет.")
+        return []
+    finished = await asyncio.gather(*(variant.finish() for variant in variants))
+    if MAILING_WORKERS:
+        logger.info(f"📬 Вариантов дайджеста в очереди: {len(variants)}, доставят воркеры рассылок")
+        return []
+    results = [stats for variant_results in finished for stats in variant_results]
+    sent = sum(stats.sent for stats in results)
+    processed = sum(stats.processed for stats in results)
+    messages = sum(stats.messages for stats in results)
+    logger.info(f"✅ Рассылка завершена. Дайджест получили {sent} из {processed} "
+                f"(заблокировали: {sum(stats.blocked for stats in results)}, "
+                f"ошибок: {sum(stats.failed for stats in results)}). "
+                f"Вариантов дайджеста: {len(variants)}, сообщений: {messages} "
+                f"(отдельными рассылками по категориям было бы {builder.separate_messages()})")
+    return results
+
+
+async def run_sources(bot: Bot, due: Sequence[MailingSource]) -> int:
+    """Забрать новости всех источников параллельно и разослать сводным дайджестом.
+    Возвращает число полученных новостей"""
+    logger.info(f"🕵️‍♂️ Проверка новых новостей: {', '.join(source.name for source in due)}")
+    results = await asyncio.gather(*(_fetch(source) for source in due))
+    fetched = sum(len(items) for items in results)
+    if not fetched:
+        logger.info("📭 Новых новостей пока нет.")
+        return 0
+    keep = iter(await deduplicator.check([item for items in results for item in items]))
+    news: Dict[int, List[str]] = {}
+    for source, items in zip(due, results):
+        unique = [item for item in items if next(keep)]
+        if items:
+            logger.info(f"📰 {source.name}: новостей {len(items)}, дубликатов {len(items) - len(unique)}")
+        if unique:
+            news.setdefault(source.category_id, []).extend(source.format_item(item) for item in unique)
+    stats = deduplicator.stats
+    logger.info(f"🔁 Дубликатов отброшено: {stats.dropped} из {stats.seen} ({stats.drop_rate:.0%}) с запуска")
+    if news:
+        await deliver_digests(bot, news)
+    return fetched
+
+
+def register_jobs(jobs, bot: Bot):
+    """Одна задача планировщика на каждую группу источников с общим расписанием"""
+    for schedule_key, group in group_by_schedule().items():
+        job_id = "+".join(source.name for source in group)
+        jobs.add_cron_job(job_id, run_sources, args=[bot, group], **dict(schedule_key))
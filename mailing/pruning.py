@@ -0,0 +1,58 @@
+import os
+import asyncio
+import logging
+from typing import Optional
+
+from dotenv import load_dotenv
+
+import database.supabase as db
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PRUNE_BATCH = int(os.getenv("PRUNE_BATCH", "500"))
+PRUNE_INTERVAL = float(os.getenv("PRUNE_INTERVAL", "5.0"))
+
+
+class InactiveUserPruner:
+    """Копит пользователей, заблокировавших бота, и отключает их пачками одним RPC.
+
+    Отключенные пользователи больше не попадают в выборки рассылок,
+    пока снова не нажмут /start.
+    """
+
+    def __init__(self, batch: int = PRUNE_BATCH, interval: float = PRUNE_INTERVAL):
+        self.batch = batch
+        self.interval = interval
+        self.pruned = 0
+        self._pending: set = set()
+        self._flusher: Optional[asyncio.Task] = None
+
+    def add(self, user_id: int):
+        self._pending.add(user_id)
+        if len(self._pending) >= self.batch:
+            self._flusher = asyncio.create_task(self.flush())
+        elif self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    def discard(self, user_id: int):
+        self._pending.discard(user_id)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.interval)
+        await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        user_ids, self._pending = list(self._pending), set()
+        count = await db.deactivate_users(user_ids)
+        if count is None:
+            self._pending.update(user_ids)
+            return
+        self.pruned += count
+        logger.info(f"🧹 Отключено неактивных пользователей: {count}")
+
+
+pruner = InactiveUserPruner()
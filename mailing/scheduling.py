@@ -0,0 +1,153 @@
+import os
+import socket
+import asyncio
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Optional
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from dotenv import load_dotenv
+
+from database.client import postgrest
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_LEASE = os.getenv("SCHEDULER_LEASE", "supabase")
+SCHEDULER_LEASE_PATH = os.getenv("SCHEDULER_LEASE_PATH", "scheduler.sqlite3")
+SCHEDULER_MISFIRE_GRACE = int(os.getenv("SCHEDULER_MISFIRE_GRACE", "600"))
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SupabaseLease:
+    """Захват запусков через таблицу job_runs в Supabase (общая для всех реплик)"""
+
+    async def claim(self, job_id: str, fire_time: datetime) -> bool:
+        res = await postgrest.rpc("claim_job_run", {
+            "p_job_id": job_id,
+            "p_fire_time": fire_time.isoformat(),
+            "p_owner": OWNER
+        }).execute()
+        return bool(res.data)
+
+    async def last_run(self, job_id: str) -> Optional[datetime]:
+        res = await postgrest.rpc("get_last_job_run", {"p_job_id": job_id}).execute()
+        return datetime.fromisoformat(res.data) if res.data else None
+
+
+class SQLiteLease:
+    """Захват запусков через локальный SQLite-файл: для тестов и нескольких процессов на одной машине"""
+
+    def __init__(self, path: str = SCHEDULER_LEASE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("pragma journal_mode=wal")
+            conn.execute(
+                "create table if not exists job_runs ("
+                "job_id text not null, fire_time text not null, owner text not null, "
+                "primary key (job_id, fire_time))"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _claim_sync(self, job_id, fire_time, owner):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "insert or ignore into job_runs (job_id, fire_time, owner) values (?, ?, ?)",
+                (job_id, fire_time, owner)
+            )
+            return cursor.rowcount == 1
+
+    def _last_run_sync(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("select max(fire_time) from job_runs where job_id = ?", (job_id,)).fetchone()
+            return row[0]
+
+    async def claim(self, job_id: str, fire_time: datetime) -> bool:
+        return await asyncio.to_thread(self._claim_sync, job_id, fire_time.isoformat(), OWNER)
+
+    async def last_run(self, job_id: str) -> Optional[datetime]:
+        value = await asyncio.to_thread(self._last_run_sync, job_id)
+        return datetime.fromisoformat(value) if value else None
+
+
+def create_lease():
+    if SCHEDULER_LEASE == "sqlite":
+        logger.info(f"✅ Запуски задач согласуются через SQLite: {SCHEDULER_LEASE_PATH}")
+        return SQLiteLease()
+    return SupabaseLease()
+
+
+def latest_fire_time(trigger: CronTrigger, now: datetime, since: Optional[datetime] = None) -> Optional[datetime]:
+    """Последнее плановое срабатывание триггера в интервале (since, now]"""
+    previous = None
+    fire_time = trigger.get_next_fire_time(None, since + timedelta(seconds=1) if since else now - timedelta(days=1))
+    while fire_time is not None and fire_time <= now:
+        previous = fire_time
+        fire_time = trigger.get_next_fire_time(fire_time, fire_time + timedelta(seconds=1))
+    return previous
+
+
+class SingleLeaderScheduler:
+    """Обертка над AsyncIOScheduler: каждое срабатывание задачи выполняет ровно одна реплика.
+
+    Реплика захватывает пару (job_id, плановое время запуска) в общем хранилище,
+    остальные видят, что запуск уже занят, и пропускают его. Пропущенные за время
+    простоя срабатывания схлопываются в один запуск при старте.
+    """
+
+    def __init__(self, scheduler: AsyncIOScheduler, lease=None):
+        self.scheduler = scheduler
+        self.lease = lease or create_lease()
+        self._jobs: dict = {}
+        self._tasks: set = set()
+
+    def add_cron_job(self, job_id: str, func, args=(), **cron):
+        trigger = CronTrigger(timezone=self.scheduler.timezone, **cron)
+        self._jobs[job_id] = (trigger, func, args)
+        self.scheduler.add_job(
+            self._fire, trigger, args=[job_id], id=job_id, replace_existing=True,
+            coalesce=True, max_instances=1, misfire_grace_time=SCHEDULER_MISFIRE_GRACE
+        )
+
+    async def _run(self, job_id: str, fire_time: datetime):
+        _, func, args = self._jobs[job_id]
+        try:
+            claimed = await self.lease.claim(job_id, fire_time)
+        except Exception as e:
+            logger.error(f"Ошибка захвата запуска {job_id} @ {fire_time}: {e}")
+            return
+        if not claimed:
+            logger.info(f"⏭ Запуск {job_id} @ {fire_time} уже выполняет другая реплика")
+            return
+        logger.info(f"▶️ Запуск {job_id} @ {fire_time} ({OWNER})")
+        await func(*args)
+
+    async def _fire(self, job_id: str):
+        trigger = self._jobs[job_id][0]
+        fire_time = latest_fire_time(trigger, datetime.now(self.scheduler.timezone))
+        if fire_time is not None:
+            await self._run(job_id, fire_time)
+
+    async def catch_up(self):
+        """Один запуск за все срабатывания, пропущенные пока бот был остановлен"""
+        now = datetime.now(self.scheduler.timezone)
+        for job_id, (trigger, _, _) in self._jobs.items():
+            try:
+                last = await self.lease.last_run(job_id)
+            except Exception as e:
+                logger.error(f"Ошибка чтения истории запусков {job_id}: {e}")
+                continue
+            if last is None:
+                continue
+            missed = latest_fire_time(trigger, now, since=last)
+            if missed is not None:
+                logger.info(f"🔁 Пропущенные запуски {job_id} после {last} объединены в один ({missed})")
+                task = asyncio.create_task(self._run(job_id, missed))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
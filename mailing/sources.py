@@ -0,0 +1,67 @@
+import html
+import logging
+import importlib
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List
+
+from mailing.packing import truncate
+
+logger = logging.getLogger(__name__)
+
+# Лимиты в UTF-16 единицах: новость с заголовком раздела всегда помещается в одно сообщение
+TITLE_LIMIT = 256
+SUMMARY_LIMIT = 3500
+
+# Модули рассылок: при импорте каждый регистрирует свой источник через register()
+SOURCE_MODULES = (
+    "mailing.tech_news.tech_news",
+)
+
+
+def format_news_item(news: dict) -> str:
+    title = html.escape(truncate(news.get('title') or 'Без заголовка', TITLE_LIMIT))
+    summary = html.escape(truncate(news.get('summary') or '', SUMMARY_LIMIT))
+    url = news.get('url', '#')
+    return (
+        f"📌 <a href='{url}'><b>{title}</b></a>\n"
+        f"{summary}\n\n"
+    )
+
+
+@dataclass
+class MailingSource:
+    """Источник рассылки: откуда брать новости, в какую категорию и когда"""
+    name: str
+    category_id: int
+    fetch: Callable[[], Awaitable[list]]
+    schedule: dict = field(default_factory=dict)
+    format_item: Callable[[dict], str] = format_news_item
+
+    @property
+    def schedule_key(self) -> tuple:
+        return tuple(sorted(self.schedule.items()))
+
+
+sources: Dict[str, MailingSource] = {}
+
+
+def register(source: MailingSource) -> MailingSource:
+    if source.name in sources:
+        raise ValueError(f"Источник рассылки {source.name} уже зарегистрирован")
+    sources[source.name] = source
+    return source
+
+
+def discover() -> Dict[str, MailingSource]:
+    """Импортировать модули рассылок и вернуть реестр источников"""
+    for module in SOURCE_MODULES:
+        importlib.import_module(module)
+    return sources
+
+
+def group_by_schedule() -> Dict[tuple, List[MailingSource]]:
+    """Источники с одинаковым расписанием запускаются одной задачей и забираются параллельно"""
+    groups: Dict[tuple, List[MailingSource]] = {}
+    for source in sources.values():
+        groups.setdefault(source.schedule_key, []).append(source)
+    return groups
@@ -0,0 +1,97 @@
+import os
+import asyncio
+import logging
+
+from aiogram import Bot
+from dotenv import load_dotenv
+
+import database.supabase as db
+from mailing.delivery import DELIVERY_RATE, limiter
+from mailing.outbox import OWNER, deliver_job
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MAILING_SHARD = int(os.getenv("MAILING_SHARD", "0"))
+MAILING_SHARDS = int(os.getenv("MAILING_SHARDS", "1"))
+MAILING_WORKER_POLL = float(os.getenv("MAILING_WORKER_POLL", "2"))
+MAILING_WORKER_TTL = int(os.getenv("MAILING_WORKER_TTL", "15"))
+
+# Отметка процесса бота в mailing_workers: он не разбирает шарды, но шлет рассылки админа
+BOT_SHARD = -1
+
+
+async def heartbeat(shard: int, shards: int, ttl: int = MAILING_WORKER_TTL):
+    """Отметиться в mailing_workers и взять свою долю общего DELIVERY_RATE"""
+    live = await db.heartbeat_mailing_worker(OWNER, shard, shards, ttl)
+    if live:
+        limiter.set_rate(DELIVERY_RATE / live)
+
+
+async def share_delivery_rate(ttl: int = MAILING_WORKER_TTL):
+    """Процесс бота при MAILING_WORKERS=1 тоже участник дележа: его рассылки идут через свой
+    limiter, и без отметки суммарная скорость превысила бы DELIVERY_RATE"""
+    try:
+        while True:
+            await heartbeat(BOT_SHARD, 0, ttl)
+            await asyncio.sleep(ttl / 3)
+    finally:
+        await db.leave_mailing_workers(OWNER)
+
+
+class MailingWorker:
+    """Процесс доставки одного шарда очереди.
+
+    Получатели каждой рассылки делятся между MAILING_SHARDS воркерами по хэшу user_id,
+    так что все части сообщения одному пользователю шлет один процесс и пауза между
+    сообщениями в чат соблюдается локально. Общий лимит DELIVERY_RATE делится поровну
+    между воркерами и процессами бота, отметившимися в БД за последние ttl секунд.
+    """
+
+    def __init__(self, bot: Bot, shard: int = MAILING_SHARD, shards: int = MAILING_SHARDS,
+                 poll: float = MAILING_WORKER_POLL, ttl: int = MAILING_WORKER_TTL):
+        if not 0 <= shard < shards:
+            raise ValueError(f"Номер шарда {shard} вне диапазона 0..{shards - 1}")
+        self.bot = bot
+        self.shard = shard
+        self.shards = shards
+        self.poll = poll
+        self.ttl = ttl
+
+    async def heartbeat(self):
+        await heartbeat(self.shard, self.shards, self.ttl)
+
+    async def _heartbeats(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            await self.heartbeat()
+
+    async def drain_pending(self) -> int:
+        """Доставить свою долю всех рассылок с недоставленными сообщениями; вернуть число получателей"""
+        processed = 0
+        for job in await db.get_pending_delivery_jobs():
+            stats = await deliver_job(self.bot, job['id'], job['parts'], self.shard, self.shards)
+            if stats.processed:
+                logger.info(f"✅ Шард {self.shard}/{self.shards} рассылки {job['id']}: доставлено {stats.sent}, "
+                            f"заблокировали {stats.blocked}, ошибок {stats.failed}, "
+                            f"{stats.messages} сообщений за {stats.elapsed:.1f} сек.")
+            processed += stats.processed
+        return processed
+
+    async def run(self, once: bool = False):
+        """Разбирать очередь, пока не отменят; once — выйти, когда своя доля очереди пуста"""
+        await self.heartbeat()
+        logger.info(f"📮 Воркер рассылок {OWNER}: шард {self.shard}/{self.shards}, "
+                    f"доля лимита {limiter.rate:.1f} сообщ./сек")
+        heartbeats = asyncio.create_task(self._heartbeats())
+        try:
+            while True:
+                if await self.drain_pending():
+                    continue
+                if once:
+                    return
+                await asyncio.sleep(self.poll)
+        finally:
+            heartbeats.cancel()
+            await db.leave_mailing_workers(OWNER)
@@ -0,0 +1,10 @@
+import os
+
+# Клиент PostgREST создается при импорте database.client. Тесты, которым нужна БД, подменяют
+# database.supabase.postgrest клиентом к benchmarks/fake_postgrest.py, запущенному в своем цикле
+os.environ.update(
+    SUPABASE_URL="http://127.0.0.1:9",
+    SUPABASE_KEY="test",
+    SUPABASE_HTTP2="0",
+    METRICS_PORT="0",
+)
@@ -0,0 +1,50 @@
+import asyncio
+import sqlite3
+
+from mailing.dedup import NewsDeduplicator, normalize_url
+
+NOTICE = {
+    "title": "Вебинар по безопасности облачных сервисов для разработчиков",
+    "summary": "Начало 18 октября в 10:00, регистрация открыта для всех участников",
+    "url": "https://example.com/webinar",
+}
+
+
+def check(path, *batches):
+    async def run():
+        deduplicator = NewsDeduplicator(path=str(path))
+        return [await deduplicator.check(batch) for batch in batches]
+
+    return asyncio.run(run())
+
+
+def test_exact_and_url_duplicates(tmp_path):
+    same_url = dict(NOTICE, url="https://www.example.com/webinar/?utm_source=tg#top", title="Другой заголовок")
+    same_text = dict(NOTICE, url="https://other.example.com/1")
+    assert check(tmp_path / "dedup.sqlite3", [NOTICE], [same_url, same_text]) == [[True], [False, False]]
+
+
+def test_near_duplicate_with_same_numbers_is_dropped(tmp_path):
+    rephrased = dict(NOTICE, url="https://other.example.com/2",
+                     summary=NOTICE["summary"].replace("для всех", "для"))
+    assert check(tmp_path / "dedup.sqlite3", [NOTICE], [rephrased]) == [[True], [False]]
+
+
+def test_new_date_or_time_is_not_a_duplicate(tmp_path):
+    new_time = dict(NOTICE, url="https://other.example.com/3", summary=NOTICE["summary"].replace("10:00", "12:00"))
+    # то же объявление по тому же адресу, перенесенное на другой день
+    new_date = dict(NOTICE, summary=NOTICE["summary"].replace("18", "25"))
+    assert check(tmp_path / "dedup.sqlite3", [NOTICE], [new_time], [new_date]) == [[True], [True], [True]]
+
+
+def test_index_without_numbers_column_is_upgraded(tmp_path):
+    path = tmp_path / "dedup.sqlite3"
+    with sqlite3.connect(path) as conn:
+        conn.execute("create table simhashes (simhash integer not null, band integer not null, "
+                     "value integer not null, seen_at real not null)")
+    new_time = dict(NOTICE, url="https://other.example.com/4", summary=NOTICE["summary"].replace("10:00", "11:30"))
+    assert check(path, [NOTICE], [new_time]) == [[True], [True]]
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://www.Example.com/a/?utm_medium=x&b=2&a=1#frag") == "https://example.com/a?a=1&b=2"
@@ -0,0 +1,63 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from database.fsm_storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=100, user_id=100)
+OTHER = StorageKey(bot_id=1, chat_id=200, user_id=200)
+
+
+def test_state_survives_restart(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+
+    async def first_run():
+        storage = SQLiteStorage(path, flush_interval=60)
+        await storage.set_state(KEY, "SubscriptionState:selecting")
+        await storage.set_data(KEY, {"selected": [1, 3], "page": 2})
+        await storage.set_state(OTHER, "AdminState:broadcast")
+        await storage.set_state(OTHER, None)
+        # запись еще в буфере, но чтение уже видит ее
+        assert await storage.get_state(KEY) == "SubscriptionState:selecting"
+        await storage.close()
+
+    async def second_run():
+        storage = SQLiteStorage(path)
+        try:
+            return await storage.get_state(KEY), await storage.get_data(KEY), await storage.get_state(OTHER)
+        finally:
+            await storage.close()
+
+    asyncio.run(first_run())
+    assert asyncio.run(second_run()) == ("SubscriptionState:selecting", {"selected": [1, 3], "page": 2}, None)
+
+
+def test_expired_state_is_dropped(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+
+    async def run():
+        storage = SQLiteStorage(path, ttl=-1)
+        await storage.set_state(KEY, "SubscriptionState:selecting")
+        await storage.flush()
+        try:
+            return await storage.get_state(KEY)
+        finally:
+            await storage.close()
+
+    assert asyncio.run(run()) is None
+
+
+def test_data_is_copied(tmp_path):
+    async def run():
+        storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"))
+        data = {"selected": [1]}
+        await storage.set_data(KEY, data)
+        data["selected"].append(2)
+        loaded = await storage.get_data(KEY)
+        loaded["selected"].append(3)
+        try:
+            return await storage.get_data(KEY)
+        finally:
+            await storage.close()
+
+    assert asyncio.run(run()) == {"selected": [1]}
@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+import mailing.ingestion as ingestion
+from mailing.ingestion import NewsIngestor
+
+SOURCES = [SimpleNamespace(name="habr"), SimpleNamespace(name="tproger")]
+
+
+def test_notifications_within_debounce_make_one_run(monkeypatch):
+    runs = []
+
+    async def run_sources(bot, due):
+        runs.append([source.name for source in due])
+        return 1
+
+    monkeypatch.setattr(ingestion, "run_sources", run_sources)
+
+    async def run():
+        ingestor = NewsIngestor(None, SOURCES, debounce=0.05, poll_min=10, poll_max=10)
+        task = asyncio.create_task(ingestor.run())
+        ingestor.notify("habr")
+        await asyncio.sleep(0.01)
+        ingestor.notify("habr")
+        ingestor.notify("tproger")
+        await asyncio.sleep(0.1)
+        ingestor.notify("unknown")
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run())
+    # неизвестное имя в уведомлении — проверить все источники
+    assert runs == [["habr", "tproger"], ["habr", "tproger"]]
+
+
+def test_poll_interval_backs_off_and_resets(monkeypatch):
+    found = iter([0, 0, 0, 0, 3, 0])
+    intervals = []
+
+    async def run_sources(bot, due):
+        return next(found)
+
+    monkeypatch.setattr(ingestion, "run_sources", run_sources)
+
+    async def run():
+        ingestor = NewsIngestor(None, SOURCES, debounce=0, poll_min=0.01, poll_max=0.04)
+        original = ingestor._wait
+
+        async def wait():
+            intervals.append(ingestor.interval)
+            await original()
+
+        ingestor._wait = wait
+        task = asyncio.create_task(ingestor.run())
+        while len(intervals) < 7:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(run())
+    assert intervals[:7] == [0.01, 0.02, 0.04, 0.04, 0.04, 0.01, 0.02]
@@ -0,0 +1,49 @@
+import random
+
+from mailing.packing import MESSAGE_LIMIT, pack_digest, truncate, utf16_len, visible_length
+
+ALPHABET = ["а", "b", "😀", "🇷🇺", "&amp;", " "]
+
+
+def news(number: int, rng: random.Random) -> str:
+    body = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(50, 1500)))
+    return f'<b>#{number}</b> <a href="https://example.com/{number}">{body}</a>\n\n'
+
+
+def test_parts_fit_limit_and_keep_order():
+    rng = random.Random(1)
+    for _ in range(20):
+        chunks = [news(number, rng) for number in range(rng.randint(1, 40))]
+        parts = pack_digest(chunks)
+        assert all(visible_length(part) <= MESSAGE_LIMIT for part in parts)
+        # каждая новость целиком в одной части, порядок сохранен
+        assert "".join(part + "\n\n" for part in parts) == "".join(chunks)
+
+
+def test_minimal_parts_and_balanced_tail():
+    chunks = ["x" * 1000 + "\n\n"] * 9
+    parts = pack_digest(chunks)
+    # 9 новостей по 1002 единицы: жадно 4 + 4 + 1, после выравнивания 3 + 3 + 3
+    assert [part.count("x") for part in parts] == [3000, 3000, 3000]
+
+
+def test_counts_utf16_units_after_markup():
+    assert utf16_len("😀") == 2
+    assert visible_length("<b>&lt;😀&gt;</b>") == 4
+    # 2048 эмодзи — ровно 4096 единиц UTF-16, хотя символов вдвое меньше
+    chunk = "<i>" + "😀" * 2048 + "</i>"
+    assert pack_digest([chunk, chunk]) == [chunk, chunk]
+
+
+def test_oversized_item_goes_alone():
+    big = "y" * (MESSAGE_LIMIT + 10)
+    assert pack_digest(["a\n\n", big, "b"]) == ["a", big, "b"]
+
+
+def test_truncate_at_word_boundary():
+    text = "слово " * 100
+    cut = truncate(text, 50)
+    assert utf16_len(cut) <= 50
+    assert cut.endswith("слово…")
+    assert truncate("коротко", 50) == "коротко"
+    assert utf16_len(truncate("😀" * 100, 11)) <= 11
@@ -0,0 +1,51 @@
+import asyncio
+from datetime import datetime, timezone
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+
+from mailing.scheduling import SQLiteLease, SingleLeaderScheduler, latest_fire_time
+
+UTC = timezone.utc
+
+
+def test_latest_fire_time_coalesces_missed_runs():
+    trigger = CronTrigger(minute=0, timezone=UTC)
+    now = datetime(2024, 5, 1, 12, 30, tzinfo=UTC)
+    assert latest_fire_time(trigger, now) == datetime(2024, 5, 1, 12, 0, tzinfo=UTC)
+    assert latest_fire_time(trigger, now, since=datetime(2024, 5, 1, 9, 0, tzinfo=UTC)) == \
+        datetime(2024, 5, 1, 12, 0, tzinfo=UTC)
+    assert latest_fire_time(trigger, now, since=datetime(2024, 5, 1, 12, 0, tzinfo=UTC)) is None
+
+
+def test_each_firing_is_claimed_once(tmp_path):
+    path = str(tmp_path / "scheduler.sqlite3")
+    fire_time = datetime(2024, 5, 1, 12, 0, tzinfo=UTC)
+
+    async def run():
+        first, second = SQLiteLease(path), SQLiteLease(path)
+        claims = await asyncio.gather(*(lease.claim("news", fire_time) for lease in (first, second, first)))
+        return claims, await second.last_run("news"), await second.claim("news", fire_time.replace(hour=13))
+
+    claims, last_run, next_claim = asyncio.run(run())
+    assert sorted(claims) == [False, False, True]
+    assert last_run == fire_time
+    assert next_claim
+
+
+def test_replicas_run_a_firing_once(tmp_path):
+    path = str(tmp_path / "scheduler.sqlite3")
+    fire_time = datetime(2024, 5, 1, 12, 0, tzinfo=UTC)
+    runs = []
+
+    async def job(name):
+        runs.append(name)
+
+    async def run():
+        replicas = [SingleLeaderScheduler(AsyncIOScheduler(timezone=UTC), SQLiteLease(path)) for _ in range(3)]
+        for number, replica in enumerate(replicas):
+            replica.add_cron_job("news", job, args=[number], minute=0)
+        await asyncio.gather(*(replica._run("news", fire_time) for replica in replicas))
+
+    asyncio.run(run())
+    assert len(runs) == 1
@@ -0,0 +1,105 @@
+import asyncio
+import random
+
+import pytest
+
+import database.subscription_index as subscription_index
+from database.subscription_index import SubscriptionIndex
+
+CATEGORIES = range(1, 10)
+
+
+class Model:
+    """Эталон: подписки и отключенные пользователи в обычных множествах"""
+
+    def __init__(self, subscriptions: dict, inactive: set):
+        self.subscriptions = subscriptions
+        self.inactive = inactive
+
+    def subscribers(self, category_ids) -> list:
+        wanted = set(category_ids)
+        return [(user_id, frozenset(categories & wanted))
+                for user_id, categories in sorted(self.subscriptions.items())
+                if categories & wanted and user_id not in self.inactive]
+
+    def check(self, index: SubscriptionIndex, users: bool = True):
+        assert index.count_users() == sum(1 for user_id, categories in self.subscriptions.items()
+                                          if categories and user_id not in self.inactive)
+        for category_id in CATEGORIES:
+            assert index.count(category_id) == sum(
+                1 for user_id, categories in self.subscriptions.items()
+                if category_id in categories and user_id not in self.inactive)
+        if not users:
+            return
+        for user_id, categories in self.subscriptions.items():
+            assert index.user_categories(user_id) == frozenset(categories)
+            assert index.is_active(user_id) == (user_id not in self.inactive)
+
+
+def build(rng: random.Random, users: int = 500):
+    subscriptions = {user_id: set(rng.sample(CATEGORIES, rng.randint(0, 3))) for user_id in range(1, users)}
+    inactive = {user_id for user_id in subscriptions if rng.random() < 0.1}
+
+    async def pages():
+        rows = [(user_id, sorted(categories), user_id not in inactive)
+                for user_id, categories in sorted(subscriptions.items())]
+        for start in range(0, len(rows), 100):
+            yield rows[start:start + 100]
+
+    index = SubscriptionIndex()
+    asyncio.run(index.load(pages(), cursor=42))
+    return index, Model(subscriptions, inactive)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_brute_force_model(monkeypatch, seed):
+    # частое вливание изменений в массивы, чтобы проверить и его
+    monkeypatch.setattr(subscription_index, "COMPACT_THRESHOLD", 8)
+    rng = random.Random(seed)
+    index, model = build(rng)
+    assert index.ready and index.cursor == 42
+    model.check(index)
+    for step in range(2000):
+        user_id = rng.randint(1, 600)
+        roll = rng.random()
+        if roll < 0.6:
+            categories = set(rng.sample(CATEGORIES, rng.randint(0, 3)))
+            index.set_user(user_id, categories)
+            model.subscriptions[user_id] = categories
+        elif roll < 0.95:
+            active = rng.random() < 0.5
+            index.set_active(user_id, active)
+            model.subscriptions.setdefault(user_id, set())
+            (model.inactive.discard if active else model.inactive.add)(user_id)
+        else:
+            category_id = rng.choice(CATEGORIES)
+            index.drop_category(category_id)
+            for categories in model.subscriptions.values():
+                categories.discard(category_id)
+        # счетчики расходятся накопительно, поэтому проверки раз в несколько шагов достаточно
+        if step % 10 == 0:
+            model.check(index, users=step % 100 == 0)
+    model.check(index)
+
+
+def test_iter_subscribers_pages_like_model():
+    index, model = build(random.Random(7))
+    wanted = [2, 5, 7]
+    pages = list(index.iter_subscribers(wanted, page_size=50))
+    assert all(len(page) == 50 for page in pages[:-1])
+    flat = [row for page in pages for row in page]
+    assert flat == model.subscribers(wanted)
+    after = flat[len(flat) // 2][0]
+    rest = [row for page in index.iter_subscribers(wanted, page_size=50, after=after) for row in page]
+    assert rest == [row for row in flat if row[0] > after]
+
+
+def test_set_user_is_idempotent():
+    index, model = build(random.Random(3))
+    index.set_user(1, {1, 2})
+    index.set_user(1, {1, 2})
+    index.set_active(1, True)
+    index.set_active(1, True)
+    model.subscriptions[1] = {1, 2}
+    model.inactive.discard(1)
+    model.check(index)
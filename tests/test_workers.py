@@ -0,0 +1,72 @@
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+import database.supabase as db
+from benchmarks.fake_postgrest import FakePostgrest
+from database.client import create_postgrest
+from mailing import outbox, workers
+from mailing.delivery import DELIVERY_RATE, RateLimiter, engine, limiter
+from mailing.outbox import OutboxDrain, enqueue
+
+JOB_ID = "digest:test:0"
+PARTS = ["первая", "вторая", "третья"]
+
+
+@asynccontextmanager
+async def fake_postgrest(monkeypatch):
+    fake = FakePostgrest(users=0, latency=0.001)
+    client = create_postgrest(await fake.start())
+    monkeypatch.setattr(db, "postgrest", client)
+    try:
+        yield fake
+    finally:
+        await client.aclose()
+        await fake.stop()
+
+
+def test_shards_deliver_each_user_once_in_order(monkeypatch):
+    # маленькая страница: части пользователя попадают на границу страниц и переносятся
+    monkeypatch.setattr(outbox, "OUTBOX_PAGE_SIZE", 5)
+    monkeypatch.setattr(engine, "limiter", RateLimiter(rate=100_000, chat_interval=0))
+    users = list(range(1, 201))
+    received = defaultdict(list)
+
+    def senders(shard):
+        async def send(chat_id, index):
+            await asyncio.sleep(0)
+            received[chat_id].append((shard, index))
+        return [lambda chat_id, index=index: send(chat_id, index) for index in range(len(PARTS))]
+
+    async def run():
+        async with fake_postgrest(monkeypatch) as fake:
+            assert await enqueue(JOB_ID, PARTS, users) == len(users) * len(PARTS)
+            results = await asyncio.gather(*(OutboxDrain(JOB_ID, senders(shard), shard, 3).run()
+                                             for shard in range(3)))
+            return fake, results
+
+    fake, results = asyncio.run(run())
+    assert sum(stats.sent for stats in results) == len(users)
+    assert all(stats.sent for stats in results)
+    for user_id in users:
+        shards = {shard for shard, _ in received[user_id]}
+        assert len(shards) == 1, user_id
+        assert [index for _, index in received[user_id]] == [0, 1, 2], user_id
+    assert {row["status"] for row in fake.outbox.values()} == {"sent"}
+
+
+def test_rate_is_split_between_live_processes(monkeypatch):
+    monkeypatch.setattr(limiter, "rate", limiter.rate)
+    monkeypatch.setattr(limiter, "capacity", limiter.capacity)
+
+    async def run():
+        async with fake_postgrest(monkeypatch):
+            await db.heartbeat_mailing_worker("other-host:1", 0, 2, 15)
+            await db.heartbeat_mailing_worker("other-host:2", 1, 2, 15)
+            await workers.heartbeat(workers.BOT_SHARD, 0)
+            shared = limiter.rate
+            await db.leave_mailing_workers("other-host:2")
+            await workers.heartbeat(workers.BOT_SHARD, 0)
+            return shared, limiter.rate
+
+    assert asyncio.run(run()) == (DELIVERY_RATE / 3, DELIVERY_RATE / 2)
@@ -37,6 +37,7 @@ def get_admin_main_keyboard():
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🆕 Рассылка всем", callback_data="admin_broadcast")],
         [InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")],
+        [InlineKeyboardButton(text="📤 Активные рассылки", callback_data="admin_jobs")],
         [InlineKeyboardButton(text="➕ Добавить рассылку", callback_data="admin_add_category")],
         [InlineKeyboardButton(text="📝 Редактировать рассылку", callback_data="admin_edit_category")], 
         [InlineKeyboardButton(text="📋 Меню пользователя", callback_data="back_to_main")]
@@ -73,3 +74,56 @@ def render_edit_actions_menu(category_name):
     ])
     
     return text, keyboard
+
+
+BROADCAST_STATUS_LABELS = {
+    "running": "🚀 Выполняется",
+    "paused": "⏸ Приостановлена",
+    "cancelled": "✖️ Отменена",
+    "done": "✅ Завершена",
+}
+
+
+def get_broadcast_controls(job, show_id=False):
+    """Кнопки управления рассылкой в зависимости от ее статуса"""
+    prefix = f"#{job.id} " if show_id else ""
+    buttons = []
+    if job.status == "running":
+        buttons.append(InlineKeyboardButton(text=f"{prefix}⏸ Пауза", callback_data=f"admin_job_pause_{job.id}"))
+    elif job.status == "paused":
+        buttons.append(InlineKeyboardButton(text=f"{prefix}▶️ Продолжить", callback_data=f"admin_job_resume_{job.id}"))
+    if job.status in ("running", "paused"):
+        buttons.append(InlineKeyboardButton(text=f"{prefix}✖️ Отменить", callback_data=f"admin_job_cancel_{job.id}"))
+    return buttons
+
+
+def render_broadcast_status(job):
+    """Отрисовка прогресса фоновой рассылки"""
+    text = (
+        f"📤 <b>Рассылка #{job.id}</b> — {BROADCAST_STATUS_LABELS.get(job.status, job.status)}\n\n"
+        f"👥 Обработано: <b>{job.processed}</b> из {job.total}\n"
+        f"📥 Доставлено: {job.sent}\n"
+        f"🚫 Заблокировали бота: {job.blocked}\n"
+        f"⚠️ Ошибок: {job.failed}\n"
+        f"⚡ Скорость: {job.rate:.1f} польз./сек"
+    )
+    buttons = get_broadcast_controls(job)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+    return text, keyboard
+
+
+def render_broadcast_jobs_list(jobs):
+    """Отрисовка списка активных рассылок"""
+    if jobs:
+        lines = [
+            f"  ├ #{job.id}: {BROADCAST_STATUS_LABELS.get(job.status, job.status)}, "
+            f"{job.processed}/{job.total}"
+            for job in jobs
+        ]
+        text = "📤 <b>Активные рассылки</b>\n\n" + "\n".join(lines)
+    else:
+        text = "📤 <b>Активные рассылки</b>\n\n  <i>Нет активных рассылок</i>"
+    rows = [get_broadcast_controls(job, show_id=True) for job in jobs]
+    rows = [row for row in rows if row]
+    rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_admin_main")])
+    return text, InlineKeyboardMarkup(inline_keyboard=rows)
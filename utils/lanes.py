@@ -0,0 +1,130 @@
+import os
+import time
+import asyncio
+import logging
+import contextlib
+from contextvars import ContextVar
+from typing import Any, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (AnswerCallbackQuery, Close, DeleteWebhook, GetMe, GetUpdates, GetWebhookInfo,
+                             LogOut, SetWebhook)
+from dotenv import load_dotenv
+
+from utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_RATE = float(os.getenv("TELEGRAM_RATE", "30"))
+LANE_INTERACTIVE_RESERVE = float(os.getenv("LANE_INTERACTIVE_RESERVE", "5"))
+LANE_ADMIN_RESERVE = float(os.getenv("LANE_ADMIN_RESERVE", "2"))
+
+# Классы приоритета в порядке убывания
+INTERACTIVE, ADMIN, BULK = "interactive", "admin", "bulk"
+LANES = (INTERACTIVE, ADMIN, BULK)
+
+# Служебные методы и ответы на колбэки не расходуют лимит сообщений
+EXEMPT = (GetUpdates, GetMe, SetWebhook, DeleteWebhook, GetWebhookInfo, AnswerCallbackQuery, Close, LogOut)
+
+current_lane: ContextVar[str] = ContextVar("current_lane", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def lane(name: str):
+    """Выполнять запросы к Bot API внутри блока в классе name"""
+    token = current_lane.set(name)
+    try:
+        yield
+    finally:
+        current_lane.reset(token)
+
+
+class LaneMiddleware(BaseMiddleware):
+    """Запросы обработчиков роутера идут в заданном классе (например, админка — admin)"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    async def __call__(self, handler, event, data: Dict[str, Any]):
+        with lane(self.name):
+            return await handler(event, data)
+
+
+class PriorityScheduler(BaseRequestMiddleware):
+    """Общий бюджет сообщений бота с приоритетами interactive > admin > bulk.
+
+    Token bucket на rate запросов в секунду. Для interactive в корзине всегда
+    держится резерв: admin не опускает ее ниже interactive_reserve токенов,
+    bulk — ниже interactive_reserve + admin_reserve, поэтому ответ пользователю
+    уходит сразу даже посреди рассылки. Пока ждет более приоритетный класс,
+    младшие токены не получают. Flood limit (429) приостанавливает admin и bulk,
+    интерактивные запросы продолжают идти по мере пополнения корзины.
+    """
+
+    def __init__(self, rate: float = TELEGRAM_RATE, interactive_reserve: float = LANE_INTERACTIVE_RESERVE,
+                 admin_reserve: float = LANE_ADMIN_RESERVE):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.floors = {INTERACTIVE: 0.0, ADMIN: interactive_reserve, BULK: interactive_reserve + admin_reserve}
+        if self.floors[BULK] + 1 > self.capacity:
+            raise ValueError("Резервы LANE_*_RESERVE должны быть меньше TELEGRAM_RATE")
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = {name: 0 for name in LANES}
+
+    def pause(self, seconds: float):
+        until = time.monotonic() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            self._tokens = 0.0
+            logger.warning(f"⏸ Flood limit! Рассылки и админ-запросы приостановлены на {seconds} сек.")
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _delay(self, name: str, now: float) -> float:
+        """0 — можно отправлять, иначе сколько подождать до следующей проверки"""
+        if name != INTERACTIVE and now < self._paused_until:
+            return self._paused_until - now
+        if any(self._waiting[higher] for higher in LANES[:LANES.index(name)]):
+            return 1 / self.rate
+        missing = self.floors[name] + 1 - self._tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    async def acquire(self, name: str):
+        self._waiting[name] += 1
+        try:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self._delay(name, now)
+                if not delay:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep(delay)
+        finally:
+            self._waiting[name] -= 1
+
+    async def __call__(self, make_request, bot, method):
+        if isinstance(method, EXEMPT):
+            return await make_request(bot, method)
+        name = current_lane.get()
+        started = time.perf_counter()
+        await self.acquire(name)
+        metrics.lane_wait.observe(time.perf_counter() - started, name)
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            self.pause(e.retry_after)
+            raise
+        finally:
+            metrics.lane_latency.observe(time.perf_counter() - started, name)
+
+
+scheduler = PriorityScheduler()
@@ -0,0 +1,18 @@
+class MenuCache:
+    """Отрисованные тексты и клавиатуры по (вид меню, версия каталога).
+    При смене версии старые варианты выбрасываются целиком"""
+
+    def __init__(self):
+        self._version = None
+        self._views = {}
+
+    def get(self, view, version, build):
+        if version != self._version:
+            self._views.clear()
+            self._version = version
+        if view not in self._views:
+            self._views[view] = build()
+        return self._views[view]
+
+
+menus = MenuCache()
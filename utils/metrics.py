@@ -0,0 +1,265 @@
+import os
+import html
+import re
+import time
+import bisect
+import logging
+import functools
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import CallbackQuery, Message
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CALLBACK_PREFIX = re.compile(r"^(.*?)(?:_-?\d+)*$")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value).replace(chr(34), "")}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}
+        registry.append(self)
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            # счетчики по бакетам, затем сумма и количество
+            series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def quantile(self, q: float, *labels) -> float:
+        """Оценка квантиля по бакетам (верхняя граница бакета)"""
+        series = self._series.get(labels)
+        if not series or not series[-1]:
+            return 0.0
+        rank, seen = q * series[-1], 0
+        for bound, count in zip(self.buckets, series):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def series(self) -> Dict[tuple, list]:
+        return self._series
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), labels + ('+Inf',))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        registry.append(self)
+
+    def inc(self, *labels, value: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def get(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{_labels(self.labels, labels)} {value}" for labels, value in self._values.items()]
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+registry: List[Any] = []
+collectors: List[Callable[[], None]] = []
+
+handler_latency = Histogram("bot_handler_seconds", "Время обработки апдейта", ("event", "handler"))
+db_latency = Histogram("bot_db_seconds", "Время обертки database.supabase с учетом кэша", ("function", "status"))
+postgrest_latency = Histogram("bot_postgrest_seconds", "Время HTTP-запроса к PostgREST", ("endpoint", "status"))
+telegram_latency = Histogram("bot_telegram_seconds", "Время запроса к Bot API", ("method", "status"))
+lane_wait = Histogram("bot_lane_wait_seconds", "Ожидание бюджета Bot API по классу приоритета", ("lane",))
+lane_latency = Histogram("bot_lane_seconds", "Ожидание и выполнение запроса Bot API по классу приоритета", ("lane",))
+postgrest_failures = Counter("bot_postgrest_failures_total", "Сбои запросов к PostgREST до повтора",
+                             ("endpoint", "reason"))
+postgrest_circuit = Gauge("bot_postgrest_circuit", "Предохранитель Supabase: 0 замкнут, 1 пробный запрос, 2 разомкнут")
+cache_requests = Counter("bot_cache_requests_total", "Обращения к кэшу", ("cache", "result"))
+delivery_queue = Gauge("bot_delivery_queue", "Получатели в очереди воркеров доставки")
+delivery_messages = Counter("bot_delivery_messages_total", "Отправленные сообщения рассылок")
+delivery_rate = Gauge("bot_delivery_rate", "Суммарная скорость идущих рассылок, сообщ./сек")
+
+
+def collector(func: Callable[[], None]):
+    """Функция, обновляющая метрики непосредственно перед выдачей"""
+    collectors.append(func)
+    return func
+
+
+@collector
+def _collect_caches():
+    from database.cache import cache_stats
+    for name, stats in cache_stats().items():
+        cache_requests.set(stats.hits, name, "hit")
+        cache_requests.set(stats.misses, name, "miss")
+        cache_requests.set(stats.coalesced, name, "coalesced")
+        cache_requests.set(stats.stale, name, "stale")
+
+
+def render() -> str:
+    for collect in collectors:
+        try:
+            collect()
+        except Exception as e:
+            logger.error(f"Ошибка сбора метрик: {e}")
+    lines = []
+    for metric in registry:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+def timed_db(func: Callable[..., Awaitable]):
+    """Гистограмма времени вызова обертки Supabase"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await func(*args, **kwargs)
+            status = "ok"
+            return result
+        finally:
+            db_latency.observe(time.perf_counter() - started, func.__name__, status)
+    return wrapper
+
+
+async def on_postgrest_request(request):
+    request.extensions["started"] = time.perf_counter()
+
+
+async def on_postgrest_response(response):
+    """httpx event hook: время и HTTP-статус каждого RPC/запроса к таблице"""
+    started = response.request.extensions.get("started")
+    if started is not None:
+        endpoint = response.request.url.path.split("/rest/v1/", 1)[-1]
+        postgrest_latency.observe(time.perf_counter() - started, endpoint, str(response.status_code))
+
+
+def _handler_label(event, data: Dict[str, Any]) -> Tuple[str, str]:
+    if isinstance(event, CallbackQuery):
+        return "callback", CALLBACK_PREFIX.match(event.data or "").group(1)
+    handler = data.get("handler")
+    name = getattr(getattr(handler, "callback", None), "__name__", "")
+    return ("message" if isinstance(event, Message) else type(event).__name__), name
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время обработки сообщений (по имени обработчика) и колбэков (по префиксу callback_data).
+
+    Подключается внутренним middleware: считаются только апдейты, нашедшие обработчик,
+    поэтому произвольный текст от пользователей не порождает новых меток."""
+
+    async def __call__(self, handler, event, data: Dict[str, Any]):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_latency.observe(time.perf_counter() - started, *_handler_label(event, data))
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Время запросов к Bot API и класс ошибки"""
+
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            telegram_latency.observe(time.perf_counter() - started, type(method).__name__, status)
+
+
+def install(dp, bot):
+    """Подключить сбор метрик к диспетчеру и сессии бота"""
+    middleware = HandlerMetricsMiddleware()
+    dp.message.middleware(middleware)
+    dp.callback_query.middleware(middleware)
+    bot.session.middleware(TelegramMetricsMiddleware())
+
+
+async def start_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Локальный HTTP-эндпоинт /metrics в формате Prometheus; METRICS_PORT=0 отключает"""
+    if not port:
+        return None
+
+    async def metrics(_):
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"📈 Метрики доступны на http://{host}:{port}/metrics")
+    return runner
+
+
+def _top(histogram: Histogram, limit: int) -> List[Tuple[tuple, float, float, int]]:
+    rows = [(labels, histogram.quantile(0.5, *labels), histogram.quantile(0.99, *labels), series[-1])
+            for labels, series in histogram.series().items()]
+    return sorted(rows, key=lambda row: row[2], reverse=True)[:limit]
+
+
+def summary(limit: int = 5) -> str:
+    """Самые медленные по p99 обработчики, RPC и методы Bot API для /admin"""
+    sections = [("⏱ Обработчики", handler_latency), ("🗄 PostgREST", postgrest_latency),
+                ("✈️ Bot API", telegram_latency), ("🚦 Классы Bot API", lane_latency)]
+    lines = []
+    for title, histogram in sections:
+        rows = _top(histogram, limit)
+        if not rows:
+            continue
+        lines.append(f"{title} (p50/p99, мс):")
+        for labels, p50, p99, count in rows:
+            lines.append(f"  ├ {html.escape(' '.join(filter(None, labels)))}: <b>{p50 * 1e3:.0f}</b>/<b>{p99 * 1e3:.0f}</b> ×{count}")
+    return "\n".join(lines) if lines else "  <i>Нет данных</i>"
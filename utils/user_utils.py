@@ -1,7 +1,21 @@
+import os
+import asyncio
+import logging
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 import database.supabase as db
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.state import State, StatesGroup
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from cachetools import LRUCache
+from dotenv import load_dotenv
+
+from utils.menu_cache import menus
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SUBS_EDIT_DEBOUNCE = float(os.getenv("SUBS_EDIT_DEBOUNCE", "0.4"))
 
 
 class SubscriptionState(StatesGroup):
@@ -21,36 +35,120 @@ def get_main_menu_content():
     return text, keyboard
 
 
-async def render_subs_keyboard(message, current_selection):
-    all_categories = await db.get_all_categories()
-    builder = InlineKeyboardBuilder()
-    
-    for cat in all_categories:
-        cat_id = cat['id']
-        cat_name = cat['category_name']
-        
-        is_selected = cat_id in current_selection
-        icon = "✅" if is_selected else "⬜"
-        
-        builder.button(
-            text=f"{icon} {cat_name}", 
-            callback_data=f"sub_toggle_{cat_id}"
+SUBS_TEXT = (
+    "🔔 <b>Ваши подписки на рассылки</b>\n\n"
+    "Настройте список и нажмите «Сохранить».\n"
+    "✅ — выбрано (будет сохранено)\n"
+    "⬜ — не выбрано"
+)
+
+# Последняя отправленная клавиатура и отложенные правки по (chat_id, message_id)
+_last_markups = LRUCache(maxsize=10_000)
+_pending_edits: dict = {}
+
+
+def _build_subs_template(all_categories):
+    """Заготовка меню подписок: для каждой категории две кнопки (выбрано/не выбрано)"""
+    rows = [
+        (
+            cat['id'],
+            InlineKeyboardButton(text=f"✅ {cat['category_name']}", callback_data=f"sub_toggle_{cat['id']}"),
+            InlineKeyboardButton(text=f"⬜ {cat['category_name']}", callback_data=f"sub_toggle_{cat['id']}"),
         )
-        
-    builder.adjust(1)
-    builder.row(
+        for cat in all_categories
+    ]
+    footer = [
         InlineKeyboardButton(text="🆗 Сохранить", callback_data="subs_save"),
         InlineKeyboardButton(text="📋 Меню", callback_data="back_to_main")
-    )
+    ]
+    return rows, footer
+
+
+def build_subs_keyboard(template, current_selection):
+    """Накладывает галочки пользователя на закэшированную заготовку"""
+    rows, footer = template
+    selected = set(current_selection)
+    keyboard = [[on if cat_id in selected else off] for cat_id, on, off in rows]
+    keyboard.append(footer)
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+async def get_subs_keyboard(current_selection):
+    version, all_categories = await db.get_catalog()
+    template = menus.get("subs", version, lambda: _build_subs_template(all_categories))
+    return build_subs_keyboard(template, current_selection)
+
+
+async def get_catalog_keyboard():
+    """Клавиатура каталога рассылок (кэшируется по версии каталога)"""
+    version, categories = await db.get_catalog()
 
+    def build():
+        builder = InlineKeyboardBuilder()
+        for item in categories:
+            builder.button(
+                text=f"{item['category_name']}", 
+                callback_data=f"view_category_{item['id']}"
+            )
+        builder.adjust(1)
+        builder.row(InlineKeyboardButton(text="📋 Меню", callback_data="back_to_main"))
+        return builder.as_markup()
+
+    return menus.get("catalog", version, build)
+
+
+def _message_key(message):
+    return message.chat.id, message.message_id
+
+
+async def render_subs_keyboard(message, current_selection):
+    """Полная отрисовка меню подписок (текст + клавиатура)"""
+    reply_markup = await get_subs_keyboard(current_selection)
     try:
-        await message.edit_text(
-            "🔔 <b>Ваши подписки на рассылки</b>\n\n"
-            "Настройте список и нажмите «Сохранить».\n"
-            "✅ — выбрано (будет сохранено)\n"
-            "⬜ — не выбрано",
-            parse_mode="HTML",
-            reply_markup=builder.as_markup()
-        )
-    except Exception:
-        pass
\ No newline at end of file
+        await message.edit_text(SUBS_TEXT, parse_mode="HTML", reply_markup=reply_markup)
+        _last_markups[_message_key(message)] = reply_markup
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            logger.warning(f"Не удалось отрисовать меню подписок: {e}")
+
+
+async def _flush_subs_keyboard(message, state):
+    key = _message_key(message)
+    try:
+        await asyncio.sleep(SUBS_EDIT_DEBOUNCE)
+        _pending_edits.pop(key, None)
+        # пользователь успел уйти из меню подписок: сообщение уже показывает другой экран
+        if await state.get_state() != SubscriptionState.selecting.state:
+            return
+        data = await state.get_data()
+        if "subs" not in data:
+            return
+        reply_markup = await get_subs_keyboard(data["subs"])
+        if _last_markups.get(key) == reply_markup:
+            return
+        await message.edit_reply_markup(reply_markup=reply_markup)
+        _last_markups[key] = reply_markup
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            logger.warning(f"Не удалось обновить клавиатуру подписок: {e}")
+    except TelegramRetryAfter as e:
+        logger.warning(f"Flood limit при обновлении клавиатуры подписок, {e.retry_after} сек.")
+    finally:
+        if _pending_edits.get(key) is asyncio.current_task():
+            del _pending_edits[key]
+
+
+def schedule_subs_keyboard_update(message, state):
+    """Отложенная правка клавиатуры: серия быстрых нажатий дает одно edit_reply_markup"""
+    key = _message_key(message)
+    if key not in _pending_edits:
+        _pending_edits[key] = asyncio.create_task(_flush_subs_keyboard(message, state))
+
+
+def cancel_subs_keyboard_update(message):
+    """Отменить отложенную правку, если сообщение будет перерисовано целиком"""
+    key = _message_key(message)
+    task = _pending_edits.pop(key, None)
+    if task is not None:
+        task.cancel()
+    _last_markups.pop(key, None)
@@ -0,0 +1,90 @@
+import os
+import asyncio
+import logging
+import secrets
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "50"))
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", "500"))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "25"))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class BoundedUpdateHandler:
+    """Прием апдейтов с ограничением параллельных обработчиков.
+
+    Одновременно выполняется не больше max_concurrency обработчиков, а в очереди
+    (вместе с выполняемыми) держится не больше max_pending апдейтов. Сверх этого
+    отвечаем 503, и Telegram повторит доставку позже — так медленная БД не копит
+    бесконечное число задач.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, secret_token: str = None,
+                 max_concurrency: int = WEBHOOK_MAX_CONCURRENCY, max_pending: int = WEBHOOK_MAX_PENDING):
+        self.dp = dp
+        self.bot = bot
+        self.secret_token = secret_token
+        self.max_pending = max_pending
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: set = set()
+        self._draining = False
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def _process(self, update: Update):
+        async with self._semaphore:
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                logger.error(f"Ошибка обработки апдейта {update.update_id}: {e}", exc_info=True)
+
+    def feed(self, update: Update) -> bool:
+        """Поставить апдейт в обработку; False — очередь переполнена"""
+        if self._draining or self.pending >= self.max_pending:
+            self.rejected += 1
+            return False
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret_token and not secrets.compare_digest(
+                request.headers.get(SECRET_HEADER, ""), self.secret_token):
+            return web.Response(status=401)
+        update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        if not self.feed(update):
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        return web.Response()
+
+    async def drain(self, timeout: float = WEBHOOK_DRAIN_TIMEOUT):
+        """Перестать принимать апдейты и дождаться уже принятых"""
+        self._draining = True
+        if not self._tasks:
+            return
+        logger.info(f"⏳ Ожидание {self.pending} необработанных апдейтов...")
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if pending:
+            logger.warning(f"⚠️ Не дождались {len(pending)} апдейтов за {timeout} сек.")
+            for task in pending:
+                task.cancel()
+
+    def register(self, app: web.Application, path: str):
+        app.router.add_post(path, self.handle)
+
+        async def on_shutdown(_):
+            await self.drain()
+
+        app.on_shutdown.append(on_shutdown)
@@ -0,0 +1,77 @@
+import os
+import sys
+import signal
+import asyncio
+import logging
+import argparse
+import subprocess
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from dotenv import load_dotenv
+
+from database.client import close as close_db
+from mailing.workers import MAILING_SHARD, MAILING_SHARDS, MailingWorker
+from utils import metrics
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(name)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+# Свой Bot API сервер (локальный telegram-bot-api или замена из benchmarks)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+
+def create_bot() -> Bot:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+    return Bot(token=BOT_TOKEN, session=session)
+
+
+async def main(shard: int, shards: int, once: bool):
+    bot = create_bot()
+    bot.session.middleware(metrics.TelegramMetricsMiddleware())
+    # у каждого шарда свой порт метрик: METRICS_PORT + 1 + shard
+    metrics_runner = await metrics.start_server(port=metrics.METRICS_PORT and metrics.METRICS_PORT + 1 + shard)
+    task = asyncio.create_task(MailingWorker(bot, shard, shards).run(once))
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        logger.info(f"Воркер рассылок шарда {shard} остановлен")
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await bot.session.close()
+        await close_db()
+
+
+def spawn(processes: int, once: bool) -> int:
+    """Запустить шарды 0..processes-1 локальными процессами и дождаться их"""
+    command = [sys.executable, os.path.abspath(__file__), "--shards", str(processes)] + (["--once"] if once else [])
+    children = [subprocess.Popen(command + ["--shard", str(shard)]) for shard in range(processes)]
+
+    def stop(signum, frame):
+        for child in children:
+            child.terminate()
+
+    # Ctrl+C и SIGTERM передаются шардам, они штатно снимают отметку в mailing_workers
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    return max(child.wait() for child in children)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Воркер доставки рассылок")
+    parser.add_argument("--shard", type=int, default=MAILING_SHARD)
+    parser.add_argument("--shards", type=int, default=MAILING_SHARDS)
+    parser.add_argument("--processes", type=int, default=0, help="запустить столько шардов локально")
+    parser.add_argument("--once", action="store_true", help="выйти, когда своя доля очереди доставлена")
+    args = parser.parse_args()
+    if args.processes:
+        sys.exit(spawn(args.processes, args.once))
+    asyncio.run(main(args.shard, args.shards, args.once))